@@ -0,0 +1,9 @@
+"""
+Dispatch micro-benchmarks for crank.
+
+Run them with::
+
+    python -m benchmarks --json results.json
+
+See ``python -m benchmarks --help`` for the available options.
+"""
@@ -0,0 +1,194 @@
+"""
+Runs the dispatch benchmarks and reports latency percentiles,
+throughput and allocations of ``DispatchState.resolve()``.
+"""
+import argparse
+import json
+import sys
+import threading
+from timeit import default_timer
+
+from webob.exc import HTTPException
+
+from crank.dispatchstate import DispatchState
+from crank.objectdispatcher import ObjectDispatcher, _object_dispatch_controller
+from crank.routeindex import RouteIndex
+
+from benchmarks.trees import SCENARIOS
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+SCHEMA_VERSION = 1
+
+
+class MockRequest(object):
+    def __init__(self, path_info, method='GET', params=None):
+        self.path_info = path_info
+        self.method = method
+        self.params = params or {}
+
+
+def crank_version():
+    try:
+        from importlib.metadata import version
+        return version('crank')
+    except Exception:
+        try:
+            import pkg_resources
+            return pkg_resources.get_distribution('crank').version
+        except Exception:
+            return 'unknown'
+
+
+def recursive_dispatch_controller(self, current_path, controller, state, remainder):
+    """Overriding _dispatch_controller makes dispatch call _dispatch
+    once per hop, like crank did before dispatch became a loop."""
+    return _object_dispatch_controller(self, current_path, controller, state, remainder)
+
+
+def dispatch(root, request):
+    path, method, params = request
+    state = DispatchState(MockRequest(path, method, dict(params)), root)
+    try:
+        state.resolve()
+    except HTTPException:
+        pass
+
+
+def percentile(samples, fraction):
+    idx = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+    return samples[idx]
+
+
+def measure_allocations(root, requests):
+    """Peak and retained memory per dispatch, as seen by tracemalloc"""
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):  # pragma: no cover
+        return None
+
+    peak_total = 0
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for request in requests:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            dispatch(root, request)
+            peak_total += tracemalloc.get_traced_memory()[1] - current
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    retained = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    return {'peak_bytes_per_dispatch': float(peak_total) / len(requests),
+            'retained_bytes_per_dispatch': float(retained) / len(requests)}
+
+
+def run_scenario(name, rounds, index=False, threads=1):
+    root, requests = SCENARIOS[name]()
+    if index:
+        root._route_index = RouteIndex(root)
+
+    # Warm up lazily computed data like argspecs
+    for request in requests:
+        dispatch(root, request)
+
+    timer = default_timer
+    def worker(samples):
+        for _ in range(rounds):
+            for request in requests:
+                start = timer()
+                dispatch(root, request)
+                samples.append(timer() - start)
+
+    # With more threads each of them dispatches all the rounds,
+    # they share the root and all the dispatch caches.
+    per_thread = [[] for _ in range(threads)]
+    workers = [threading.Thread(target=worker, args=(samples, )) for samples in per_thread]
+    started = timer()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = timer() - started
+    samples = [sample for thread_samples in per_thread for sample in thread_samples]
+
+    samples.sort()
+    result = {
+        'dispatches': len(samples),
+        'throughput': len(samples) / elapsed,
+        'latency_us': {
+            'min': samples[0] * 1e6,
+            'p50': percentile(samples, 0.50) * 1e6,
+            'p90': percentile(samples, 0.90) * 1e6,
+            'p99': percentile(samples, 0.99) * 1e6,
+            'max': samples[-1] * 1e6,
+            'mean': sum(samples) / len(samples) * 1e6,
+        },
+    }
+    allocations = measure_allocations(root, requests)
+    if allocations is not None:
+        result['allocations'] = allocations
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='crank dispatch benchmarks')
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                        help='scenarios to run among %s, all of them by default' % (
+                            ', '.join(sorted(SCENARIOS))))
+    parser.add_argument('--rounds', type=int, default=20,
+                        help='how many times each request mix is dispatched')
+    parser.add_argument('--compiled', action='store_true',
+                        help='enable compiled dispatch tables')
+    parser.add_argument('--index', action='store_true',
+                        help='dispatch through a crank.routeindex.RouteIndex')
+    parser.add_argument('--recursive', action='store_true',
+                        help='call _dispatch once per hop instead of looping')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='number of threads dispatching concurrently')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write results as JSON to FILE, use - for stdout')
+    options = parser.parse_args(argv)
+    for name in options.scenarios:
+        if name not in SCENARIOS:
+            parser.error('unknown scenario %s' % name)
+
+    ObjectDispatcher._use_compiled_dispatch = options.compiled
+    if options.recursive:
+        ObjectDispatcher._dispatch_controller = recursive_dispatch_controller
+
+    results = {}
+    for name in options.scenarios or sorted(SCENARIOS):
+        results[name] = run_scenario(name, options.rounds, options.index, options.threads)
+
+    report = {
+        'schema': SCHEMA_VERSION,
+        'crank': crank_version(),
+        'python': sys.version.split()[0],
+        'options': {'rounds': options.rounds, 'compiled': options.compiled,
+                    'index': options.index, 'recursive': options.recursive,
+                    'threads': options.threads},
+        'scenarios': results,
+    }
+
+    if options.json == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+        return
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    for name in sorted(results):
+        result = results[name]
+        latency = result['latency_us']
+        print('%-10s %10.0f dispatch/s  p50 %8.2fus  p90 %8.2fus  p99 %8.2fus' % (
+            name, result['throughput'], latency['p50'], latency['p90'], latency['p99']))
+
+
+if __name__ == '__main__':
+    main()
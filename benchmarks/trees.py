@@ -0,0 +1,197 @@
+"""
+Synthetic controller trees used by the benchmarks.
+
+Each scenario builds a root controller and a deterministic mix of
+``(path, method, params)`` requests to dispatch against it.
+"""
+import random
+
+from crank.lookups import cached_lookup
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+
+
+def _action(self, *args, **kw):
+    pass
+
+
+def _exposed_methods(count, prefix='action'):
+    return dict(('%s%d' % (prefix, i), _action) for i in range(count))
+
+
+def build_wide(width=200, actions=10):
+    """A root with ``width`` sub-controllers each exposing ``actions`` methods"""
+    attrs = {'index': _action}
+    for i in range(width):
+        sub_class = type('WideSub%d' % i, (ObjectDispatcher, ), _exposed_methods(actions))
+        attrs['sub%d' % i] = sub_class()
+    root = type('WideRoot', (ObjectDispatcher, ), attrs)()
+
+    rnd = random.Random(width)
+    requests = [('/sub%d/action%d/%d' % (rnd.randrange(width), rnd.randrange(actions), i),
+                 'GET', {}) for i in range(500)]
+    return root, requests
+
+
+def build_deep(depth=25, actions=3):
+    """A chain of ``depth`` nested controllers, requests target the deepest levels"""
+    node = type('DeepLeaf', (ObjectDispatcher, ), _exposed_methods(actions))()
+    for level in range(depth - 1, -1, -1):
+        attrs = _exposed_methods(actions)
+        attrs['n'] = node
+        node = type('Deep%d' % level, (ObjectDispatcher, ), attrs)()
+
+    rnd = random.Random(depth)
+    requests = []
+    for i in range(500):
+        level = rnd.randrange(depth - 5, depth + 1)
+        requests.append(('/' + 'n/' * level + 'action%d' % rnd.randrange(actions), 'GET', {}))
+    return node, requests
+
+
+def build_longpath(depth=30, args=10):
+    """Paths of 20+ segments mixing nested controllers, empty segments and arguments"""
+    root, _ = build_deep(depth, actions=1)
+
+    rnd = random.Random(depth)
+    requests = []
+    for i in range(500):
+        level = rnd.randrange(depth - 10, depth + 1)
+        segments = ['n'] * level + ['action0'] + [str(n) for n in range(rnd.randrange(args))]
+        for _ in range(rnd.randrange(5)):
+            segments.insert(rnd.randrange(len(segments)), '')
+        requests.append(('/' + '/'.join(segments), 'GET', {}))
+    return root, requests
+
+
+def build_rest(depth=3):
+    """Nested REST controllers like ``/users/1/posts/2/comments/3``"""
+    names = ['users', 'posts', 'comments', 'likes', 'tags'][:depth]
+
+    def get_one(self, *args):
+        pass
+
+    def get_all(self, *args):
+        pass
+
+    def post(self, *args, **kw):
+        pass
+
+    def put(self, *args, **kw):
+        pass
+
+    def post_delete(self, *args):
+        pass
+
+    child = None
+    for name in reversed(names):
+        attrs = {'get_one': get_one, 'get_all': get_all, 'post': post,
+                 'put': put, 'post_delete': post_delete}
+        if child is not None:
+            attrs[child[0]] = child[1]
+        child = (name, type('Rest%s' % name.title(), (RestDispatcher, ), attrs)())
+    root = type('RestRoot', (ObjectDispatcher, ), {'index': _action, names[0]: child[1]})()
+
+    rnd = random.Random(depth)
+    requests = []
+    for i in range(500):
+        level = rnd.randrange(1, depth + 1)
+        path = ''.join('/%s/%d' % (name, rnd.randrange(1000)) for name in names[:level])
+        method = rnd.choice(['GET', 'GET', 'GET', 'POST', 'PUT', 'DELETE'])
+        if rnd.random() < 0.3:
+            path = path.rsplit('/', 1)[0]
+            method = 'GET'
+        requests.append((path, method, {}))
+    return root, requests
+
+
+def build_lookup(entities=1000):
+    """A root whose ``_lookup`` resolves entities by id like ``/product/1234/details``"""
+    class Entity(ObjectDispatcher):
+        def __init__(self, entity_id):
+            self.entity_id = entity_id
+
+        def index(self):
+            pass
+
+        def details(self):
+            pass
+
+        def edit(self, **kw):
+            pass
+
+    class ProductController(ObjectDispatcher):
+        def _lookup(self, entity_id, *remainder):
+            return Entity(entity_id), remainder
+
+    root = type('LookupRoot', (ObjectDispatcher, ), {'index': _action,
+                                                     'product': ProductController()})()
+
+    rnd = random.Random(entities)
+    requests = []
+    for i in range(500):
+        action = rnd.choice(['', '/details', '/edit'])
+        requests.append(('/product/%d%s' % (rnd.randrange(entities), action), 'GET', {}))
+    return root, requests
+
+
+def build_slugs(slugs=20000):
+    """Articles looked up by slug like ``/article/some-title-1234/comments``,
+    with more distinct slugs than the path translation memo and the
+    lookup cache hold, so with ``--threads`` they churn concurrently"""
+    class Article(ObjectDispatcher):
+        def __init__(self, slug):
+            self.slug = slug
+
+        def index(self):
+            pass
+
+        def comments(self, page=None):
+            pass
+
+    class ArticlesController(ObjectDispatcher):
+        @cached_lookup(maxsize=1024)
+        def _lookup(self, slug, *remainder):
+            return Article(slug), remainder
+
+    root = type('SlugsRoot', (ObjectDispatcher, ), {'index': _action,
+                                                    'article': ArticlesController()})()
+
+    rnd = random.Random(slugs)
+    requests = []
+    for i in range(5000):
+        action = rnd.choice(['', '/comments'])
+        requests.append(('/article/a-title-%d%s' % (rnd.randrange(slugs), action), 'GET', {}))
+    return root, requests
+
+
+def build_default(width=50):
+    """Controllers resolving most of the requests through ``_default``"""
+    attrs = {'index': _action}
+    for i in range(width):
+        sub_attrs = _exposed_methods(2)
+        sub_attrs['_default'] = _action
+        attrs['sub%d' % i] = type('DefaultSub%d' % i, (ObjectDispatcher, ), sub_attrs)()
+    attrs['_default'] = _action
+    root = type('DefaultRoot', (ObjectDispatcher, ), attrs)()
+
+    rnd = random.Random(width)
+    requests = []
+    for i in range(500):
+        if rnd.random() < 0.2:
+            path = '/missing%d/x' % i
+        else:
+            path = '/sub%d/page%d/%d' % (rnd.randrange(width), rnd.randrange(20), i)
+        requests.append((path, 'GET', {}))
+    return root, requests
+
+
+SCENARIOS = {
+    'wide': build_wide,
+    'deep': build_deep,
+    'longpath': build_longpath,
+    'rest': build_rest,
+    'lookup': build_lookup,
+    'default': build_default,
+    'slugs': build_slugs,
+}
@@ -0,0 +1,130 @@
+"""
+This module implements asynchronous dispatch, it requires Python 3.5 or newer.
+
+:meth:`crank.dispatchstate.DispatchState.resolve_async` follows the same rules
+of :meth:`crank.dispatchstate.DispatchState.resolve`, see
+:func:`crank.objectdispatcher._dispatch_steps`, but when a ``_check_security``,
+``_lookup`` or custom ``_dispatch`` hook returns an awaitable it is awaited,
+so those hooks can be declared with ``async def``. Plain controllers are
+walked without ever suspending.
+
+Controllers dispatched by :class:`crank.restdispatcher.RestDispatcher` are
+dispatched synchronously, their hooks cannot be asynchronous. The root
+``_route_cache``, ``_notfound_cache`` and ``_defer_security_checks`` are
+honoured, the ``_route_index`` is not used.
+"""
+import sys
+
+from webob.exc import HTTPNotFound
+
+from crank.lookups import _cancel_speculative_lookups
+from crank.objectdispatcher import _dispatch_steps, _object_dispatch_func
+from crank.routecache import _route_key
+from crank.security import _security_plan_steps
+from crank.util import _is_awaitable
+
+__all__ = ['resolve_async', 'dispatch_async']
+
+
+async def _run_steps(steps):
+    """Drives a generator of dispatch steps awaiting what it yields"""
+    try:
+        awaitable = next(steps)
+        while True:
+            try:
+                result = await awaitable
+            except BaseException:
+                awaitable = steps.throw(*sys.exc_info())
+            else:
+                awaitable = steps.send(result)
+    except StopIteration:
+        pass
+
+
+async def _run_security_plan(controllers):
+    for check in _security_plan_steps(controllers):
+        await check
+
+
+async def resolve_async(state):
+    """Resolves ``state`` awaiting the asynchronous hooks met along the way.
+
+    Same as :meth:`crank.dispatchstate.DispatchState.resolve`, which
+    returns ``await resolve_async(state)`` from ``state.resolve_async()``.
+    """
+    if state._action is not None:
+        raise RuntimeError('Trying to resolve an already resolved DispatchState')
+
+    try:
+        return await _resolve_notfound(state)
+    finally:
+        if state._lookup_futures:
+            _cancel_speculative_lookups(state)
+
+
+async def _resolve_notfound(state):
+    notfound_cache = getattr(state.root_dispatcher, '_notfound_cache', None)
+    if notfound_cache is None:
+        return await _resolve_route(state)
+
+    key = _route_key(state)
+    security_plan = notfound_cache._routes.get(key)
+    if security_plan is not None:
+        await _run_security_plan(security_plan)
+        raise HTTPNotFound()
+    try:
+        return await _resolve_route(state)
+    except HTTPNotFound:
+        notfound_cache._record_notfound(state, key)
+        raise
+
+
+async def _resolve_route(state):
+    route_cache = getattr(state.root_dispatcher, '_route_cache', None)
+    if route_cache is None:
+        return await _dispatch_root(state)
+
+    key = _route_key(state)
+    entry = route_cache._routes.get(key)
+    if entry is not None:
+        await _run_security_plan(entry[3])
+        return route_cache._apply(state, entry)
+
+    state = await _dispatch_root(state)
+    entry = route_cache._record(state)
+    if entry is not None:
+        route_cache._routes.set(key, entry)
+    return state
+
+
+async def _dispatch_root(state):
+    root = state.root_dispatcher
+    if state._security_plan is not None or not getattr(root, '_defer_security_checks', False):
+        return await dispatch_async(root, state, state.path)
+
+    security_plan = state._security_plan = []
+    try:
+        state = await dispatch_async(root, state, state.path)
+    except BaseException:
+        await _run_security_plan(security_plan)
+        raise
+    await _run_security_plan(security_plan)
+    return state
+
+
+async def dispatch_async(dispatcher, state, remainder):
+    """Dispatches ``remainder`` starting from the ``dispatcher`` controller.
+
+    Custom ``_dispatch`` methods declared with ``async def`` can await it
+    to hand dispatch back to crank.
+    """
+    dispatch = dispatcher._dispatch
+    if getattr(dispatch, '__func__', None) is _object_dispatch_func:
+        outcome = []
+        await _run_steps(_dispatch_steps(dispatcher, state, remainder, outcome))
+        return outcome[0]
+
+    result = dispatch(state, remainder)
+    if _is_awaitable(result):
+        result = await result
+    return result
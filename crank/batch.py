@@ -0,0 +1,105 @@
+"""
+This module implements resolution of many paths at once.
+
+Tools like link checkers, sitemap generators or cache warmers need to
+resolve large amounts of URLs against the same controllers tree. The
+:class:`BatchResolver` shares the traversal work between them: static
+portions of the tree are walked through a :class:`crank.routeindex.RouteIndex`,
+paths resolved before are replayed from a :class:`crank.routecache.RouteCache`
+and paths known not to exist are rejected by a
+:class:`crank.routecache.NotFoundCache`. All of them are private to the
+resolver, the root dispatcher is left untouched.
+"""
+from collections import namedtuple
+
+from crank.dispatchstate import CompactDispatchState
+from crank.lookups import _cancel_speculative_lookups
+from crank.routecache import RouteCache, NotFoundCache
+from crank.routeindex import RouteIndex
+
+__all__ = ['BatchResolver', 'BatchResult', 'resolve_many']
+
+
+BatchResult = namedtuple('BatchResult', ['path', 'method', 'params', 'state', 'error'])
+
+
+class _BatchRequest(object):
+    __slots__ = ('path_info', 'method', 'params')
+
+    def __init__(self, path_info, method, params):
+        self.path_info = path_info
+        self.method = method
+        self.params = params
+
+
+class BatchResolver(object):
+    """Resolves many ``(path, method, params)`` requests against ``root``.
+
+    Arguments:
+        root
+              root dispatcher of the controllers tree
+        maxsize
+              maximum number of routes and of not found paths remembered
+        notfound_ttl
+              seconds after which a not found path is dispatched again
+        strip_extension, path_translator
+              same as the :class:`crank.dispatchstate.DispatchState` arguments
+    """
+
+    def __init__(self, root, maxsize=4096, notfound_ttl=3600,
+                 strip_extension=True, path_translator=None):
+        self.root = root
+        self.strip_extension = strip_extension
+        self.path_translator = path_translator
+        self.index = RouteIndex(root)
+        self.routes = RouteCache(maxsize)
+        self.notfound = NotFoundCache(maxsize, notfound_ttl)
+
+    def resolve(self, requests):
+        """Iterates over the :class:`BatchResult` of each request.
+
+        ``requests`` is an iterable of ``(path, method, params)`` tuples
+        consumed lazily, results are produced in the same order. When
+        dispatch fails, with an HTTP error or any error raised by the
+        controllers, the result ``state`` is ``None`` and ``error`` is
+        the exception.
+        """
+        root = self.root
+        strip_extension = self.strip_extension
+        path_translator = self.path_translator
+        resolve_route = self._resolve_route
+        notfound = self.notfound
+        for path, method, params in requests:
+            request = _BatchRequest(path, method, dict(params or ()))
+            state = CompactDispatchState(request, root, strip_extension=strip_extension,
+                                         path_translator=path_translator)
+            try:
+                state = notfound.resolve(state, resolve_route)
+            except Exception as e:
+                result = BatchResult(path, method, params, None, e)
+            else:
+                result = BatchResult(path, method, params, state, None)
+            finally:
+                if state._lookup_futures:
+                    _cancel_speculative_lookups(state)
+            yield result
+
+    def _resolve_route(self, state):
+        return self.routes.resolve(state, self._dispatch)
+
+    def _dispatch(self, state):
+        return self.index.dispatch(state, state.path)
+
+    def stats(self):
+        """Returns the counters of the route and not found caches"""
+        return {'routes': self.routes.stats(), 'notfound': self.notfound.stats(),
+                'index_nodes': self.index.nodes}
+
+
+def resolve_many(root, requests, **kw):
+    """Resolves ``requests`` against ``root`` through a :class:`BatchResolver`.
+
+    Accepts the same keyword arguments as :class:`BatchResolver`,
+    returns an iterator over the :class:`BatchResult` of each request.
+    """
+    return BatchResolver(root, **kw).resolve(requests)
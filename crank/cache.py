@@ -0,0 +1,247 @@
+"""
+Caching utilities used by crank.
+
+These are meant to keep dispatch related data around between requests,
+they are bounded in size and keep track of their hit ratio.
+
+All the caches can be shared between threads. Writes are serialized by a
+lock, while lookups never wait for it: refreshing the recency of an entry
+is skipped when another thread is holding the lock. Hit and miss counters
+are not synchronized and can be slightly off under contention.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from timeit import default_timer
+
+__all__ = ['LRUCache', 'TTLCache', 'FunctionCache']
+
+_missing = object()
+
+
+def _move_to_end(data, key):
+    """Marks ``key`` as the most recently used entry of ``data``"""
+    try:
+        data.move_to_end(key)
+    except KeyError:
+        pass
+    except AttributeError:  # pragma: no cover
+        value = data.pop(key, _missing)
+        if value is not _missing:
+            data[key] = value
+
+
+class LRUCache(object):
+    """Bounded mapping that discards the least recently used entries.
+
+    Arguments:
+        maxsize
+              maximum number of entries kept in the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns the value cached for ``key`` and marks it as recently used"""
+        value = self._data.get(key, _missing)
+        if value is _missing:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._touch(key)
+        return value
+
+    def _touch(self, key):
+        lock = self._lock
+        if lock.acquire(False):
+            try:
+                _move_to_end(self._data, key)
+            finally:
+                lock.release()
+
+    def set(self, key, value):
+        """Stores ``value`` for ``key`` evicting the oldest entry if full"""
+        with self._lock:
+            data = self._data
+            data.pop(key, None)
+            data[key] = value
+            if len(data) > self.maxsize:
+                data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Removes ``key`` from the cache, if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def clear(self):
+        """Removes all the entries, counters are preserved"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Returns a dictionary with the cache counters"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class TTLCache(LRUCache):
+    """:class:`LRUCache` whose entries expire after some time.
+
+    Arguments:
+        maxsize
+              maximum number of entries kept in the cache.
+        ttl
+              seconds after which an entry is discarded.
+        clock
+              function returning the current time in seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, clock=default_timer):
+        super(TTLCache, self).__init__(maxsize)
+        self.ttl = ttl
+        self.clock = clock
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Returns the value cached for ``key`` unless it expired"""
+        entry = self._data.get(key, _missing)
+        if entry is _missing:
+            self.misses += 1
+            return default
+
+        expires, value = entry
+        if expires <= self.clock():
+            self.misses += 1
+            with self._lock:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+                    self.expirations += 1
+            return default
+
+        self.hits += 1
+        self._touch(key)
+        return value
+
+    def set(self, key, value):
+        """Stores ``value`` for ``key`` for :attr:`ttl` seconds"""
+        super(TTLCache, self).set(key, (self.clock() + self.ttl, value))
+
+    def purge(self):
+        """Removes all the expired entries"""
+        now = self.clock()
+        with self._lock:
+            data = self._data
+            for key, (expires, value) in list(data.items()):
+                if expires <= now:
+                    del data[key]
+                    self.expirations += 1
+
+    def stats(self):
+        stats = super(TTLCache, self).stats()
+        stats['expirations'] = self.expirations
+        stats['ttl'] = self.ttl
+        return stats
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+
+class FunctionCache(object):
+    """Cache of data computed from functions.
+
+    Functions are referenced weakly whenever possible, so entries are
+    discarded as soon as the function they refer to gets garbage collected.
+    Objects that cannot be weakly referenced are kept alive by the cache.
+
+    As the functions of an application are mostly known upfront, lookups
+    don't track recency and never take the lock: when full the cache
+    discards the oldest stored entry.
+
+    Arguments:
+        maxsize
+              maximum number of entries kept in the cache, ``None``
+              means no limit.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, func, default=None):
+        """Returns the value cached for ``func``"""
+        key = id(func)
+        entry = self._data.get(key)
+        if entry is None or entry[0]() is not func:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return entry[1]
+
+    def set(self, func, value):
+        """Stores ``value`` for ``func`` evicting the oldest stored entry if full"""
+        key = id(func)
+        try:
+            # The callback doesn't take the lock as it might run
+            # from the garbage collector while the lock is held.
+            ref = weakref.ref(func, lambda r, key=key, data=self._data: data.pop(key, None))
+        except TypeError:
+            ref = lambda: func
+
+        with self._lock:
+            data = self._data
+            data.pop(key, None)
+            data[key] = (ref, value)
+            if self.maxsize is not None and len(data) > self.maxsize:
+                data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Removes all the entries, counters are preserved"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Returns a dictionary with the cache counters"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, func):
+        entry = self._data.get(id(func))
+        return entry is not None and entry[0]() is func
@@ -0,0 +1,220 @@
+"""
+This module saves and loads compiled dispatch tables.
+
+Compiling the :class:`crank.dispatchtable.DispatchTable` of every controller
+and inspecting the signature of every exposed method can take a while on
+large trees. :func:`save_dispatch_tables` writes the outcome of that work to
+a ``marshal`` file that :func:`load_dispatch_tables` reads back at startup.
+
+The file is keyed by a hash of the source files of the modules defining the
+controllers (and of this version of crank and of Python): when any of them
+changed, the file is ignored and dispatch tables are introspected as usual.
+Only controller classes that can be imported by name are saved, others are
+always introspected at runtime.
+"""
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from collections import namedtuple
+from importlib import import_module
+from timeit import default_timer
+
+from crank import dispatchtable
+from crank.dispatchtable import warmup_dispatch_tables, _dispatch_tables, _dispatch_tables_lock
+from crank.util import get_argspec, get_argspec_cache, _unwrap_func
+
+__all__ = ['save_dispatch_tables', 'load_dispatch_tables', 'LoadReport']
+
+SCHEMA_VERSION = 2
+
+#os.replace is not available on Python 2, where os.rename overwrites on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+LoadReport = namedtuple('LoadReport', ['loaded', 'tables', 'argspecs', 'duration'])
+
+
+def _class_name(cls):
+    """Importable name of ``cls``, ``None`` when it cannot be imported"""
+    name = '%s:%s' % (cls.__module__, getattr(cls, '__qualname__', cls.__name__))
+    try:
+        if _resolve_class(name) is cls:
+            return name
+    except (ImportError, AttributeError):
+        pass
+    return None
+
+
+def _resolve_class(name):
+    module_name, attr = name.split(':', 1)
+    obj = import_module(module_name)
+    for part in attr.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _table_slots(table_class):
+    slots = []
+    for cls in reversed(table_class.__mro__):
+        for slot in cls.__dict__.get('__slots__', ()):
+            if slot not in slots:
+                slots.append(slot)
+    return slots
+
+
+def _modules_hash(modules):
+    """Hash of the python version, crank and the source of ``modules``"""
+    digest = hashlib.sha1()
+    digest.update(sys.version.encode('utf-8'))
+    for name in sorted(set(modules) | set([dispatchtable.__name__])):
+        digest.update(name.encode('utf-8'))
+        module = sys.modules.get(name)
+        filename = getattr(module, '__file__', None)
+        if filename is None:
+            continue
+        if filename.endswith(('.pyc', '.pyo')):
+            filename = filename[:-1]
+        try:
+            with open(filename, 'rb') as f:
+                digest.update(f.read())
+        except IOError:  # pragma: no cover
+            digest.update(filename.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _class_modules(cls):
+    return [base.__module__ for base in cls.__mro__ if base.__module__ not in ('builtins', '__builtin__')]
+
+
+def save_dispatch_tables(dispatcher, filename, root=None):
+    """Compiles the tables of the tree reachable from ``root`` and saves them.
+
+    ``dispatcher`` and ``root`` have the same meaning they have for
+    :func:`crank.dispatchtable.warmup_dispatch_tables`. Returns the number
+    of tables saved.
+    """
+    warmup_dispatch_tables(dispatcher, root)
+
+    modules = set()
+    tables = []
+    argspecs = []
+    with _dispatch_tables_lock:
+        compiled_tables = list(_dispatch_tables.items())
+    for (dispatcher_type, controller_type), table in compiled_tables:
+        names = (_class_name(dispatcher_type), _class_name(controller_type),
+                 _class_name(type(table)))
+        if None in names:
+            continue
+
+        values = tuple(getattr(table, slot) for slot in _table_slots(type(table)))
+        try:
+            marshal.dumps(values)
+        except ValueError:  # pragma: no cover
+            continue
+        tables.append(names + (values, ))
+        modules.update(_class_modules(dispatcher_type))
+        modules.update(_class_modules(controller_type))
+        modules.update(_class_modules(type(table)))
+
+        for name in table.exposed:
+            method = getattr(controller_type, name, None)
+            if method is None:
+                continue
+            try:
+                argspec = get_argspec(method)
+                marshal.dumps(argspec)
+            except (TypeError, ValueError):
+                continue
+            argspecs.append((names[1], name, argspec))
+
+    data = {
+        'schema': SCHEMA_VERSION,
+        'modules': sorted(modules),
+        'hash': _modules_hash(modules),
+        'tables': tables,
+        'argspecs': argspecs,
+    }
+    #write aside and move in place, so readers never see a partial file
+    fd, tmpname = tempfile.mkstemp(prefix='.crank-tables-', suffix='.tmp',
+                                   dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(marshal.dumps(data))
+        _replace(tmpname, filename)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+    return len(tables)
+
+
+def load_dispatch_tables(filename):
+    """Loads the tables saved by :func:`save_dispatch_tables`.
+
+    Returns a :class:`LoadReport`, its ``loaded`` attribute is ``False``
+    when the file is missing, invalid or out of date, in which case
+    nothing is loaded. Tables already compiled in this process are kept.
+    """
+    start = default_timer()
+    try:
+        with open(filename, 'rb') as f:
+            data = marshal.loads(f.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return LoadReport(False, 0, 0, default_timer() - start)
+
+    if not isinstance(data, dict) or data.get('schema') != SCHEMA_VERSION:
+        return LoadReport(False, 0, 0, default_timer() - start)
+
+    modules = data['modules']
+    try:
+        for name in modules:
+            import_module(name)
+    except ImportError:
+        return LoadReport(False, 0, 0, default_timer() - start)
+
+    if _modules_hash(modules) != data['hash']:
+        return LoadReport(False, 0, 0, default_timer() - start)
+
+    classes = {}
+    def resolve(name):
+        try:
+            return classes[name]
+        except KeyError:
+            try:
+                cls = _resolve_class(name)
+            except (ImportError, AttributeError):
+                cls = None
+            classes[name] = cls
+            return cls
+
+    loaded_tables = 0
+    for dispatcher_name, controller_name, table_name, values in data['tables']:
+        dispatcher_type = resolve(dispatcher_name)
+        controller_type = resolve(controller_name)
+        table_class = resolve(table_name)
+        if dispatcher_type is None or controller_type is None or table_class is None:
+            continue
+
+        key = (dispatcher_type, controller_type)
+        if key in _dispatch_tables:
+            continue
+
+        table = table_class.__new__(table_class)
+        for slot, value in zip(_table_slots(table_class), values):
+            setattr(table, slot, value)
+        if _dispatch_tables.setdefault(key, table) is table:
+            loaded_tables += 1
+
+    loaded_argspecs = 0
+    argspec_cache = get_argspec_cache()
+    for controller_name, name, argspec in data['argspecs']:
+        controller_type = resolve(controller_name)
+        method = getattr(controller_type, name, None)
+        if method is None:
+            continue
+        func = _unwrap_func(method)
+        if argspec_cache.get(func) is None:
+            argspec_cache.set(func, tuple(argspec))
+            loaded_argspecs += 1
+
+    return LoadReport(True, loaded_tables, loaded_argspecs, default_timer() - start)
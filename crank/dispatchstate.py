@@ -1,8 +1,11 @@
 """
 This module implements the :class:`DispatchState` class
+and its :class:`CompactDispatchState` variant.
 """
 import warnings
 
+from crank.lookups import _cancel_speculative_lookups
+from crank.security import run_security_plan
 from crank.util import default_path_translator, noop_translation
 
 try:
@@ -11,38 +14,34 @@ except NameError: # pragma: no cover
     string_type = str
 
 
-class DispatchState(object):
-    """
-    This class keeps around all the pertainent info for the state
-    of the dispatch as it traverses through the tree.  This allows
-    us to attach things like routing args and to keep track of the
-    path the controller takes along the system.
-    
-    Arguments:
-        request 
-              object, must have a path_info attribute if path_info is not provided
-        dispatcher
-              dispatcher object to get the ball rolling
-        params
-              parameters to pass into the dispatch state will use request.params
-        path_info
-              pre-split list of path elements, will use request.pathinfo if not used
-        strip_extension
-              Whenever crank should strip the url extension or not resolving the path
-        path_translator
-              Function used to perform path escaping when looking for controller methods,
-              can be None to perform no escaping or True to use default escaping function.
-    """
+class BaseDispatchState(object):
+    """Implementation shared by :class:`DispatchState` and :class:`CompactDispatchState`"""
+    __slots__ = ('_request', '_path_translator', '_strip_extension', '_path', '_extension',
+                 '_ignored_parameters', '_params', '_root_dispatcher', '_controller',
+                 '_controller_path', '_routing_args', '_action', '_remainder',
+                 '_notfound_stack', '_cacheable', '_tracer', '_translations',
+                 '_translated_path', '_lookup_futures', '_security_plan', 'http_method',
+                 '__weakref__')
 
     def __init__(self, request, dispatcher, params=None, path_info=None,
-                 ignore_parameters=None, strip_extension=True, path_translator=None):
+                 ignore_parameters=None, strip_extension=True, path_translator=None,
+                 tracer=None):
+        self._controller_path = []
+        self._notfound_stack = []
+        self._setup(request, dispatcher, params, path_info,
+                    ignore_parameters, strip_extension, path_translator, tracer)
+
+    def _setup(self, request, dispatcher, params, path_info,
+               ignore_parameters, strip_extension, path_translator, tracer=None):
         self._request = request
+        self._tracer = tracer
 
         if path_translator is None:
             path_translator = noop_translation
         elif path_translator is True:
             path_translator = default_path_translator
         self._path_translator = path_translator
+        self._translations = None
 
         self._strip_extension = strip_extension
         self.set_path(path_info)
@@ -54,19 +53,42 @@ class DispatchState(object):
 
         self._root_dispatcher = dispatcher
         self._controller = None
-        self._controller_path = []
-        self._routing_args = {}
+        self._routing_args = None
         self._action = None
         self._remainder = None
-        self._notfound_stack = []
+        self._cacheable = True
+        self._lookup_futures = None
+        self._security_plan = None
 
+        # the containers are emptied by _reset when the state is recycled
         self.add_controller('/', dispatcher)
 
+    def _reset(self):
+        """Drops all references to the request and controllers"""
+        self._request = self._params = None
+        self._root_dispatcher = self._controller = None
+        self._action = self._remainder = None
+        self._routing_args = None
+        self._tracer = None
+        self._translations = self._translated_path = None
+        self._lookup_futures = self._security_plan = None
+        del self._controller_path[:]
+        del self._notfound_stack[:]
+        try:
+            del self.http_method
+        except AttributeError:
+            pass
+
     @property
     def root_dispatcher(self):
         """Root Dispatcher instance that initiated the dispatch flow"""
         return self._root_dispatcher
 
+    @property
+    def tracer(self):
+        """The :class:`crank.tracing.DispatchTracer` recording dispatch hops, if any"""
+        return self._tracer
+
     @property
     def request(self):
         """The request that originated the dispatch process"""
@@ -77,6 +99,16 @@ class DispatchState(object):
         """The path (URL) that has to be dispatched"""
         return self._path
 
+    @property
+    def translated_path(self):
+        """The :attr:`path` with each piece passed through the path translator"""
+        translated_path = self._translated_path
+        if translated_path is None:
+            translate = self.translate_path_piece
+            translated_path = [translate(piece) for piece in self._path]
+            self._translated_path = translated_path
+        return translated_path
+
     @property
     def extension(self):
         """Extension of the URL (only if strip_extension is enabled).
@@ -151,11 +183,11 @@ class DispatchState(object):
         except IndexError:
             pass
 
-        try:
-            while not path[-1]:
-                path = path[:-1]
-        except IndexError:
-            pass
+        end = len(path)
+        while end and not path[end - 1]:
+            end -= 1
+        if end < len(path):
+            path = path[:end]
 
         # rob the extension
         self._extension = None
@@ -165,6 +197,7 @@ class DispatchState(object):
             self._extension = ext
             path[-1] = end
         self._path = path
+        self._translated_path = None
 
     def resolve(self):
         """Once a DispatchState is created resolving it performs the dispatch.
@@ -175,10 +208,74 @@ class DispatchState(object):
         """
         if self._action is not None:
             raise RuntimeError('Trying to resolve an already resolved DispatchState')
-        return self._root_dispatcher._dispatch(self, self._path)
+
+        root = self._root_dispatcher
+        try:
+            notfound_cache = getattr(root, '_notfound_cache', None)
+            if notfound_cache is not None:
+                return notfound_cache.resolve(self)
+            route_cache = getattr(root, '_route_cache', None)
+            if route_cache is not None:
+                return route_cache.resolve(self)
+            return self._dispatch_root()
+        finally:
+            if self._lookup_futures:
+                _cancel_speculative_lookups(self)
+
+    def resolve_async(self):
+        """Awaitable version of :meth:`resolve`, requires Python 3.5 or newer.
+
+        ``_check_security``, ``_lookup`` and custom ``_dispatch`` hooks can
+        return awaitables, which get awaited. See :mod:`crank.asyncdispatch`.
+        """
+        from crank.asyncdispatch import resolve_async
+        return resolve_async(self)
+
+    def _resolve_route(self):
+        route_cache = getattr(self._root_dispatcher, '_route_cache', None)
+        if route_cache is not None:
+            return route_cache.resolve(self)
+        return self._dispatch_root()
+
+    def _dispatch_root(self):
+        root = self._root_dispatcher
+        route_index = getattr(root, '_route_index', None)
+        if self._security_plan is not None or not getattr(root, '_defer_security_checks', False):
+            if route_index is not None:
+                return route_index.dispatch(self, self._path)
+            return root._dispatch(self, self._path)
+
+        #pure security checks are collected during dispatch and run at the end
+        security_plan = self._security_plan = []
+        try:
+            if route_index is not None:
+                state = route_index.dispatch(self, self._path)
+            else:
+                state = root._dispatch(self, self._path)
+        except BaseException:
+            #a denied authorization wins over any dispatch error
+            run_security_plan(security_plan)
+            raise
+        run_security_plan(security_plan)
+        return state
 
     def translate_path_piece(self, path_piece):
-        return self._path_translator(path_piece=path_piece)
+        """Applies the path translator to ``path_piece``.
+
+        Each path piece is translated only once per DispatchState.
+        """
+        translator = self._path_translator
+        if translator is noop_translation:
+            return path_piece
+
+        translations = self._translations
+        if translations is None:
+            translations = self._translations = {}
+        try:
+            return translations[path_piece]
+        except KeyError:
+            translated = translations[path_piece] = translator(path_piece=path_piece)
+            return translated
 
     def add_routing_args(self, current_path, remainder, fixed_args, var_args):
         """
@@ -186,14 +283,15 @@ class DispatchState(object):
         at the current_path. This is mostly used during REST dispatch to keep
         track of intermediate arguments and make them always available.
         """
+        routing_args = self.routing_args
         i = 0
         for i, arg in enumerate(fixed_args):
             if i >= len(remainder):
                 break
-            self._routing_args[arg] = remainder[i]
+            routing_args[arg] = remainder[i]
         remainder = remainder[i:]
         if var_args and remainder:
-            self._routing_args[current_path] = remainder
+            routing_args[current_path] = list(remainder)
 
     @property
     def routing_args(self):
@@ -204,6 +302,8 @@ class DispatchState(object):
         of REST it will include intermediate arguments retrieved during dispatch
         of parent controllers.
         """
+        if self._routing_args is None:
+            self._routing_args = {}
         return self._routing_args
 
     def add_method(self, method, remainder):  # pragma: no cover
@@ -222,3 +322,79 @@ class DispatchState(object):
         warnings.warn(".dispatcher is deprecated, please use .root_dispatcher instead",
                       DeprecationWarning, stacklevel=2)
         return self.root_dispatcher
+
+
+class DispatchState(BaseDispatchState):
+    """
+    This class keeps around all the pertainent info for the state
+    of the dispatch as it traverses through the tree.  This allows
+    us to attach things like routing args and to keep track of the
+    path the controller takes along the system.
+    
+    Arguments:
+        request 
+              object, must have a path_info attribute if path_info is not provided
+        dispatcher
+              dispatcher object to get the ball rolling
+        params
+              parameters to pass into the dispatch state will use request.params
+        path_info
+              pre-split list of path elements, will use request.pathinfo if not used
+        strip_extension
+              Whenever crank should strip the url extension or not resolving the path
+        path_translator
+              Function used to perform path escaping when looking for controller methods,
+              can be None to perform no escaping or True to use default escaping function.
+        tracer
+              :class:`crank.tracing.DispatchTracer` that should record the dispatch hops.
+    """
+
+
+class CompactDispatchState(BaseDispatchState):
+    """
+    A :class:`DispatchState` that doesn't allow setting arbitrary attributes.
+
+    Having no instance dictionary makes it cheaper to create, which matters
+    for applications serving high request rates. Instances can be
+    recycled through a :class:`DispatchStatePool`.
+    """
+    __slots__ = ()
+
+
+class DispatchStatePool(object):
+    """
+    Keeps around released :class:`CompactDispatchState` instances to reuse them.
+
+    Arguments:
+        maxsize
+              maximum number of idle states kept in the pool.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._free = []
+
+    def acquire(self, request, dispatcher, params=None, path_info=None,
+                ignore_parameters=None, strip_extension=True, path_translator=None,
+                tracer=None):
+        """Returns a state ready to be resolved, accepts the same
+        arguments as :class:`DispatchState`."""
+        try:
+            state = self._free.pop()
+        except IndexError:
+            return CompactDispatchState(request, dispatcher, params, path_info,
+                                        ignore_parameters, strip_extension, path_translator,
+                                        tracer)
+
+        state._setup(request, dispatcher, params, path_info,
+                     ignore_parameters, strip_extension, path_translator, tracer)
+        return state
+
+    def release(self, state):
+        """Gives back a state once the request has been served.
+
+        The state must not be used anymore after it has been released.
+        """
+        state._reset()
+        if len(self._free) < self.maxsize:
+            self._free.append(state)
@@ -0,0 +1,310 @@
+"""
+This module implements compiled dispatch tables.
+
+A dispatch table is a snapshot of everything the object dispatch needs to
+know about a controller class: which attributes are exposed methods, which
+ones are sub-controllers and whether the controller provides ``_lookup``,
+``_default``, ``index`` or its own ``_dispatch``.
+
+Tables are built once per (dispatcher class, controller class) couple and
+then reused, so that a dispatch hop can be resolved with a dictionary lookup
+instead of a sequence of ``getattr``/``hasattr`` calls on the live object.
+
+Compiled dispatch assumes that all the instances of a controller class expose
+the same attributes, which is the case for ordinary controller trees where
+sub-controllers are declared in the class body.
+"""
+import threading
+from collections import deque, namedtuple
+from inspect import isclass, isroutine, ismethod
+from timeit import default_timer
+
+from crank.security import security_check_kind
+from crank.util import get_argspec, get_signature_matcher, get_argument_binder
+
+__all__ = ['DispatchTable', 'RestDispatchTable', 'get_dispatch_table', 'peek_dispatch_table', 'clear_dispatch_tables',
+           'walk_controllers', 'warm_argspec_cache', 'warmup_dispatch_tables',
+           'WarmupReport', 'EXPOSED', 'CHILD']
+
+try:
+    string_type = basestring
+except NameError: # pragma: no cover
+    string_type = str
+
+EXPOSED = 1
+CHILD = 2
+
+_DATA_TYPES = (string_type, bytes, int, float, bool, list, tuple, dict,
+               set, frozenset)
+
+
+def _looks_like_controller(value):
+    """Tells apart sub-controllers from any other kind of attribute."""
+    return not (value is None or isroutine(value) or isclass(value)
+                or isinstance(value, _DATA_TYPES))
+
+
+class DispatchTable(object):
+    """Precomputed dispatch information of a controller class.
+
+    Attributes:
+        names
+              dictionary of public attribute names pointing to
+              :data:`EXPOSED` or :data:`CHILD`
+        exposed
+              names of the exposed methods
+        controllers
+              names of the attributes that look like sub-controllers
+        lookup, default, index
+              whenever the controller has an exposed ``_lookup``,
+              ``_default`` or ``index`` method
+        dynamic
+              whenever the controller defines ``__getattr__`` so attributes
+              must always be looked up on the live object
+        security
+              what the security check does for the controller, see
+              :func:`crank.security.security_check_kind`
+    """
+    __slots__ = ('names', 'exposed', 'controllers', 'lookup', 'default',
+                 'index', 'dynamic', 'security')
+
+    def __init__(self, dispatcher, controller):
+        is_exposed = dispatcher._is_exposed
+
+        names = {}
+        exposed = []
+        controllers = []
+        for name in dir(controller):
+            if name.startswith('_'):
+                continue
+
+            value = getattr(controller, name, None)
+            if value is None:
+                continue
+
+            if is_exposed(controller, name):
+                names[name] = EXPOSED
+                exposed.append(name)
+            else:
+                names[name] = CHILD
+                if _looks_like_controller(value):
+                    controllers.append(name)
+
+        self.names = names
+        self.exposed = frozenset(exposed)
+        self.controllers = frozenset(controllers)
+        self.lookup = bool(hasattr(controller, '_lookup') and is_exposed(controller, '_lookup'))
+        self.default = bool(hasattr(controller, '_default') and is_exposed(controller, '_default'))
+        self.index = bool(is_exposed(controller, 'index'))
+        self.dynamic = hasattr(type(controller), '__getattr__')
+        self.security = security_check_kind(dispatcher, controller)
+
+    def __repr__(self):
+        return '<DispatchTable exposed=%r controllers=%r>' % (sorted(self.exposed),
+                                                              sorted(self.controllers))
+
+
+class RestDispatchTable(DispatchTable):
+    """Precomputed REST dispatch information of a controller class.
+
+    In addition to what :class:`DispatchTable` provides, it knows which
+    attributes are REST sub-controllers and which custom ``<verb>_<name>``
+    actions the controller exposes.
+
+    Attributes:
+        rest_controllers
+              names of the attributes considered sub-controllers
+              by :meth:`RestDispatcher._is_controller`
+        prefixed
+              dictionary mapping ``(prefix, name)`` to the name of the
+              exposed ``prefix_name`` method
+        sub_getter
+              ``(fixed_args, var_args)`` of the ``get_one`` or ``get`` method
+              used to detect sub-controllers nested after the resource id,
+              ``None`` when the controller has neither of them
+    """
+    __slots__ = ('rest_controllers', 'prefixed', 'sub_getter')
+
+    def __init__(self, dispatcher, controller):
+        super(RestDispatchTable, self).__init__(dispatcher, controller)
+        exposed = self.exposed
+
+        self.rest_controllers = frozenset(name for name in self.names
+                                          if dispatcher._is_controller(controller, name))
+
+        prefixed = {}
+        for name in exposed:
+            prefix, sep, suffix = name.partition('_')
+            if sep and suffix:
+                prefixed[(prefix, suffix)] = name
+        self.prefixed = prefixed
+
+        self.sub_getter = None
+        for name in ('get_one', 'get'):
+            if hasattr(controller, name):
+                fixed_args, var_args = get_argspec(getattr(controller, name))[:2]
+                self.sub_getter = (fixed_args, var_args)
+                break
+
+    def custom_get(self, name):
+        """Name of the method handling ``GET .../name``"""
+        method = self.prefixed.get(('get', name))
+        if method is None and name in self.exposed:
+            method = name
+        return method
+
+    def custom_method(self, http_method, name):
+        """Name of the method handling a custom ``http_method`` for ``.../name``"""
+        method = self.prefixed.get((http_method, name))
+        if method is None:
+            if name in self.exposed:
+                method = name
+            else:
+                method = self.prefixed.get(('post', name))
+        return method
+
+
+_dispatch_tables = {}
+_dispatch_tables_lock = threading.RLock()
+def get_dispatch_table(dispatcher, controller):
+    """Returns the :class:`DispatchTable` for ``controller``.
+
+    The table is built the first time a controller class is met by
+    a given dispatcher class and reused afterwards. Dispatchers can
+    choose the kind of table through their ``_dispatch_table_class``
+    attribute.
+
+    Lookups don't lock, building tables is serialized so that
+    each table is built only once even when many threads need it.
+    """
+    key = (type(dispatcher), type(controller))
+    try:
+        return _dispatch_tables[key]
+    except KeyError:
+        pass
+
+    with _dispatch_tables_lock:
+        table = _dispatch_tables.get(key)
+        if table is None:
+            table_class = getattr(dispatcher, '_dispatch_table_class', DispatchTable)
+            table = _dispatch_tables[key] = table_class(dispatcher, controller)
+        return table
+
+
+def peek_dispatch_table(dispatcher, controller):
+    """Returns the :class:`DispatchTable` for ``controller`` if it was already
+    compiled, ``None`` otherwise."""
+    return _dispatch_tables.get((type(dispatcher), type(controller)))
+
+
+def clear_dispatch_tables():
+    """Forgets all the compiled dispatch tables.
+
+    Useful when controller classes are modified at runtime.
+    """
+    with _dispatch_tables_lock:
+        _dispatch_tables.clear()
+
+
+def walk_controllers(root):
+    """Iterates over the controllers reachable from ``root``.
+
+    Yields ``(path, controller)`` tuples where path is the tuple of
+    attribute names that lead to the controller. Only attributes are
+    followed, controllers returned by ``_lookup`` are not traversed.
+    Each controller instance is visited only once.
+    """
+    seen = set()
+    pending = deque([((), root)])
+    while pending:
+        path, controller = pending.popleft()
+        if id(controller) in seen:
+            continue
+        seen.add(id(controller))
+
+        yield path, controller
+
+        for name in sorted(dir(controller)):
+            if name.startswith('_'):
+                continue
+            value = getattr(controller, name, None)
+            if _looks_like_controller(value):
+                pending.append((path + (name,), value))
+
+
+def warm_argspec_cache(root):
+    """Computes the argspec of all the methods reachable from ``root``.
+
+    This avoids paying the cost of signature inspection during the first
+    requests served. Returns the number of methods inspected.
+    """
+    count = 0
+    for path, controller in walk_controllers(root):
+        for name in dir(controller):
+            if name.startswith('__'):
+                continue
+            method = getattr(controller, name, None)
+            if not ismethod(method):
+                continue
+            try:
+                get_argspec(method)
+            except (TypeError, ValueError):  # pragma: no cover
+                continue
+            count += 1
+    return count
+
+
+WarmupReport = namedtuple('WarmupReport', ['nodes', 'actions', 'duration'])
+
+
+def warmup_dispatch_tables(dispatcher, root=None):
+    """Compiles the dispatch tables of all controllers reachable from ``root``.
+
+    Controllers are walked following their attributes, like
+    :func:`walk_controllers` does, and the same dispatcher that would
+    handle them during a request is used to build their table. Argspecs of
+    exposed methods are computed too.
+
+    As all the data ends up in module level caches, running the warmup
+    before forking workers allows them to share it.
+
+    Returns a :class:`WarmupReport` with the number of compiled controllers,
+    the number of exposed methods and the time it took in seconds.
+    """
+    from crank.objectdispatcher import ObjectDispatcher
+    start = default_timer()
+    if root is None:
+        root = dispatcher
+
+    nodes = actions = 0
+    seen = set()
+    pending = deque([(dispatcher, root)])
+    while pending:
+        dispatcher, controller = pending.popleft()
+        if id(controller) in seen:
+            continue
+        seen.add(id(controller))
+
+        own_dispatch = getattr(controller, '_dispatch', None)
+        if getattr(own_dispatch, '__self__', None) is controller:
+            if not isinstance(controller, ObjectDispatcher):
+                #custom dispatchers have nothing to compile
+                continue
+            dispatcher = controller
+
+        table = get_dispatch_table(dispatcher, controller)
+        nodes += 1
+
+        for name in table.exposed:
+            method = getattr(controller, name)
+            try:
+                get_signature_matcher(method)
+                get_argument_binder(method)
+            except (TypeError, ValueError):  # pragma: no cover
+                continue
+            actions += 1
+
+        for name in table.controllers:
+            pending.append((dispatcher, getattr(controller, name)))
+
+    return WarmupReport(nodes, actions, default_timer() - start)
@@ -0,0 +1,241 @@
+"""
+This module implements the helpers for ``_lookup`` methods.
+
+When a path misses, dispatch goes back up the tree calling the ``_lookup``
+methods recorded along the way, deepest first, until one of them leads to
+an action. Lookups marked with :func:`speculative` declare that their
+outcome doesn't depend on the other lookups having run, so when the root
+dispatcher has a ``_lookup_executor`` (like a
+:class:`concurrent.futures.ThreadPoolExecutor`) the first miss starts all
+the speculative lookups still on the stack on the executor::
+
+    class RootController(ObjectDispatcher):
+        _lookup_executor = ThreadPoolExecutor(8)
+
+    class ProductsController(object):
+        @speculative
+        def _lookup(self, product_id, *remainder):
+            return ProductController(load_product(product_id)), remainder
+
+They are still evaluated in stack order, the first one leading to an action
+wins and lookups whose result ends up unused are discarded, those that didn't
+start yet are cancelled once the path is resolved. As they run on
+other threads, speculative lookups must not rely on thread locals.
+
+Lookups whose result only depends on the path segments they consume can be
+decorated with :func:`cached_lookup`, the controller they return is then
+reused by the following requests for the same segments.
+"""
+import threading
+import weakref
+from functools import wraps
+from timeit import default_timer
+
+from crank.cache import TTLCache
+
+__all__ = ['speculative', 'call_lookup', 'cached_lookup', 'LookupCache',
+           'lookup_cache_stats']
+
+#caches of the live cached lookups by id, WeakSet requires Python 2.7
+_lookup_caches = weakref.WeakValueDictionary()
+_lookup_caches_lock = threading.Lock()
+
+
+def speculative(func):
+    """Marks a ``_lookup`` as safe to be started ahead of its turn"""
+    func._crank_speculative = True
+    return func
+
+
+def _lookup_key(meth, remainder):
+    return (id(getattr(meth, '__self__', None)), getattr(meth, '__func__', meth),
+            tuple(remainder))
+
+
+def _start_speculative_lookups(executor, state, loop=None):
+    futures = state._lookup_futures
+    if futures is None:
+        futures = state._lookup_futures = {}
+
+    for m_type, meth, m_remainder, warning in state._notfound_stack:
+        if m_type != 'lookup' or not getattr(meth, '_crank_speculative', False):
+            continue
+        key = _lookup_key(meth, m_remainder)
+        if key in futures:
+            continue
+        if loop is not None and _is_coroutine_function(meth):
+            #on the executor the coroutine would only be created, not run
+            futures[key] = loop.create_task(meth(*m_remainder))
+        else:
+            futures[key] = executor.submit(meth, *m_remainder)
+
+
+def _is_coroutine_function(func):
+    import asyncio
+    return asyncio.iscoroutinefunction(func)
+
+
+def call_lookup(state, meth, m_remainder, asynchronous=False):
+    """Calls the ``meth`` lookup popped from the notfound stack of ``state``.
+
+    Returns the ``(controller, remainder)`` tuple of the lookup, which
+    was possibly computed ahead of time by the ``_lookup_executor``.
+
+    When ``asynchronous`` is true, lookups computed ahead of time are
+    returned as awaitables instead of waiting for them, and speculative
+    coroutine lookups are started as tasks of the running event loop.
+    """
+    futures = state._lookup_futures
+    if futures:
+        future = futures.pop(_lookup_key(meth, m_remainder), None)
+        if future is not None:
+            if asynchronous:
+                import asyncio
+                return asyncio.wrap_future(future)
+            return future.result()
+
+    executor = getattr(state._root_dispatcher, '_lookup_executor', None)
+    if executor is not None:
+        loop = None
+        if asynchronous:
+            import asyncio
+            loop = asyncio.get_event_loop()
+        _start_speculative_lookups(executor, state, loop)
+    return meth(*m_remainder)
+
+
+def _cancel_speculative_lookups(state):
+    """Cancels the speculative lookups of ``state`` that were never used"""
+    futures = state._lookup_futures
+    state._lookup_futures = None
+    for future in futures.values():
+        if not future.cancel() and future.done():
+            #unused errors are not worth a warning from asyncio
+            future.exception()
+
+
+class LookupCache(object):
+    """Results of a ``_lookup`` method keyed by controller and consumed segments.
+
+    Arguments:
+        maxsize
+              maximum number of results kept in the cache.
+        ttl
+              seconds after which the lookup is called again.
+        clock
+              function returning the current time in seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, clock=default_timer):
+        self._entries = TTLCache(maxsize, ttl, clock)
+        self._lengths = ()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, controller, remainder):
+        """Returns the cached ``(controller, remainder)`` result, if any"""
+        for length in self._lengths:
+            if length > len(remainder):
+                continue
+            entry = self._entries.get((id(controller), tuple(remainder[:length])))
+            if entry is not None and entry[0] is controller:
+                self.hits += 1
+                return entry[1], remainder[length:]
+        self.misses += 1
+        return None
+
+    def set(self, controller, remainder, result):
+        """Caches the ``result`` of a lookup called with ``remainder``.
+
+        Results whose remainder is not what is left of ``remainder``
+        once the consumed segments are removed cannot be replayed
+        and are not cached. Neither are results that consumed no segment,
+        as they would be served for any path.
+        """
+        new_controller, new_remainder = result
+        consumed = len(remainder) - len(new_remainder)
+        if consumed <= 0 or tuple(remainder[consumed:]) != tuple(new_remainder):
+            return
+
+        if consumed not in self._lengths:
+            #longest first, so that longer prefixes are not shadowed by shorter ones
+            self._lengths = tuple(sorted(set(self._lengths) | set([consumed]), reverse=True))
+        self._entries.set((id(controller), tuple(remainder[:consumed])),
+                          (controller, new_controller))
+
+    def invalidate(self, controller=None, segments=None):
+        """Forgets the cached results.
+
+        When ``controller`` is provided only its results are removed, when
+        ``segments`` is provided only the results for paths starting
+        with those segments are removed.
+        """
+        if controller is None and segments is None:
+            return self._entries.clear()
+
+        if segments is not None:
+            segments = tuple(segments)
+        for key in self._entries.keys():
+            if controller is not None and key[0] != id(controller):
+                continue
+            if segments is not None and key[1][:len(segments)] != segments:
+                continue
+            self._entries.invalidate(key)
+
+    def stats(self):
+        """Returns a dictionary with the cache counters"""
+        stats = self._entries.stats()
+        stats['hits'] = self.hits
+        stats['misses'] = self.misses
+        return stats
+
+
+def cached_lookup(maxsize=1024, ttl=60, clock=default_timer):
+    """Caches the results of the decorated ``_lookup`` method.
+
+    The controller returned by the lookup is reused for ``ttl`` seconds by
+    requests whose path starts with the same consumed segments, so it must
+    not keep per-request data. Lookups returning awaitables are not cached.
+    The :class:`LookupCache` is available as the ``lookup_cache`` attribute
+    of the method::
+
+        class ProductsController(object):
+            @cached_lookup(maxsize=4096, ttl=300)
+            def _lookup(self, product_id, *remainder):
+                return ProductController(load_product(product_id)), remainder
+
+        ProductsController._lookup.lookup_cache.invalidate(segments=['1234'])
+    """
+    def decorate(func):
+        cache = LookupCache(maxsize, ttl, clock)
+
+        @wraps(func)
+        def _lookup(self, *remainder):
+            result = cache.get(self, remainder)
+            if result is None:
+                result = func(self, *remainder)
+                if not hasattr(result, '__await__'):
+                    cache.set(self, remainder, result)
+            return result
+
+        _lookup.lookup_cache = cache
+        with _lookup_caches_lock:
+            _lookup_caches[id(cache)] = cache
+        return _lookup
+    return decorate
+
+
+def lookup_cache_stats():
+    """Returns the counters of all the :func:`cached_lookup` caches summed up"""
+    with _lookup_caches_lock:
+        caches = list(_lookup_caches.values())
+    totals = {'caches': len(caches), 'hits': 0, 'misses': 0,
+              'evictions': 0, 'expirations': 0, 'size': 0}
+    for cache in caches:
+        stats = cache.stats()
+        for name in ('hits', 'misses', 'evictions', 'expirations', 'size'):
+            totals[name] += stats[name]
+
+    requests = totals['hits'] + totals['misses']
+    totals['hit_rate'] = float(totals['hits']) / requests if requests else 0.0
+    return totals
@@ -16,8 +16,11 @@ class which provides the ordinary TurboGears mechanism.
 
 """
 
-from crank.util import get_argspec, method_matches_args
+from crank.util import get_argspec, method_matches_args, _is_awaitable, _synchronous
 from crank.dispatcher import Dispatcher
+from crank.dispatchtable import get_dispatch_table, warmup_dispatch_tables, EXPOSED, CHILD
+from crank.lookups import call_lookup, lookup_cache_stats
+from crank.security import security_check_kind, PURE_CHECK
 from webob.exc import HTTPNotFound
 from inspect import ismethod
 
@@ -65,6 +68,30 @@ class ObjectDispatcher(Dispatcher):
     _use_lax_params = False
     _use_index_fallback = True
 
+    #Change to True to resolve each hop through a per-class compiled
+    #dispatch table instead of inspecting the controller on every request
+    _use_compiled_dispatch = False
+
+    #Set to a crank.routecache.RouteCache on the root dispatcher
+    #to replay already resolved routes
+    _route_cache = None
+
+    #Set to a crank.routecache.NotFoundCache on the root dispatcher
+    #to reject already failed paths without dispatching them
+    _notfound_cache = None
+
+    #Set to a crank.routeindex.RouteIndex on the root dispatcher
+    #to walk the static parts of the tree without recursion
+    _route_index = None
+
+    #Change to True on the root dispatcher to run the crank.security.pure_security_check
+    #hooks all at once when the path is resolved
+    _defer_security_checks = False
+
+    #Set to a concurrent.futures.Executor on the root dispatcher to start
+    #the crank.lookups.speculative lookups concurrently when a path misses
+    _lookup_executor = None
+
     def _is_exposed(self, controller, name):
         """Override this function to define how a controller method is
         determined to be exposed.
@@ -78,13 +105,58 @@ class ObjectDispatcher(Dispatcher):
         """
         return ismethod(getattr(controller, name, False))
 
+    def _warmup(self, freeze=False, tables_file=None):
+        """Compiles the dispatch tables of the controllers tree.
+
+        Meant to be called on the root controller at application startup,
+        before forking workers, so that the first requests don't pay for
+        introspection. When ``freeze`` is True and the interpreter supports
+        it, ``gc.freeze`` is called afterwards so that the garbage collector
+        doesn't touch (and thus copy) the pages shared with the workers.
+
+        When ``tables_file`` is provided the compiled tables are loaded
+        from it, if the file is missing or out of date it gets written
+        with the tables compiled by the warmup. See :mod:`crank.compiledtables`.
+
+        Returns a :class:`crank.dispatchtable.WarmupReport`.
+        """
+        if tables_file is not None:
+            from crank.compiledtables import load_dispatch_tables, save_dispatch_tables
+            if not load_dispatch_tables(tables_file).loaded:
+                save_dispatch_tables(self, tables_file)
+
+        report = warmup_dispatch_tables(self)
+        if freeze:
+            import gc
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+        return report
+
+    def _cache_stats(self):
+        """Returns the counters of the caches used by dispatch.
+
+        ``lookups`` sums up all the :func:`crank.lookups.cached_lookup`
+        caches, ``routes`` and ``notfound`` are reported when the
+        dispatcher has a ``_route_cache`` or a ``_notfound_cache``.
+        """
+        stats = {'lookups': lookup_cache_stats()}
+        if self._route_cache is not None:
+            stats['routes'] = self._route_cache.stats()
+        if self._notfound_cache is not None:
+            stats['notfound'] = self._notfound_cache.stats()
+        return stats
+
+    def _is_pure_security_check(self, controller):
+        #hooks can be set on instances, so the live controller is inspected
+        return security_check_kind(self, controller) == PURE_CHECK
+
     def _perform_security_check(self, controller):
         #xxx do this better
         obj = getattr(controller, 'im_self', controller)
 
         security_check = getattr(obj, '_check_security', None)
         if security_check is not None:
-            security_check()
+            _synchronous(security_check())
 
     def _dispatch_controller(self, current_path, controller, state, remainder):
         """
@@ -111,28 +183,46 @@ class ObjectDispatcher(Dispatcher):
         tree until we found a method which matches with a default or lookup method.
         """
 
+        tracer = state._tracer
+        if tracer is not None:
+            started = tracer.clock()
+
         if not state._notfound_stack:
             if self._use_index_fallback:
                 #see if there is an index
                 current_controller = state.controller
                 method = getattr(current_controller, 'index', None)
                 if method:
-                    if method_matches_args(method, state.params, remainder, self._use_lax_params):
+                    if tracer is not None:
+                        tracer.hop(started, current_controller, None, 'index')
+                        started = tracer.clock()
+                    matches = method_matches_args(method, state.params, remainder, self._use_lax_params)
+                    if tracer is not None:
+                        tracer.hop(started, current_controller, None, 'match')
+                        started = tracer.clock()
+                    if matches:
                         state.set_action(current_controller.index, remainder)
                         return state
+            if tracer is not None:
+                tracer.hop(started, state.controller, None, 'notfound')
             raise HTTPNotFound
         else:
         
             m_type, meth, m_remainder, warning = state._notfound_stack.pop()
 
             if m_type == 'lookup':
-                new_controller, new_remainder = meth(*m_remainder)
+                state._cacheable = False
+                new_controller, new_remainder = _synchronous(call_lookup(state, meth, m_remainder))
+                if tracer is not None:
+                    tracer.hop(started, getattr(meth, '__self__', None), m_remainder[0] if m_remainder else None, 'lookup')
                 state.add_controller(new_controller.__class__.__name__, new_controller)
                 dispatcher = getattr(new_controller, '_dispatch', self._dispatch)
                 r = dispatcher(state, new_remainder)
                 return r
             elif m_type == 'default':
                 state.set_action(meth, m_remainder)
+                if tracer is not None:
+                    tracer.hop(started, getattr(meth, '__self__', None), m_remainder[0] if m_remainder else None, 'default')
                 return state
 #        raise HTTPNotFound
 
@@ -140,54 +230,410 @@ class ObjectDispatcher(Dispatcher):
         """
         This method defines how the object dispatch mechanism works, including
         checking for security along the way.
+
+        Dispatch proceeds in a loop, one controller per iteration. Moving to
+        a sub-controller that has no ``_dispatch`` or relies on the standard
+        object dispatch doesn't require a new call, any other ``_dispatch``
+        method or ``_dispatch_controller`` override is called as usual.
         """
+        dispatcher = self
+        dispatcher_type = type(dispatcher)
+        inline = (dispatcher_type._dispatch == _object_dispatch and
+                  dispatcher_type._dispatch_controller == _object_dispatch_controller)
+        tracer = state._tracer
+
+        #the path is walked by position, slicing it only when needed
+        path = remainder
+        length = len(path) if path else 0
+        i = 0
+        while True:
+            current_controller = state.controller
+
+            #skip any empty urls
+            while i < length and not(path[i]):
+                i += 1
+                if not inline:
+                    return dispatcher._dispatch(state, path[i:])
+            remainder = path[i:] if i else path
+
+            if dispatcher._use_compiled_dispatch:
+                table = get_dispatch_table(dispatcher, current_controller)
+                enter_controller = dispatcher._enter_controller
+                if getattr(enter_controller, '__func__', None) is _object_enter_controller_func:
+                    enter_controller(state, remainder, table)
+                else:
+                    #overrides don't know about compiled tables
+                    enter_controller(state, remainder)
+            else:
+                table = None
+                dispatcher._enter_controller(state, remainder)
+
+            #the security check is a hop of its own
+            if tracer is not None:
+                started = tracer.clock()
+
+            #we are plumb out of path, check for index
+            if i == length:
+                if table is not None:
+                    has_index = table.index
+                else:
+                    has_index = dispatcher._is_exposed(current_controller, 'index')
+                if has_index:
+                    if tracer is not None:
+                        tracer.hop(started, current_controller, None, 'index')
+                        started = tracer.clock()
+                    matches = method_matches_args(current_controller.index, state.params, remainder,
+                                                  dispatcher._use_lax_params)
+                    if tracer is not None:
+                        tracer.hop(started, current_controller, None, 'match')
+                    if matches:
+                        state.set_action(current_controller.index, remainder)
+                        return state
+                #if there is no index, head up the tree
+                #to see if there is a default or lookup method we can use
+                return dispatcher._dispatch_first_found_default_or_lookup(state, remainder)
+
+            current_path = state.translate_path_piece(path[i])
+
+            if table is not None:
+                kind = table.names.get(current_path)
+                if kind is None and (table.dynamic or current_path[:1] == '_'):
+                    #private and dynamic attributes are not compiled, look them up
+                    if dispatcher._is_exposed(current_controller, current_path):
+                        kind = EXPOSED
+                    elif getattr(current_controller, current_path, None) is not None:
+                        kind = CHILD
+
+                if kind is None:
+                    return dispatcher._dispatch_first_found_default_or_lookup(state, remainder)
+                exposed = kind == EXPOSED
+            else:
+                exposed = dispatcher._is_exposed(current_controller, current_path)
+
+            #an exposed method matching the path is found
+            if exposed:
+                #check to see if the argspec jives
+                controller = getattr(current_controller, current_path)
+                current_args = path[i+1:]
+                if tracer is not None:
+                    tracer.hop(started, current_controller, current_path, 'exposed')
+                    started = tracer.clock()
+                matches = method_matches_args(controller, state.params, current_args, dispatcher._use_lax_params)
+                if tracer is not None:
+                    tracer.hop(started, current_controller, current_path, 'match')
+                    started = tracer.clock()
+                if matches:
+                    state.set_action(controller, current_args)
+                    return state
+
+            #another controller is found
+            parent_controller = current_controller
+            current_controller = getattr(current_controller, current_path, None)
+            if current_controller is None:
+                #dispatch not found
+                return dispatcher._dispatch_first_found_default_or_lookup(state, remainder)
+
+            if tracer is not None:
+                tracer.hop(started, parent_controller, current_path, 'controller')
+
+            if not inline:
+                return dispatcher._dispatch_controller(current_path, current_controller,
+                                                       state, path[i+1:])
+
+            #same as _dispatch_controller, without recursing when possible
+            child_dispatch = getattr(current_controller, '_dispatch', None)
+            state.add_controller(current_path, current_controller)
+            if child_dispatch is not None:
+                if getattr(child_dispatch, '__func__', None) is not _object_dispatch_func:
+                    return child_dispatch(state, path[i+1:])
+                dispatcher = child_dispatch.__self__
+                inline = _uses_object_dispatch(dispatcher)
+            i += 1
+
+    def _enter_controller(self, state, remainder, table=None, perform_check=None):
+        '''Checks security and pushes any notfound (lookup or default) handlers
+        onto the stack
+
+        Returns the outcome of the security check, which is performed
+        by ``perform_check`` when provided.
+        '''
+        current_controller = state.controller
+        result = None
+        if table is None or table.security or _has_security_hook(current_controller):
+            if perform_check is None:
+                perform_check = self._perform_security_check
+            security_plan = state._security_plan
+            tracer = state._tracer
+            if security_plan is not None and self._is_pure_security_check(current_controller):
+                security_plan.append(current_controller)
+            elif tracer is None:
+                result = perform_check(current_controller)
+            else:
+                started = tracer.clock()
+                result = perform_check(current_controller)
+                tracer.hop(started, current_controller, remainder[0] if remainder else None, 'security')
+
+        if table is not None:
+            if table.lookup:
+                state._notfound_stack.append(('lookup', current_controller._lookup, remainder, None))
+            if table.default:
+                state._notfound_stack.append(('default', current_controller._default, remainder, None))
+            return result
+
+        if hasattr(current_controller, '_lookup') and self._is_exposed(current_controller, '_lookup'):
+            state._notfound_stack.append(('lookup', current_controller._lookup, remainder, None))
+        if hasattr(current_controller, '_default') and self._is_exposed(current_controller, '_default'):
+            state._notfound_stack.append(('default', current_controller._default, remainder, None))
+        return result
+
+
+def _has_security_hook(controller):
+    #dispatch tables are per class, this catches hooks set on the instance
+    obj = getattr(controller, 'im_self', controller)
+    return getattr(obj, '_check_security', None) is not None
+
+
+def _call_security_check(controller):
+    obj = getattr(controller, 'im_self', controller)
+    security_check = getattr(obj, '_check_security', None)
+    if security_check is not None:
+        return security_check()
+
+
+def _enter_controller_awaiting(dispatcher, state, remainder, table):
+    """Same as ``dispatcher._enter_controller``, returning awaitables
+    from the security checks instead of refusing them."""
+    enter_controller = dispatcher._enter_controller
+    if getattr(enter_controller, '__func__', None) is not _object_enter_controller_func:
+        return enter_controller(state, remainder)
+
+    perform_check = dispatcher._perform_security_check
+    if getattr(perform_check, '__func__', None) is _object_security_check_func:
+        perform_check = _call_security_check
+    return enter_controller(state, remainder, table, perform_check)
+
+
+def _dispatch_steps(dispatcher, state, remainder, outcome):
+    """Object dispatch of ``remainder`` starting from ``dispatcher`` for :mod:`crank.asyncdispatch`.
+
+    Follows the same rules of :meth:`ObjectDispatcher._dispatch` and
+    :meth:`ObjectDispatcher._dispatch_first_found_default_or_lookup`,
+    but when a hook returns an awaitable it is yielded and dispatch
+    resumes once the result is sent back. The outcome of dispatch is
+    appended to the ``outcome`` list.
+    """
+    inline = _uses_object_dispatch(dispatcher)
+    tracer = state._tracer
+    notfound = False
+
+    #the path is walked by position, slicing it only when needed
+    path = remainder
+    length = len(path) if path else 0
+    i = 0
+    while True:
+        if notfound:
+            notfound = False
+            first_found = dispatcher._dispatch_first_found_default_or_lookup
+            if getattr(first_found, '__func__', None) is not _object_first_found_func:
+                result = first_found(state, remainder)
+                if _is_awaitable(result):
+                    result = yield result
+                outcome.append(result)
+                return
+
+            if tracer is not None:
+                started = tracer.clock()
+
+            if not state._notfound_stack:
+                if dispatcher._use_index_fallback:
+                    #see if there is an index
+                    current_controller = state.controller
+                    method = getattr(current_controller, 'index', None)
+                    if method:
+                        if tracer is not None:
+                            tracer.hop(started, current_controller, None, 'index')
+                            started = tracer.clock()
+                        matches = method_matches_args(method, state.params, remainder, dispatcher._use_lax_params)
+                        if tracer is not None:
+                            tracer.hop(started, current_controller, None, 'match')
+                            started = tracer.clock()
+                        if matches:
+                            state.set_action(current_controller.index, remainder)
+                            outcome.append(state)
+                            return
+                if tracer is not None:
+                    tracer.hop(started, state.controller, None, 'notfound')
+                raise HTTPNotFound
+
+            m_type, meth, m_remainder, warning = state._notfound_stack.pop()
+            if m_type == 'default':
+                state.set_action(meth, m_remainder)
+                if tracer is not None:
+                    tracer.hop(started, getattr(meth, '__self__', None), m_remainder[0] if m_remainder else None, 'default')
+                outcome.append(state)
+                return
+            elif m_type != 'lookup':
+                outcome.append(None)
+                return
+
+            state._cacheable = False
+            result = call_lookup(state, meth, m_remainder, asynchronous=True)
+            if _is_awaitable(result):
+                result = yield result
+            new_controller, new_remainder = result
+            if tracer is not None:
+                tracer.hop(started, getattr(meth, '__self__', None), m_remainder[0] if m_remainder else None, 'lookup')
+            state.add_controller(new_controller.__class__.__name__, new_controller)
+
+            new_dispatch = getattr(new_controller, '_dispatch', dispatcher._dispatch)
+            if getattr(new_dispatch, '__func__', None) is not _object_dispatch_func:
+                result = new_dispatch(state, new_remainder)
+                if _is_awaitable(result):
+                    result = yield result
+                outcome.append(result)
+                return
+
+            #keep walking the remainder returned by the lookup
+            dispatcher = new_dispatch.__self__
+            inline = _uses_object_dispatch(dispatcher)
+            path = new_remainder
+            length = len(path) if path else 0
+            i = 0
+
         current_controller = state.controller
 
         #skip any empty urls
-        if remainder and not(remainder[0]):
-            return self._dispatch(state, remainder[1:])
+        while i < length and not(path[i]):
+            i += 1
+            if not inline and \
+               getattr(dispatcher._dispatch, '__func__', None) is not _object_dispatch_func:
+                result = dispatcher._dispatch(state, path[i:])
+                if _is_awaitable(result):
+                    result = yield result
+                outcome.append(result)
+                return
+        remainder = path[i:] if i else path
+
+        if dispatcher._use_compiled_dispatch:
+            table = get_dispatch_table(dispatcher, current_controller)
+        else:
+            table = None
+
+        result = _enter_controller_awaiting(dispatcher, state, remainder, table)
+        if _is_awaitable(result):
+            yield result
 
-        self._enter_controller(state, remainder)
+        #the security check is a hop of its own
+        if tracer is not None:
+            started = tracer.clock()
 
         #we are plumb out of path, check for index
-        if not remainder:
-            if self._is_exposed(current_controller, 'index') and \
-               method_matches_args(current_controller.index, state.params, remainder, self._use_lax_params):
-                state.set_action(current_controller.index, remainder)
-                return state
+        if i == length:
+            if table is not None:
+                has_index = table.index
+            else:
+                has_index = dispatcher._is_exposed(current_controller, 'index')
+            if has_index:
+                if tracer is not None:
+                    tracer.hop(started, current_controller, None, 'index')
+                    started = tracer.clock()
+                matches = method_matches_args(current_controller.index, state.params, remainder,
+                                              dispatcher._use_lax_params)
+                if tracer is not None:
+                    tracer.hop(started, current_controller, None, 'match')
+                if matches:
+                    state.set_action(current_controller.index, remainder)
+                    outcome.append(state)
+                    return
             #if there is no index, head up the tree
             #to see if there is a default or lookup method we can use
-            return self._dispatch_first_found_default_or_lookup(state, remainder)
-
-
-        current_path = state.translate_path_piece(remainder[0])
-        current_args = remainder[1:]
+            notfound = True
+            continue
+
+        current_path = state.translate_path_piece(path[i])
+
+        if table is not None:
+            kind = table.names.get(current_path)
+            if kind is None and (table.dynamic or current_path[:1] == '_'):
+                #private and dynamic attributes are not compiled, look them up
+                if dispatcher._is_exposed(current_controller, current_path):
+                    kind = EXPOSED
+                elif getattr(current_controller, current_path, None) is not None:
+                    kind = CHILD
+
+            if kind is None:
+                notfound = True
+                continue
+            exposed = kind == EXPOSED
+        else:
+            exposed = dispatcher._is_exposed(current_controller, current_path)
 
         #an exposed method matching the path is found
-        if self._is_exposed(current_controller, current_path):
+        if exposed:
             #check to see if the argspec jives
             controller = getattr(current_controller, current_path)
-            if method_matches_args(controller, state.params, current_args, self._use_lax_params):
+            current_args = path[i+1:]
+            if tracer is not None:
+                tracer.hop(started, current_controller, current_path, 'exposed')
+                started = tracer.clock()
+            matches = method_matches_args(controller, state.params, current_args, dispatcher._use_lax_params)
+            if tracer is not None:
+                tracer.hop(started, current_controller, current_path, 'match')
+                started = tracer.clock()
+            if matches:
                 state.set_action(controller, current_args)
-                return state
+                outcome.append(state)
+                return
 
         #another controller is found
+        parent_controller = current_controller
         current_controller = getattr(current_controller, current_path, None)
-        if current_controller is not None:
-            return self._dispatch_controller(current_path, current_controller,
-                                             state, current_args)
-
-        #dispatch not found
-        return self._dispatch_first_found_default_or_lookup(state, remainder)
-
-    def _enter_controller(self, state, remainder):
-        '''Checks security and pushes any notfound (lookup or default) handlers
-        onto the stack
-        '''
-        current_controller = state.controller
-        self._perform_security_check(current_controller)
-        if hasattr(current_controller, '_lookup') and self._is_exposed(current_controller, '_lookup'):
-            state._notfound_stack.append(('lookup', current_controller._lookup, remainder, None))
-        if hasattr(current_controller, '_default') and self._is_exposed(current_controller, '_default'):
-            state._notfound_stack.append(('default', current_controller._default, remainder, None))
-            
+        if current_controller is None:
+            #dispatch not found
+            notfound = True
+            continue
+
+        if tracer is not None:
+            tracer.hop(started, parent_controller, current_path, 'controller')
+
+        if not inline:
+            result = dispatcher._dispatch_controller(current_path, current_controller,
+                                                     state, path[i+1:])
+            if _is_awaitable(result):
+                result = yield result
+            outcome.append(result)
+            return
+
+        #same as _dispatch_controller, without recursing when possible
+        child_dispatch = getattr(current_controller, '_dispatch', None)
+        state.add_controller(current_path, current_controller)
+        if child_dispatch is not None:
+            if getattr(child_dispatch, '__func__', None) is not _object_dispatch_func:
+                result = child_dispatch(state, path[i+1:])
+                if _is_awaitable(result):
+                    result = yield result
+                outcome.append(result)
+                return
+            dispatcher = child_dispatch.__self__
+            inline = _uses_object_dispatch(dispatcher)
+        i += 1
+
+
+def _stock(name):
+    method = getattr(ObjectDispatcher, name)
+    return getattr(method, '__func__', method)
+
+_object_dispatch = ObjectDispatcher._dispatch
+_object_dispatch_func = _stock('_dispatch')
+_object_dispatch_controller = ObjectDispatcher._dispatch_controller
+_object_enter_controller_func = _stock('_enter_controller')
+_object_security_check_func = _stock('_perform_security_check')
+_object_first_found_func = _stock('_dispatch_first_found_default_or_lookup')
+
+
+def _uses_object_dispatch(dispatcher):
+    """Whenever the dispatch loop can move through ``dispatcher`` controllers
+    without calling its ``_dispatch`` and ``_dispatch_controller`` methods."""
+    dispatcher_type = type(dispatcher)
+    return (dispatcher_type._dispatch == _object_dispatch and
+            dispatcher_type._dispatch_controller == _object_dispatch_controller)
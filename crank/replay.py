@@ -0,0 +1,305 @@
+"""
+This module replays access logs through dispatch to profile routing.
+
+Each request line of the log is dispatched through a
+:class:`crank.dispatchstate.DispatchState` against a root controller and :class:`LogReplay` aggregates, for each action,
+how many requests it served and how long dispatching them took, together
+with a projection of the hit rate a :class:`crank.routecache.RouteCache` of
+a given size would get on that traffic.
+
+Logs are read one line at a time, so their size doesn't matter, and only the
+aggregates are kept in memory. Lines in the Common or Combined Log Format are
+understood, as well as lines made of ``METHOD /path`` or of a bare path.
+Gzip compressed logs are supported::
+
+    python -m crank.replay myapp.controllers.root:RootController access.log.gz
+
+Lines that aren't valid UTF-8 are counted as skipped. Dispatch time is measured
+bypassing the ``_route_cache`` and ``_notfound_cache`` of the root, unless
+``--caches`` is given, so that it reflects the cost of walking the controllers.
+
+Dispatch runs the actual ``_lookup`` and ``_check_security`` hooks of the
+controllers, so they must be safe to call outside of a real request.
+"""
+import argparse
+import gzip
+import io
+import json
+import re
+import sys
+from timeit import default_timer
+
+from webob.exc import HTTPException
+
+from crank.cache import LRUCache
+from crank.dispatchstate import DispatchState
+from crank.lookups import _cancel_speculative_lookups
+from crank.routecache import RouteCache
+from crank.routes import load_root
+
+try:
+    from urllib.parse import parse_qsl, unquote
+except ImportError:  # pragma: no cover
+    from urlparse import parse_qsl
+    from urllib import unquote
+
+__all__ = ['LogReplay', 'parse_log_line', 'open_log', 'format_report', 'main']
+
+SCHEMA_VERSION = 1
+
+_REQUEST_RE = re.compile(r'"([A-Z]+) (\S+)(?: HTTP/[0-9.]+)?"')
+_PLAIN_RE = re.compile(r'^(?:([A-Z]+)\s+)?(/\S*|[A-Za-z][A-Za-z0-9+.-]*://\S*)')
+#scheme and authority of absolute-form request targets
+_ABSOLUTE_RE = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]*://[^/?]*')
+
+
+def parse_log_line(line):
+    """Extracts ``(method, path, query_string)`` from an access log line.
+
+    Absolute-form targets like ``http://host/path`` are reduced to their
+    path. Returns ``None`` for lines that contain no request.
+    """
+    match = _REQUEST_RE.search(line) or _PLAIN_RE.match(line.strip())
+    if match is None:
+        return None
+
+    method, target = match.groups()
+    path, sep, query = _ABSOLUTE_RE.sub('', target).partition('?')
+    return method or 'GET', path or '/', query
+
+
+def open_log(filename):
+    """Opens a log file for reading as bytes, ``-`` is the standard input.
+
+    Lines are decoded one by one by :meth:`LogReplay.replay`, so that
+    those that aren't valid UTF-8 can be told apart.
+    """
+    if filename == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin)
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    return io.open(filename, 'rb')
+
+
+class _ReplayRequest(object):
+    __slots__ = ('path_info', 'method', 'params')
+
+    def __init__(self, path_info, method, params):
+        self.path_info = path_info
+        self.method = method
+        self.params = params
+
+
+def _resolve_uncached(state):
+    """Resolves ``state`` without the route and not found caches of the root"""
+    try:
+        return state._dispatch_root()
+    finally:
+        if state._lookup_futures:
+            _cancel_speculative_lookups(state)
+
+
+def _action_name(action):
+    controller = getattr(action, '__self__', None)
+    name = getattr(action, '__name__', repr(action))
+    if controller is None:
+        return name
+    cls = type(controller)
+    return '%s:%s.%s' % (cls.__module__, cls.__name__, name)
+
+
+class LogReplay(object):
+    """Dispatches requests against ``root`` and aggregates the outcome.
+
+    Arguments:
+        root
+              root dispatcher of the controllers tree
+        cache_sizes
+              sizes of the route caches whose hit rate gets projected
+        strip_extension, path_translator
+              same as the :class:`crank.dispatchstate.DispatchState` arguments
+        clock
+              function returning the current time in seconds
+        caches
+              whenever dispatch goes through the ``_route_cache`` and
+              ``_notfound_cache`` of the root
+    """
+
+    def __init__(self, root, cache_sizes=(256, 1024, 4096), strip_extension=True,
+                 path_translator=None, clock=default_timer, caches=False):
+        self.root = root
+        self.caches = caches
+        self.strip_extension = strip_extension
+        self.path_translator = path_translator
+        self.clock = clock
+
+        self.requests = 0
+        self.skipped = 0
+        self.cacheable = 0
+        self.dispatch_time = 0.0
+        self.actions = {}
+        self.errors = {}
+        self._route_cache = RouteCache(1)
+        self._projections = [LRUCache(size) for size in cache_sizes]
+
+    def replay(self, lines):
+        """Dispatches the requests of an iterable of log lines.
+
+        Lines can be text or UTF-8 encoded bytes.
+        """
+        for line in lines:
+            if isinstance(line, bytes):
+                try:
+                    line = line.decode('utf-8')
+                except UnicodeDecodeError:
+                    self.skipped += 1
+                    continue
+            request = parse_log_line(line)
+            if request is None:
+                self.skipped += 1
+                continue
+            self.dispatch(*request)
+        return self
+
+    def dispatch(self, method, path, query=''):
+        """Dispatches a single request and records its outcome"""
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        request = _ReplayRequest(unquote(path), method, params)
+        state = DispatchState(request, self.root, strip_extension=self.strip_extension,
+                              path_translator=self.path_translator)
+
+        self.requests += 1
+        clock = self.clock
+        started = clock()
+        try:
+            if self.caches:
+                state.resolve()
+            else:
+                _resolve_uncached(state)
+        except HTTPException as e:
+            outcome = str(e.code)
+        except Exception as e:
+            outcome = type(e).__name__
+        else:
+            outcome = None
+        duration = clock() - started
+        self.dispatch_time += duration
+
+        if outcome is not None:
+            self.errors[outcome] = self.errors.get(outcome, 0) + 1
+            return
+
+        name = _action_name(state.action)
+        stats = self.actions.get(name)
+        if stats is None:
+            stats = self.actions[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += duration
+        if duration > stats[2]:
+            stats[2] = duration
+
+        if self._route_cache._record(state) is not None:
+            self.cacheable += 1
+            key = (tuple(state.path), method, frozenset(params))
+            for cache in self._projections:
+                if cache.get(key) is None:
+                    cache.set(key, True)
+
+    def report(self, top=None):
+        """Returns the aggregates as a JSON serializable dictionary.
+
+        Actions are sorted by number of requests, only the ``top``
+        ones are reported when it is provided.
+        """
+        actions = []
+        for name, (count, total, longest) in self.actions.items():
+            actions.append({'action': name, 'count': count,
+                            'share': float(count) / self.requests,
+                            'mean_us': total / count * 1e6, 'max_us': longest * 1e6,
+                            'total_ms': total * 1e3})
+        actions.sort(key=lambda stats: (-stats['count'], stats['action']))
+        if top is not None:
+            actions = actions[:top]
+
+        projections = []
+        for cache in self._projections:
+            lookups = cache.hits + cache.misses
+            projections.append({'maxsize': cache.maxsize, 'hits': cache.hits,
+                                'hit_rate': float(cache.hits) / lookups if lookups else 0.0})
+
+        return {
+            'schema': SCHEMA_VERSION,
+            'requests': self.requests,
+            'skipped': self.skipped,
+            'caches': self.caches,
+            'errors': dict(self.errors),
+            'dispatch_ms': self.dispatch_time * 1e3,
+            'cacheable': self.cacheable,
+            'actions': actions,
+            'route_cache': projections,
+        }
+
+
+def format_report(report):
+    """Formats a :meth:`LogReplay.report` as a text table"""
+    lines = ['%d requests, %d lines skipped, %.1fms spent dispatching %s' % (
+        report['requests'], report['skipped'], report['dispatch_ms'],
+        'through the root caches' if report['caches'] else 'bypassing the root caches')]
+    if report['errors']:
+        lines.append('errors: ' + ', '.join('%s %d' % item for item in sorted(report['errors'].items())))
+    lines.append('')
+    lines.append('%8s %7s %10s %10s  %s' % ('count', 'share', 'mean us', 'max us', 'action'))
+    for stats in report['actions']:
+        lines.append('%8d %6.1f%% %10.2f %10.2f  %s' % (
+            stats['count'], stats['share'] * 100, stats['mean_us'], stats['max_us'], stats['action']))
+    lines.append('')
+    lines.append('%d cacheable requests, projected route cache hit rate:' % report['cacheable'])
+    for projection in report['route_cache']:
+        lines.append('%8d entries %6.1f%%' % (projection['maxsize'], projection['hit_rate'] * 100))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replays access logs through crank dispatch')
+    parser.add_argument('root', metavar='MODULE:CONTROLLER',
+                        help='root controller, like myapp.controllers.root:RootController')
+    parser.add_argument('logs', nargs='+', metavar='LOG',
+                        help='access log files, .gz files are decompressed, - reads stdin')
+    parser.add_argument('--top', type=int, default=20,
+                        help='number of actions reported, 0 for all of them')
+    parser.add_argument('--cache-sizes', default='256,1024,4096',
+                        help='comma separated sizes of the projected route caches')
+    parser.add_argument('--caches', action='store_true',
+                        help='dispatch through the root route and not found caches')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    options = parser.parse_args(argv)
+
+    try:
+        cache_sizes = [int(size) for size in options.cache_sizes.split(',') if size]
+    except ValueError:
+        parser.error('invalid --cache-sizes %s' % options.cache_sizes)
+
+    try:
+        root = load_root(options.root)
+    except (ImportError, AttributeError, ValueError) as e:
+        parser.error('unable to load %s: %s' % (options.root, e))
+
+    replay = LogReplay(root, cache_sizes, caches=options.caches)
+    for filename in options.logs:
+        log = open_log(filename)
+        try:
+            replay.replay(log)
+        finally:
+            if filename != '-':
+                log.close()
+
+    report = replay.report(options.top or None)
+    if options.json:
+        sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + '\n')
+    else:
+        sys.stdout.write(format_report(report) + '\n')
+
+
+if __name__ == '__main__':
+    main()
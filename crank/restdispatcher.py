@@ -8,6 +8,7 @@ from inspect import ismethod
 from webob.exc import HTTPMethodNotAllowed
 from crank.util import get_argspec, method_matches_args
 from crank.objectdispatcher import ObjectDispatcher
+from crank.dispatchtable import get_dispatch_table, peek_dispatch_table, RestDispatchTable
 
 
 class RestDispatcher(ObjectDispatcher):
@@ -15,8 +16,38 @@ class RestDispatcher(ObjectDispatcher):
     Please see RestController for a rundown of the controller
     methods used.
     """
+    _dispatch_table_class = RestDispatchTable
+
+    def _compiled_table(self, controller, name=''):
+        """Returns the dispatch table of ``controller`` when compiled dispatch
+        is enabled and the table can answer for ``name``, None otherwise."""
+        if not self._use_compiled_dispatch or name[:1] == '_':
+            return None
+
+        table = get_dispatch_table(self, controller)
+        if table.dynamic:
+            return None
+        return table
+
+    def _has_exposed(self, controller, name):
+        """Same as :meth:`_is_exposed`, relies on the dispatch table when compiled"""
+        table = self._compiled_table(controller, name)
+        if table is not None:
+            return name in table.exposed
+        return self._is_exposed(controller, name)
 
     def _find_first_exposed(self, controller, methods):
+        if self._use_compiled_dispatch:
+            table = self._compiled_table(controller)
+            if table is not None:
+                for method in methods:
+                    if method[:1] == '_':
+                        if self._is_exposed(controller, method):
+                            return getattr(controller, method)
+                    elif method in table.exposed:
+                        return getattr(controller, method)
+                return None
+
         for method in methods:
             if self._is_exposed(controller, method):
                 return getattr(controller, method)
@@ -25,7 +56,8 @@ class RestDispatcher(ObjectDispatcher):
         current_controller = state.controller
         if remainder:
             current_path = remainder[0]
-            if self._is_exposed(current_controller, current_path):
+            is_exposed = self._has_exposed if self._use_compiled_dispatch else self._is_exposed
+            if is_exposed(current_controller, current_path):
                 state.set_action(getattr(current_controller, current_path), remainder[1:])
                 return state
 
@@ -49,7 +81,8 @@ class RestDispatcher(ObjectDispatcher):
             return state
 
         #you may not send a delete request to a non-delete function
-        if remainder and self._is_exposed(current_controller, remainder[0]):
+        is_exposed = self._has_exposed if self._use_compiled_dispatch else self._is_exposed
+        if remainder and is_exposed(current_controller, remainder[0]):
             raise HTTPMethodNotAllowed
 
         # there might be a sub-controller with a delete method, let's go see
@@ -62,7 +95,55 @@ class RestDispatcher(ObjectDispatcher):
                     return r
         return self._dispatch_first_found_default_or_lookup(state, remainder)
 
+    def _check_for_sub_controllers_compiled(self, state, remainder, table):
+        if table.sub_getter is None:
+            return
+
+        current_controller = state.controller
+        fixed_args, var_args = table.sub_getter
+        fixed_arg_length = len(fixed_args)
+        sub_controllers = table.rest_controllers
+        if var_args:
+            #private sub-controllers are not in the table, so even without
+            #sub_controllers the remainder must be checked for them
+            for i, item in enumerate(remainder):
+                item = state.translate_path_piece(item)
+                if item[:1] == '_':
+                    if not (hasattr(current_controller, item) and
+                            self._is_controller(current_controller, item)):
+                        continue
+                elif item not in sub_controllers:
+                    continue
+                state.add_routing_args(item, remainder[:i], fixed_args, var_args)
+                return self._dispatch_controller(item, getattr(current_controller, item),
+                                                 state, remainder[i+1:])
+        elif fixed_arg_length < len(remainder):
+            item = remainder[fixed_arg_length]
+            if item[:1] == '_':
+                found = hasattr(current_controller, item)
+            else:
+                found = item in table.names
+            if not found:
+                return
+
+            item = state.translate_path_piece(item)
+            if item[:1] == '_':
+                found = (hasattr(current_controller, item) and
+                         self._is_controller(current_controller, item))
+            else:
+                found = item in sub_controllers
+
+            if found:
+                state.add_routing_args(item, remainder, fixed_args, var_args)
+                return self._dispatch_controller(item, getattr(current_controller, item),
+                                                 state, remainder[fixed_arg_length+1:])
+
     def _check_for_sub_controllers(self, state, remainder):
+        if self._use_compiled_dispatch:
+            table = self._compiled_table(state.controller)
+            if table is not None:
+                return self._check_for_sub_controllers_compiled(state, remainder, table)
+
         current_controller = state.controller
         method = None
         for find in ('get_one', 'get'):
@@ -100,7 +181,7 @@ class RestDispatcher(ObjectDispatcher):
 
         current_controller = state.controller
 
-        if self._is_exposed(current_controller, method_name):
+        if self._has_exposed(current_controller, method_name):
             method = getattr(current_controller, method_name)
             new_remainder = remainder[:-1]
             if method and method_matches_args(method, state.params, new_remainder, self._use_lax_params):
@@ -113,7 +194,16 @@ class RestDispatcher(ObjectDispatcher):
 
         current_controller = state.controller
 
-        get_method = self._find_first_exposed(current_controller, ('get_%s' % method_name, method_name))
+        table = None
+        if self._use_compiled_dispatch:
+            table = self._compiled_table(current_controller, method_name)
+        if table is not None:
+            get_method = table.custom_get(method_name)
+            if get_method is not None:
+                get_method = getattr(current_controller, get_method)
+        else:
+            get_method = self._find_first_exposed(current_controller, ('get_%s' % method_name, method_name))
+
         if get_method:
             new_remainder = remainder[:-1]
             if method_matches_args(get_method, state.params, new_remainder, self._use_lax_params):
@@ -124,7 +214,16 @@ class RestDispatcher(ObjectDispatcher):
         current_controller = state.controller
         method_name = method
         http_method = state.request.method
-        method = self._find_first_exposed(current_controller, ('%s_%s' %(http_method, method_name), method_name, 'post_%s' %method_name))
+
+        table = None
+        if self._use_compiled_dispatch:
+            table = self._compiled_table(current_controller, method_name)
+        if table is not None:
+            method = table.custom_method(http_method, method_name)
+            if method is not None:
+                method = getattr(current_controller, method)
+        else:
+            method = self._find_first_exposed(current_controller, ('%s_%s' %(http_method, method_name), method_name, 'post_%s' %method_name))
 
         if method and method_matches_args(method, state.params, remainder, self._use_lax_params):
             state.set_action(method, remainder)
@@ -143,12 +242,13 @@ class RestDispatcher(ObjectDispatcher):
 
     def _handle_get(self, method, state, remainder):
         current_controller = state.controller
+        is_exposed = self._has_exposed if self._use_compiled_dispatch else self._is_exposed
         if not remainder:
             method = self._find_first_exposed(current_controller, ('get_all', 'get'))
             if method:
                 state.set_action(method, remainder)
                 return state
-            if self._is_exposed(current_controller, 'get_one'):
+            if is_exposed(current_controller, 'get_one'):
                 method = current_controller.get_one
                 if method and method_matches_args(method, state.params, remainder, self._use_lax_params):
                     state.set_action(method, remainder)
@@ -166,7 +266,7 @@ class RestDispatcher(ObjectDispatcher):
             return r
 
         current_path = state.translate_path_piece(remainder[0])
-        if self._is_exposed(current_controller, current_path):
+        if is_exposed(current_controller, current_path):
             state.set_action(getattr(current_controller, current_path), remainder[1:])
             return state
 
@@ -193,6 +293,12 @@ class RestDispatcher(ObjectDispatcher):
         Override this function to define how an object is determined to be a
         controller.
         """
+        if self._use_compiled_dispatch and name[:1] != '_':
+            # Do not build the table here, as building it relies on _is_controller
+            table = peek_dispatch_table(self, controller)
+            if table is not None and not table.dynamic:
+                return name in table.rest_controllers
+
         method = getattr(controller, name, None)
         if method is not None:
             return not ismethod(method)
@@ -225,8 +331,9 @@ class RestDispatcher(ObjectDispatcher):
         if r is not None:
             return r
 
-        if state.http_method in self._handler_lookup.keys():
-            r = self._handler_lookup[state.http_method](self, state.http_method, state, remainder)
+        handler = self._handler_lookup.get(state.http_method)
+        if handler is not None:
+            r = handler(self, state.http_method, state, remainder)
         else:
             r = self._handle_custom_method(state.http_method, state, remainder)
         return r
@@ -0,0 +1,196 @@
+"""
+This module implements the :class:`RouteCache` and :class:`NotFoundCache` classes
+
+A route cache remembers how a path got resolved so that the following
+requests for the same path can skip walking the controllers tree, while
+a not found cache remembers paths that failed to resolve.
+
+Only routes that are fully determined by the path, the request method and
+the name of the parameters are cached, which is the case for plain object
+dispatch. Routes that went through a ``_lookup``, a custom ``_dispatch``,
+a ``_check_security`` hook or that recorded routing args are always
+dispatched again, unless the hooks are :func:`crank.security.pure_security_check`
+ones: those are run again each time the route is replayed.
+"""
+from crank.cache import LRUCache, TTLCache
+from crank.objectdispatcher import ObjectDispatcher
+from crank.security import security_check_kind, run_security_plan, PURE_CHECK
+from webob.exc import HTTPNotFound
+
+_object_dispatch = getattr(ObjectDispatcher._dispatch, '__func__', ObjectDispatcher._dispatch)
+
+
+class RouteCache(object):
+    """Bounded LRU cache of resolved routes.
+
+    To enable it, assign an instance to the ``_route_cache`` attribute
+    of the root dispatcher::
+
+        root._route_cache = RouteCache(maxsize=2048)
+
+    Arguments:
+        maxsize
+              maximum number of routes kept in the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self._routes = LRUCache(maxsize)
+
+    @property
+    def hits(self):
+        return self._routes.hits
+
+    @property
+    def misses(self):
+        return self._routes.misses
+
+    def stats(self):
+        """Returns a dictionary with hits, misses and size of the cache"""
+        return self._routes.stats()
+
+    def clear(self):
+        """Forgets all the cached routes"""
+        self._routes.clear()
+
+    def invalidate(self, root=None):
+        """Forgets cached routes.
+
+        If ``root`` is provided only the routes resolved starting
+        from that root dispatcher are removed.
+        """
+        if root is None:
+            return self.clear()
+
+        for key in self._routes.keys():
+            if key[0] is root:
+                self._routes.invalidate(key)
+
+    def resolve(self, state, resolver=None):
+        """Resolves ``state``, replaying a cached route when available.
+
+        On a miss ``resolver`` is called with the state to perform the
+        actual dispatch, by default the root dispatcher is used.
+        """
+        key = _route_key(state)
+        entry = self._routes.get(key)
+        if entry is not None:
+            return self._replay(state, entry)
+
+        if resolver is None:
+            state = state._dispatch_root()
+        else:
+            state = resolver(state)
+        entry = self._record(state)
+        if entry is not None:
+            self._routes.set(key, entry)
+        return state
+
+    def _replay(self, state, entry):
+        run_security_plan(entry[3])
+        return self._apply(state, entry)
+
+    def _apply(self, state, entry):
+        controller_path, action, offset, security_plan = entry
+        state._controller_path = list(controller_path)
+        state._controller = controller_path[-1][1]
+        state.set_action(action, state.path[offset:])
+        return state
+
+    def _record(self, state):
+        if not state._cacheable or state._routing_args or state.action is None:
+            return None
+
+        controller_path = state.controller_path
+        security_plan = _security_plan(controller_path)
+        if security_plan is None:
+            return None
+
+        path = state.path
+        remainder = state.remainder
+        if remainder is None:
+            return None
+
+        offset = len(path) - len(remainder)
+        if offset < 0 or tuple(path[offset:]) != tuple(remainder):
+            return None
+
+        return controller_path, state.action, offset, security_plan
+
+
+class NotFoundCache(RouteCache):
+    """Bounded cache of the paths that resolved to ``HTTPNotFound``.
+
+    Requests for a path that is in the cache raise ``HTTPNotFound``
+    right away. Only failures that are fully determined by the path,
+    the request method and the name of the parameters are cached, so
+    paths that went through ``_lookup``, a custom ``_dispatch`` or a
+    ``_check_security`` hook are dispatched again. Side effect free
+    hooks are run again before raising.
+
+    To enable it, assign an instance to the ``_notfound_cache`` attribute
+    of the root dispatcher::
+
+        root._notfound_cache = NotFoundCache(maxsize=4096, ttl=300)
+
+    Arguments:
+        maxsize
+              maximum number of paths kept in the cache.
+        ttl
+              seconds after which a path is dispatched again.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self._routes = TTLCache(maxsize, ttl)
+
+    def resolve(self, state, resolver=None):
+        """Resolves ``state`` unless it is known not to exist.
+
+        ``resolver`` is called with the state to perform the actual
+        dispatch, by default the root route cache or dispatcher is used.
+        """
+        key = _route_key(state)
+        security_plan = self._routes.get(key)
+        if security_plan is not None:
+            run_security_plan(security_plan)
+            raise HTTPNotFound()
+
+        try:
+            if resolver is None:
+                return state._resolve_route()
+            return resolver(state)
+        except HTTPNotFound:
+            self._record_notfound(state, key)
+            raise
+
+    def _record_notfound(self, state, key):
+        if state._cacheable and not state._routing_args:
+            security_plan = _security_plan(state.controller_path)
+            if security_plan is not None:
+                self._routes.set(key, security_plan)
+
+
+def _route_key(state):
+    return (state.root_dispatcher, tuple(state.path),
+            getattr(state.request, 'method', None),
+            frozenset(state.params or ()), state._path_translator)
+
+
+def _security_plan(controller_path):
+    """Controllers whose pure security checks must run to replay a route
+    through ``controller_path``, ``None`` when it cannot be replayed"""
+    security_plan = []
+    dispatcher = None
+    for location, controller in controller_path:
+        own_dispatch = getattr(controller, '_dispatch', None)
+        if own_dispatch is not None:
+            if (not isinstance(controller, ObjectDispatcher) or
+                    getattr(own_dispatch, '__func__', None) is not _object_dispatch):
+                return None
+            dispatcher = controller
+
+        kind = security_check_kind(dispatcher, controller)
+        if kind == PURE_CHECK:
+            security_plan.append(controller)
+        elif kind is not None:
+            return None
+    return tuple(security_plan)
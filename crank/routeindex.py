@@ -0,0 +1,200 @@
+"""
+This module implements the :class:`RouteIndex` class
+
+A route index is a trie of the controllers tree built ahead of time, where
+each node knows the sub-controllers reachable from it by path segment.
+Dispatching through the index walks the path in a loop, with a dictionary
+lookup per segment, instead of recursing through ``_dispatch`` calls.
+
+Only the plain portions of the tree are indexed: when dispatch reaches a
+controller with ``_lookup``, ``_default``, ``__getattr__`` or a custom
+``_dispatch`` it is handed over to the controller dispatcher which
+proceeds as usual from there.
+"""
+from collections import deque
+
+from crank.dispatchtable import get_dispatch_table, EXPOSED
+from crank.objectdispatcher import ObjectDispatcher
+from crank.security import PURE_CHECK, security_check_kind
+from crank.util import get_signature_matcher
+
+__all__ = ['RouteIndex', 'RouteNode']
+
+
+def _stock(name):
+    method = getattr(ObjectDispatcher, name)
+    return getattr(method, '__func__', method)
+
+_DISPATCH_METHODS = ('_dispatch', '_dispatch_controller', '_enter_controller')
+_STOCK_METHODS = dict((name, _stock(name)) for name in _DISPATCH_METHODS)
+
+
+def _is_stock(obj, name):
+    method = getattr(type(obj), name, None)
+    return getattr(method, '__func__', method) is _STOCK_METHODS[name]
+
+
+class RouteNode(object):
+    """A controller in the :class:`RouteIndex` trie.
+
+    Attributes:
+        controller
+              the controller instance
+        dispatcher
+              the dispatcher in charge of the controller
+        table
+              the :class:`crank.dispatchtable.DispatchTable` of the controller,
+              ``None`` for controllers dispatched by a custom ``_dispatch``
+              that is not an :class:`crank.objectdispatcher.ObjectDispatcher`
+        children
+              dictionary of path segments pointing to child nodes
+        plain
+              whenever the index can dispatch this node by itself
+        check_security
+              what the security check does on this node, as returned by
+              :func:`crank.security.security_check_kind`
+    """
+    __slots__ = ('controller', 'dispatcher', 'table', 'children', 'plain', 'check_security')
+
+    def __init__(self, dispatcher, controller):
+        own_dispatch = getattr(controller, '_dispatch', None)
+        if own_dispatch is not None and getattr(own_dispatch, '__self__', None) is controller:
+            dispatcher = controller
+
+        self.controller = controller
+        self.dispatcher = dispatcher
+        self.children = {}
+        if not isinstance(dispatcher, ObjectDispatcher):
+            #custom dispatchers are opaque, their _dispatch gets the whole remainder
+            self.table = None
+            self.plain = False
+            self.check_security = None
+            return
+
+        self.table = table = get_dispatch_table(dispatcher, controller)
+        self.plain = (not (table.lookup or table.default or table.dynamic) and
+                      (own_dispatch is None or dispatcher is controller) and
+                      all(_is_stock(dispatcher, name) for name in _DISPATCH_METHODS))
+
+        self.check_security = security_check_kind(dispatcher, controller)
+
+    def __repr__(self):
+        return '<RouteNode %s plain=%s children=%r>' % (type(self.controller).__name__,
+                                                        self.plain, sorted(self.children))
+
+
+class RouteIndex(object):
+    """Trie of the plain controllers reachable from a root dispatcher.
+
+    To enable it, assign an instance to the ``_route_index`` attribute
+    of the root dispatcher::
+
+        root._route_index = RouteIndex(root)
+
+    The index is a snapshot of the controllers tree, it must be rebuilt
+    through :meth:`rebuild` when the tree changes, after
+    :func:`crank.dispatchtable.clear_dispatch_tables` if controller classes
+    were modified.
+    """
+
+    def __init__(self, root):
+        self.root_dispatcher = root
+        self.rebuild()
+
+    def rebuild(self):
+        """Walks the controllers tree again to build a fresh index.
+
+        The new index replaces the previous one only once complete, so
+        requests dispatched meanwhile by other threads use the old one.
+        """
+        root = RouteNode(self.root_dispatcher, self.root_dispatcher)
+        nodes = 1
+
+        seen = {(id(root.dispatcher), id(root.controller)): root}
+        pending = deque([root])
+        while pending:
+            node = pending.popleft()
+            if not node.plain:
+                continue
+
+            controller = node.controller
+            for name in node.table.controllers:
+                child_controller = getattr(controller, name)
+                key = (id(node.dispatcher), id(child_controller))
+                child = seen.get(key)
+                if child is None:
+                    child = seen[key] = RouteNode(node.dispatcher, child_controller)
+                    pending.append(child)
+                    nodes += 1
+                node.children[name] = child
+
+        self.root = root
+        self.nodes = nodes
+
+    def dispatch(self, state, remainder):
+        """Dispatches ``state`` along ``remainder`` starting from the root"""
+        if state._tracer is not None:
+            return self.root_dispatcher._dispatch(state, remainder)
+
+        params = state.params
+        node = self.root
+        i = 0
+        length = len(remainder)
+        while True:
+            dispatcher = node.dispatcher
+            if not node.plain:
+                #empty urls are left to the dispatcher, as for recursive dispatch
+                return dispatcher._dispatch(state, remainder[i:])
+
+            #skip any empty urls
+            start = i
+            while i < length and not remainder[i]:
+                i += 1
+
+            controller = node.controller
+            table = node.table
+            if i < length:
+                current_path = state.translate_path_piece(remainder[i])
+                if current_path[:1] == '_':
+                    #private attributes are not indexed
+                    return dispatcher._dispatch(state, remainder[start:])
+
+            if node.check_security:
+                security_plan = state._security_plan
+                if security_plan is not None and node.check_security == PURE_CHECK:
+                    security_plan.append(controller)
+                else:
+                    dispatcher._perform_security_check(controller)
+
+            #we are plumb out of path, check for index
+            if i == length:
+                current_args = remainder[i:]
+                if table.index:
+                    method = controller.index
+                    if get_signature_matcher(method).matches(params, 0, dispatcher._use_lax_params):
+                        state.set_action(method, current_args)
+                        return state
+                return dispatcher._dispatch_first_found_default_or_lookup(state, current_args)
+
+            kind = table.names.get(current_path)
+            if kind is None:
+                return dispatcher._dispatch_first_found_default_or_lookup(state, remainder[i:])
+
+            #an exposed method matching the path is found
+            if kind == EXPOSED:
+                method = getattr(controller, current_path)
+                if get_signature_matcher(method).matches(params, length - i - 1,
+                                                         dispatcher._use_lax_params):
+                    state.set_action(method, remainder[i+1:])
+                    return state
+
+            child = node.children.get(current_path)
+            if child is None:
+                #not an indexed controller, let the dispatcher handle it
+                return dispatcher._dispatch_controller(current_path,
+                                                       getattr(controller, current_path),
+                                                       state, remainder[i+1:])
+
+            state.add_controller(current_path, child.controller)
+            node = child
+            i += 1
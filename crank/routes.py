@@ -0,0 +1,268 @@
+"""
+This module exports the route table of a controllers tree.
+
+The tree is walked following the same rules :class:`crank.objectdispatcher.ObjectDispatcher`
+and :class:`crank.restdispatcher.RestDispatcher` apply during dispatch, and each
+reachable action is reported together with the HTTP verb it answers to and
+its arguments. Controllers that take over dispatch through ``_lookup``,
+``_default`` or a custom ``_dispatch`` are reported as boundaries, what is
+below them can only be known at request time.
+
+The table can be dumped as JSON from the command line::
+
+    python -m crank.routes myapp.controllers.root:RootController
+
+"""
+import argparse
+import json
+import sys
+from collections import deque, namedtuple
+from importlib import import_module
+
+from crank.dispatchtable import get_dispatch_table
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.util import get_argspec
+
+__all__ = ['Route', 'collect_routes', 'routes_as_json', 'load_root', 'main']
+
+SCHEMA_VERSION = 1
+
+Route = namedtuple('Route', ['path', 'pattern', 'verb', 'kind', 'action', 'argspec'])
+
+_object_dispatch = getattr(ObjectDispatcher._dispatch, '__func__', ObjectDispatcher._dispatch)
+_rest_dispatch = getattr(RestDispatcher._dispatch, '__func__', RestDispatcher._dispatch)
+
+# (method name, verb, path suffix) of the RestDispatcher conventions,
+# ``None`` suffix means the method arguments follow the path.
+_REST_METHODS = (
+    ('get_all', 'GET', ''),
+    ('get', 'GET', ''),
+    ('get_one', 'GET', None),
+    ('new', 'GET', '/new'),
+    ('edit', 'GET', '/edit'),
+    ('get_delete', 'GET', '/delete'),
+    ('post', 'POST', ''),
+    ('put', 'PUT', None),
+    ('post_delete', 'DELETE', None),
+    ('delete', 'DELETE', None),
+)
+_REST_NAMES = frozenset(name for name, verb, suffix in _REST_METHODS)
+
+
+def _action_name(controller, name):
+    cls = type(controller)
+    return '%s:%s.%s' % (cls.__module__, cls.__name__, name)
+
+
+def _argspec(method):
+    try:
+        args, varargs, varkw, defaults = get_argspec(method)
+    except (TypeError, ValueError):  # pragma: no cover
+        return None
+    return {'args': list(args), 'defaults': len(defaults),
+            'varargs': varargs, 'varkw': varkw}
+
+
+def _pattern(path, argspec, suffix=''):
+    """``/path/{arg}[/{optional}]/*suffix`` pattern of an action"""
+    pattern = path
+    if argspec is not None:
+        args = argspec['args']
+        required = len(args) - argspec['defaults']
+        for i, arg in enumerate(args):
+            if i < required:
+                pattern += '/{%s}' % arg
+            else:
+                pattern += '[/{%s}]' % arg
+        if argspec['varargs']:
+            pattern += '[/*]'
+    pattern += suffix
+    if pattern[:1] != '/':
+        pattern = '/' + pattern
+    return pattern
+
+
+def _dispatch_kind(dispatcher, controller):
+    """How the controller gets dispatched: ``object``, ``rest`` or ``custom``"""
+    own_dispatch = getattr(controller, '_dispatch', None)
+    if own_dispatch is not None:
+        func = getattr(own_dispatch, '__func__', None)
+        if func is _object_dispatch:
+            return 'object', own_dispatch.__self__
+        if func is _rest_dispatch:
+            return 'rest', own_dispatch.__self__
+        return 'custom', dispatcher
+    if isinstance(dispatcher, RestDispatcher):
+        return 'rest', dispatcher
+    return 'object', dispatcher
+
+
+def collect_routes(root):
+    """Lists the :class:`Route` reachable from the ``root`` controller.
+
+    Route kinds are:
+
+        ``exposed``     an exposed method
+        ``index``       the index method of a controller
+        ``rest``        a method answering to a REST verb
+        ``lookup``      a ``_lookup`` method, dispatch continues on what it returns
+        ``default``     a ``_default`` method, catches the paths not found below it
+        ``dispatch``    a custom ``_dispatch`` method
+
+    Each controller instance is visited only once.
+    """
+    routes = []
+    seen = set()
+    pending = deque([('', root, root)])
+    while pending:
+        path, dispatcher, controller = pending.popleft()
+        if id(controller) in seen:
+            continue
+        seen.add(id(controller))
+
+        kind, dispatcher = _dispatch_kind(dispatcher, controller)
+        if kind == 'custom':
+            routes.append(Route(path or '/', (path or '') + '/*', '*', 'dispatch',
+                                _action_name(controller, '_dispatch'), None))
+            continue
+
+        table = get_dispatch_table(dispatcher, controller)
+        if kind == 'rest':
+            children = _rest_routes(routes, path, controller, table)
+        else:
+            children = _object_routes(routes, path, controller, table)
+
+        for boundary in ('lookup', 'default'):
+            if getattr(table, boundary):
+                routes.append(Route(path or '/', path + '/*', '*', boundary,
+                                    _action_name(controller, '_' + boundary), None))
+
+        for child_path, name in children:
+            pending.append((child_path, dispatcher, getattr(controller, name)))
+
+    routes.sort(key=lambda route: (route.path, route.pattern, route.verb))
+    return routes
+
+
+def _object_routes(routes, path, controller, table):
+    for name in sorted(table.exposed):
+        argspec = _argspec(getattr(controller, name))
+        action = _action_name(controller, name)
+        if name == 'index':
+            routes.append(Route(path or '/', _pattern(path, argspec), '*', 'index',
+                                action, argspec))
+        action_path = path + '/' + name
+        routes.append(Route(action_path, _pattern(action_path, argspec), '*', 'exposed',
+                            action, argspec))
+
+    return [(path + '/' + name, name) for name in sorted(table.controllers)]
+
+
+def _rest_routes(routes, path, controller, table):
+    exposed = table.exposed
+
+    for name, verb, suffix in _REST_METHODS:
+        if name not in exposed or (name == 'get' and 'get_all' in exposed):
+            continue
+        argspec = _argspec(getattr(controller, name))
+        if suffix is None:
+            pattern = _pattern(path, argspec)
+        elif suffix:
+            pattern = _pattern(path, argspec, suffix)
+        else:
+            pattern = path or '/'
+        routes.append(Route(path or '/', pattern, verb, 'rest',
+                            _action_name(controller, name), argspec))
+
+    # get_<name> answers to GET .../name while post_<name> answers
+    # to POST requests with the _method=<name> parameter
+    custom = set()
+    for (prefix, name), method_name in sorted(table.prefixed.items()):
+        if method_name in _REST_NAMES or prefix not in ('get', 'post'):
+            continue
+        custom.add(method_name)
+        argspec = _argspec(getattr(controller, method_name))
+        if prefix == 'get':
+            route_path = path + '/' + name
+            pattern = _pattern(path, argspec, '/' + name)
+        else:
+            route_path = path or '/'
+            pattern = _pattern(path, argspec, '?_method=' + name)
+        routes.append(Route(route_path, pattern, prefix.upper(), 'rest',
+                            _action_name(controller, method_name), argspec))
+
+    for name in sorted(exposed - _REST_NAMES - custom):
+        argspec = _argspec(getattr(controller, name))
+        action_path = path + '/' + name
+        routes.append(Route(action_path, _pattern(action_path, argspec), '*', 'exposed',
+                            _action_name(controller, name), argspec))
+
+    # sub-controllers are reachable right after the path and after the resource id
+    children = []
+    nested = ''
+    if table.sub_getter is not None:
+        fixed_args, var_args = table.sub_getter
+        nested = ''.join('/{%s}' % arg for arg in fixed_args)
+        if var_args:
+            nested += '[/*]'
+    for name in sorted(table.rest_controllers):
+        if not nested:
+            children.append((path + '/' + name, name))
+        else:
+            children.append((path + nested + '/' + name, name))
+    return children
+
+
+def routes_as_json(root, root_name=None):
+    """Returns the route table of ``root`` as a JSON serializable dictionary"""
+    return {
+        'schema': SCHEMA_VERSION,
+        'root': root_name or _action_name(root, '')[:-1],
+        'routes': [route._asdict() for route in collect_routes(root)],
+    }
+
+
+def load_root(target):
+    """Imports a controller from a ``package.module:Name`` string.
+
+    When ``Name`` is a class it gets instantiated without arguments.
+    """
+    module_name, sep, attr = target.partition(':')
+    if not sep or not attr:
+        raise ValueError('%r is not in the package.module:Name format' % target)
+
+    obj = import_module(module_name)
+    for part in attr.split('.'):
+        obj = getattr(obj, part)
+    if isinstance(obj, type):
+        obj = obj()
+    return obj
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dumps the route table of a crank controllers tree')
+    parser.add_argument('root', metavar='MODULE:CONTROLLER',
+                        help='root controller, like myapp.controllers.root:RootController')
+    parser.add_argument('--output', '-o', metavar='FILE',
+                        help='write the table to FILE instead of stdout')
+    parser.add_argument('--indent', type=int, default=2,
+                        help='JSON indentation, 0 for a compact output')
+    options = parser.parse_args(argv)
+
+    try:
+        root = load_root(options.root)
+    except (ImportError, AttributeError, ValueError) as e:
+        parser.error('unable to load %s: %s' % (options.root, e))
+
+    table = routes_as_json(root, options.root)
+    output = json.dumps(table, indent=options.indent or None, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
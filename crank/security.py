@@ -0,0 +1,70 @@
+"""
+This module implements the helpers for controller security checks.
+
+Dispatch runs the ``_check_security`` hook of each controller it walks
+through. Compiled dispatch knows from the :class:`crank.dispatchtable.DispatchTable`
+which controller classes have a hook, controllers of other classes are only
+looked up for a hook set on the instance itself.
+
+Hooks decorated with :func:`pure_security_check` declare that they have no
+side effects and only depend on the request, so crank is free to run them at
+a different time:
+
+    - routes going through them can be replayed by a
+      :class:`crank.routecache.RouteCache`, which runs the hooks again.
+    - when the root dispatcher has ``_defer_security_checks = True`` they
+      are collected during dispatch and run all at once when the path is
+      resolved, or before any dispatch error like ``HTTPNotFound`` is raised.
+"""
+from crank.util import _is_awaitable, _synchronous
+
+__all__ = ['pure_security_check', 'security_check_kind', 'run_security_plan',
+           'PURE_CHECK', 'CHECK']
+
+#a side effect free _check_security hook
+PURE_CHECK = 1
+#anything else that must run at its turn
+CHECK = 2
+
+
+def pure_security_check(func):
+    """Marks a ``_check_security`` hook as side effect free"""
+    func._crank_pure = True
+    return func
+
+
+def security_check_kind(dispatcher, controller):
+    """What the ``dispatcher`` security check does for ``controller``.
+
+    Returns ``None`` when there is nothing to run, :data:`PURE_CHECK`
+    when only a side effect free ``_check_security`` runs and
+    :data:`CHECK` otherwise, which is also the case for dispatchers
+    overriding ``_perform_security_check``.
+    """
+    from crank.objectdispatcher import ObjectDispatcher
+    perform_check = getattr(type(dispatcher), '_perform_security_check', None)
+    if perform_check != ObjectDispatcher._perform_security_check:
+        return CHECK
+
+    obj = getattr(controller, 'im_self', controller)
+    security_check = getattr(obj, '_check_security', None)
+    if security_check is None:
+        return None
+    if getattr(security_check, '_crank_pure', False):
+        return PURE_CHECK
+    return CHECK
+
+
+def run_security_plan(controllers):
+    """Runs the ``_check_security`` hook of each of ``controllers`` in order"""
+    for result in _security_plan_steps(controllers):
+        _synchronous(result)
+
+
+def _security_plan_steps(controllers):
+    """Runs the plan yielding the awaitables returned by the hooks"""
+    for controller in controllers:
+        obj = getattr(controller, 'im_self', controller)
+        result = obj._check_security()
+        if _is_awaitable(result):
+            yield result
@@ -0,0 +1,82 @@
+"""
+This module implements dispatch tracing.
+
+When a :class:`DispatchTracer` is provided to a
+:class:`crank.dispatchstate.DispatchState` each decision taken by the
+dispatchers is reported to the tracer sink as a :class:`DispatchHop`.
+When no tracer is provided the cost for the dispatchers is a single
+attribute check per hop.
+
+Decisions reported are:
+
+    ``security``     the controller ``_check_security`` hook was run
+    ``exposed``      an exposed method was found for the path piece
+    ``controller``   the path piece led to a sub-controller
+    ``index``        the path ended on a controller with an ``index`` method
+    ``match``        the parameters were matched against the arguments
+                     of the method found by the previous hop
+    ``lookup``       a ``_lookup`` method was called
+    ``default``      a ``_default`` method was selected
+    ``notfound``     dispatch failed and HTTPNotFound will be raised
+
+Hops don't overlap, so their durations can be summed up.
+"""
+import json
+from collections import namedtuple
+from timeit import default_timer
+
+__all__ = ['DispatchHop', 'DispatchTracer', 'CollectingSink', 'JSONLinesSink']
+
+
+DispatchHop = namedtuple('DispatchHop', ['controller', 'path_piece', 'decision', 'duration'])
+
+
+class DispatchTracer(object):
+    """Measures dispatch hops and forwards them to a sink.
+
+    Arguments:
+        sink
+              callable receiving a :class:`DispatchHop` for each hop.
+        clock
+              function returning the current time in seconds.
+    """
+
+    def __init__(self, sink, clock=default_timer):
+        self.sink = sink
+        self.clock = clock
+
+    def hop(self, started, controller, path_piece, decision):
+        """Reports a hop that begun at ``started`` as returned by :attr:`clock`"""
+        self.sink(DispatchHop(controller, path_piece, decision, self.clock() - started))
+
+
+class CollectingSink(object):
+    """Sink that keeps all the hops in the :attr:`hops` list"""
+
+    def __init__(self):
+        self.hops = []
+
+    def __call__(self, hop):
+        self.hops.append(hop)
+
+    def clear(self):
+        del self.hops[:]
+
+
+class JSONLinesSink(object):
+    """Sink that writes each hop as a JSON line to a file object.
+
+    Controllers are reported by class name.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def __call__(self, hop):
+        controller = hop.controller
+        self.fileobj.write(json.dumps({
+            'controller': getattr(type(controller), '__name__', repr(controller)),
+            'path_piece': hop.path_piece,
+            'decision': hop.decision,
+            'duration': hop.duration,
+        }, sort_keys=True) + '\n')
@@ -8,9 +8,13 @@ MIT License
 import collections, sys, string, inspect
 import warnings
 
+from crank.cache import FunctionCache
+
 __all__ = [
         'get_argspec', 'get_params_with_argspec', 'remove_argspec_params_from_params',
-        'method_matches_args', 'Path', 'default_path_translator', 'flatten_arguments'
+        'method_matches_args', 'Path', 'default_path_translator', 'flatten_arguments',
+        'SignatureMatcher', 'get_signature_matcher', 'ArgumentBinder', 'get_argument_binder',
+        'get_argspec_cache', 'set_argspec_cache'
     ]
 
 
@@ -47,8 +51,7 @@ def _getargspec(func):
         return args, varargs, varkw, defaults
 
 
-_cached_argspecs = {}
-def get_argspec(func):
+def _unwrap_func(func):
     if _PY2:
         im_func = getattr(func, 'im_func', func)
     else:  #pragma: no cover
@@ -58,9 +61,38 @@ def get_argspec(func):
         # Cope with decorated functions if they properly updated __wrapped__
         im_func = im_func.__wrapped__
 
-    try:
-        argspec = _cached_argspecs[im_func]
-    except KeyError:
+    return im_func
+
+
+#argspecs, signature matchers and argument binders are kept for this many functions
+_function_caches_maxsize = 4096
+
+_argspec_cache = FunctionCache(_function_caches_maxsize)
+def get_argspec_cache():
+    """Returns the cache where argspecs are stored"""
+    return _argspec_cache
+
+
+def set_argspec_cache(cache):
+    """Replaces the cache where argspecs are stored.
+
+    Any object providing the ``get(func, default)`` and ``set(func, value)``
+    methods can be used, like :class:`crank.cache.FunctionCache` with
+    a ``maxsize``. The signature matchers and argument binders computed
+    from the previous argspecs are discarded. Returns the previous cache.
+    """
+    global _argspec_cache
+    previous, _argspec_cache = _argspec_cache, cache
+    _cached_matchers.clear()
+    _cached_binders.clear()
+    return previous
+
+
+def get_argspec(func):
+    im_func = _unwrap_func(func)
+
+    argspec = _argspec_cache.get(im_func)
+    if argspec is None:
         spec = _getargspec(im_func)
         argvals = spec[3]
 
@@ -68,7 +100,8 @@ def get_argspec(func):
         if argvals is None:
             argvals = []
 
-        argspec = _cached_argspecs[im_func] = (spec[0][1:], spec[1], spec[2], argvals)
+        argspec = (spec[0][1:], spec[1], spec[2], argvals)
+        _argspec_cache.set(im_func, argspec)
 
     return argspec
 
@@ -134,111 +167,179 @@ def remove_argspec_params_from_params(func, params, remainder):
     return params, tuple(remainder)
 
 
-def flatten_arguments(func, params, remainder, keep_unexpected=False):
-    """Returns all the arguments for a function as positional parameters.
+class ArgumentBinder(object):
+    """Turns params and remainder into the arguments of a function.
 
-    Keyword arguments are returned only if the function supports **kwargs
+    The position and default value of each argument are computed once
+    from the function argspec, so binding a request only needs to look up
+    each argument once.
     """
-    if remainder is None:
-        remainder = tuple()
+    __slots__ = ('_func_name', '_positional', '_positional_count', '_accepts_varargs', '_accepts_kw')
+
+    def __init__(self, func, argspec):
+        positional_args, varargs, argkws, default_arg_values = argspec
+
+        first_default = len(positional_args) - len(default_arg_values)
+        positional = []
+        for idx, argname in enumerate(positional_args):
+            default = _NotFound
+            if idx >= first_default:
+                default = default_arg_values[idx - first_default]
+            positional.append((idx, argname, default))
+
+        self._func_name = str(func)
+        self._positional = tuple(positional)
+        self._positional_count = len(positional_args)
+        self._accepts_varargs = bool(varargs)
+        self._accepts_kw = bool(argkws)
+
+    def bind(self, params, remainder=None):
+        """Returns the ``(args, kwargs)`` to call the function with.
+
+        Keyword arguments are returned only if the function supports **kwargs
+        """
+        if remainder is None:
+            remainder = tuple()
+
+        if not params:
+            if self._accepts_varargs:
+                # If all arguments are already positional and we accept variable arguments
+                # we have nothing to do, params are already flattened and there are no
+                # extra arguments
+                return tuple(remainder), params
+            else:
+                # Otherwise arguments are already positional, but there are extra arguments
+                # so we just throw away the extra arguments
+                return tuple(remainder[:self._positional_count]), params
 
-    # figure out which of the vars in the argspec are required
-    positional_args, varargs, argkws, default_arg_values = get_argspec(func)
-
-    if not params:
-        if varargs:
-            # If all arguments are already positional and we accept variable arguments
-            # we have nothing to do, params are already flattened and there are no
-            # extra arguments
-            return tuple(remainder), params
+        if self._accepts_kw:
+            kwargs = params.copy()
+            get_param = kwargs.pop
         else:
-            # Otherwise arguments are already positional, but there are extra arguments
-            # so we just throw away the extra arguments
-            return tuple(remainder[:len(positional_args)]), params
+            kwargs = {}
+            get_param = params.get
 
-    args = []
-    kwargs = params.copy()
+        args = []
+        remainder_len = len(remainder)
+        for idx, argname, default in self._positional:
+            val = get_param(argname, _NotFound)
+            if val is not _NotFound:
+                args.append(val)
+            elif idx < remainder_len:
+                args.append(remainder[idx])
+            elif default is not _NotFound:
+                args.append(default)
+            else:
+                # we are actually missing an argument
+                raise TypeError('{0} missing "{1}" required argument'.format(self._func_name, argname))
 
-    # Gather positional arguments
-    for idx, argname in enumerate(positional_args):
-        val = kwargs.pop(argname, _NotFound)
-        if val is not _NotFound:
-            args.append(val)
-        elif idx < len(remainder):
-            args.append(remainder[idx])
-        else:
-            # if argument is not available look for default value or just stop
-            # as we are actually missing an argument
-            try:
-                default_arg_idx = idx - (len(positional_args) - len(default_arg_values))
-                if default_arg_idx < 0:
-                    raise IndexError()
-                args.append(default_arg_values[default_arg_idx])
-            except IndexError:
-                raise TypeError('{0} missing "{1}" required argument'.format(func, argname))
+        if self._accepts_varargs:
+            args.extend(remainder[len(args):])
 
-    if varargs:
-        args.extend(remainder[len(args):])
+        return tuple(args), kwargs
 
-    if not argkws:
-        kwargs = {}
+    def bind_many(self, calls):
+        """Binds a sequence of ``(params, remainder)`` couples.
 
-    return tuple(args), kwargs
+        Returns a list with the ``(args, kwargs)`` of each call.
+        """
+        bind = self.bind
+        return [bind(params, remainder) for params, remainder in calls]
 
 
-def method_matches_args(method, params, remainder, lax_params=False):
+_cached_binders = FunctionCache(_function_caches_maxsize)
+def get_argument_binder(func):
+    """Returns the :class:`ArgumentBinder` for ``func``"""
+    im_func = _unwrap_func(func)
+
+    binder = _cached_binders.get(im_func)
+    if binder is None:
+        binder = ArgumentBinder(im_func, get_argspec(func))
+        _cached_binders.set(im_func, binder)
+    return binder
+
+
+def flatten_arguments(func, params, remainder, keep_unexpected=False):
+    """Returns all the arguments for a function as positional parameters.
+
+    Keyword arguments are returned only if the function supports **kwargs
     """
-    This method matches the params from the request along with the remainder to the
-    method's function signiture.  If the two jive, it returns true.
+    return get_argument_binder(func).bind(params, remainder)
 
-    It is very likely that this method would go into ObjectDispatch in the future.
+
+class SignatureMatcher(object):
+    """Tells if a function can be called with some params and remainder.
+
+    All the informations required to perform the check are computed once
+    from the function argspec, so checking a request doesn't need to
+    copy the params or walk the argspec.
     """
-    argvars, ovar_args, argkws, argvals = get_argspec(method)
+    __slots__ = ('_required_count', '_missing', '_allowed', '_max_args', '_accepts_kw')
+
+    def __init__(self, argspec):
+        argvars, var_args, argkws, argvals = argspec
+
+        required_vars = argvars
+        if argvals:
+            required_vars = argvars[:-len(argvals)]
+        vars_with_default = frozenset(argvars[len(argvars)-len(argvals):])
+
+        # For each possible remainder length, the required vars that must be
+        # provided by params and the params that the function can accept.
+        missing = []
+        allowed = []
+        for i in range(len(required_vars) + 1):
+            missing.append(tuple(required_vars[i:]))
+            allowed.append(frozenset(required_vars[i:]) | vars_with_default)
+
+        self._required_count = len(required_vars)
+        self._missing = tuple(missing)
+        self._allowed = tuple(allowed)
+        self._max_args = None if var_args else len(argvars)
+        self._accepts_kw = argkws is not None
+
+    def matches(self, params, remainder_len, lax_params=False):
+        """Checks the params keys and the remainder length against the signature"""
+        #there are more args in the remainder than are available in the argspec
+        if self._max_args is not None and remainder_len > self._max_args:
+            return False
 
-    required_vars = argvars
-    if argvals:
-        required_vars = argvars[:-len(argvals)]
+        idx = min(remainder_len, self._required_count)
 
-    params = params.copy()
+        #make sure all of the non-optional-vars not in remainder are in params
+        for var in self._missing[idx]:
+            if var not in params:
+                return False
 
-    #remove the appropriate remainder quotient
-    if len(remainder)<len(required_vars):
-        #pull the first few off with the remainder
-        required_vars = required_vars[len(remainder):]
-    else:
-        #there is more of a remainder than there is non optional vars
-        required_vars = []
+        #make sure no unexpected params exist if keyword argumnts are missing
+        if lax_params or self._accepts_kw:
+            return True
+        return self._allowed[idx].issuperset(params)
 
-    #remove vars found in the params list
-    for var in required_vars[:]:
-        if var in params:
-            required_vars.pop(0)
-            # remove the param from the params so when we see if
-            # there are params that arent in the non-required vars we
-            # can evaluate properly
-            del params[var]
-        else:
-            break
 
-    #remove params that have a default value
-    vars_with_default = argvars[len(argvars)-len(argvals):]
-    for var in vars_with_default:
-        if var in params:
-            del params[var]
+_cached_matchers = FunctionCache(_function_caches_maxsize)
+def get_signature_matcher(func):
+    """Returns the :class:`SignatureMatcher` for ``func``"""
+    #same as _unwrap_func, inlined as this runs for every dispatched action
+    im_func = getattr(func, '__func__', func)
+    if hasattr(im_func, '__wrapped__'):
+        im_func = im_func.__wrapped__
 
-    #make sure no params exist if keyword argumnts are missing
-    if not lax_params and argkws is None and params:
-        return False
+    matcher = _cached_matchers.get(im_func)
+    if matcher is None:
+        matcher = SignatureMatcher(get_argspec(func))
+        _cached_matchers.set(im_func, matcher)
+    return matcher
 
-    #make sure all of the non-optional-vars are there
-    if not required_vars:
-        #there are more args in the remainder than are available in the argspec
-        if len(argvars)<len(remainder) and not ovar_args:
-            return False
-        return True
 
+def method_matches_args(method, params, remainder, lax_params=False):
+    """
+    This method matches the params from the request along with the remainder to the
+    method's function signiture.  If the two jive, it returns true.
 
-    return False
+    It is very likely that this method would go into ObjectDispatch in the future.
+    """
+    return get_signature_matcher(method).matches(params, len(remainder), lax_params)
 
 
 if _PY2: #pragma: no cover
@@ -251,17 +352,51 @@ else: #pragma: no cover
                                        '_' * len(string.punctuation))
 
 
+#Lookups, clears and stores on the memo are each atomic, so it's safe to use
+#without a lock: a thread racing with a clear only loses entries, or adds one
+#past the limit, and translating again gives the same result.
+_translated_pieces = {}
+_translated_pieces_maxsize = 4096
+
 def default_path_translator(path_piece):
+    """Replaces punctuation in ``path_piece`` with underscores.
+
+    Results are memoized, the memo is emptied once it holds
+    more than 4096 path pieces.
+    """
+    try:
+        return _translated_pieces[path_piece]
+    except KeyError:
+        pass
+
     if isinstance(path_piece, str):
-        return path_piece.translate(translation_string)
+        translated = path_piece.translate(translation_string)
     else: #pragma: no cover
-        return path_piece.translate(translation_dict)
+        translated = path_piece.translate(translation_dict)
+
+    if len(_translated_pieces) >= _translated_pieces_maxsize:
+        _translated_pieces.clear()
+    _translated_pieces[path_piece] = translated
+    return translated
 
 
 def noop_translation(path_piece):
     return path_piece
 
 
+def _is_awaitable(result):
+    return result is not None and hasattr(result, '__await__')
+
+
+def _synchronous(result):
+    """Returns the ``result`` of a dispatch hook, refusing awaitables"""
+    if _is_awaitable(result):
+        getattr(result, 'close', lambda: None)()
+        raise RuntimeError('%s is asynchronous, use DispatchState.resolve_async' % (
+            getattr(result, '__qualname__', type(result).__name__), ))
+    return result
+
+
 class Path(collections.deque):
     def __init__(self, value=None, separator='/'):
         self.separator = separator
@@ -308,3 +443,4 @@ class Path(collections.deque):
 
         except TypeError:
             return Path([self[i] for i in range(*i.indices(len(self)))])
+
@@ -17,7 +17,7 @@ setup(name='crank',
       author_email='chris@percious.com',
       url='https://github.com/TurboGears/crank',
       license='MIT',
-      packages=find_packages(exclude=['ez_setup', 'examples', 'tests']),
+      packages=find_packages(exclude=['ez_setup', 'examples', 'tests', 'benchmarks', 'benchmarks.*']),
       include_package_data=True,
       zip_safe=True,
       extras_require={
@@ -30,5 +30,8 @@ setup(name='crank',
       ],
       entry_points="""
       # -*- Entry points: -*-
+      [console_scripts]
+      crank-routes = crank.routes:main
+      crank-replay = crank.replay:main
       """,
       )
@@ -0,0 +1,373 @@
+import threading
+from nose import SkipTest
+from nose.tools import raises
+try:
+    import asyncio
+    asyncio.Future.__await__
+except (ImportError, AttributeError):
+    raise SkipTest('async dispatch requires Python 3.5')
+
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.dispatchstate import DispatchState
+from crank.routecache import RouteCache, NotFoundCache
+from crank.lookups import cached_lookup, speculative
+from crank.security import pure_security_check
+from crank.tracing import DispatchTracer, CollectingSink
+from webob.exc import HTTPNotFound, HTTPForbidden
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None, method='GET'):
+        self.path_info = path_info
+        self.method = method
+        self.params = params or {}
+
+
+def later(result=None, error=None):
+    """Awaitable completing with ``result`` or raising ``error``"""
+    future = asyncio.Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+    return future
+
+
+class MockItem(object):
+    def __init__(self, item_id):
+        self.item_id = item_id
+
+    def index(self):
+        pass
+
+    def details(self, *args):
+        pass
+
+
+class MockAsyncLookupController(object):
+    def _lookup(self, item_id, *remainder):
+        return later((MockItem(item_id), remainder))
+
+
+class MockSyncLookupController(object):
+    def _lookup(self, item_id, *remainder):
+        return MockItem(item_id), remainder
+
+
+class MockSecuredController(object):
+    allowed = True
+
+    def _check_security(self):
+        if self.allowed:
+            return later(True)
+        return later(error=HTTPForbidden())
+
+    def index(self):
+        pass
+
+
+calls = []
+
+
+class MockCachedLookupController(object):
+    @cached_lookup()
+    def _lookup(self, item_id, *remainder):
+        calls.append('lookup')
+        return MockItem(item_id), remainder
+
+
+class MockPureSecuredController(object):
+    @pure_security_check
+    def _check_security(self):
+        calls.append('pure')
+        return later(True)
+
+    def _lookup(self, item_id, *remainder):
+        calls.append('lookup')
+        return later((MockItem(item_id), remainder))
+
+
+class MockSpyExecutor(object):
+    def __init__(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(1)
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(fn.__self__)
+        return self.executor.submit(fn, *args)
+
+
+class MockPendingExecutor(object):
+    def __init__(self):
+        from concurrent.futures import Future
+        self.future_class = Future
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = self.future_class()
+        self.futures.append(future)
+        return future
+
+
+class MockSpeculativeController(object):
+    @speculative
+    def _lookup(self, item_id, *remainder):
+        return MockItem(item_id), remainder
+
+
+class MockEmptyController(object):
+    pass
+
+
+class MockMissController(object):
+    @speculative
+    def _lookup(self, *remainder):
+        return MockEmptyController(), remainder
+
+
+class MockBlockingRootController(ObjectDispatcher):
+    def __init__(self):
+        self.released = threading.Event()
+        self.missing = MockMissController()
+
+    @speculative
+    def _lookup(self, *remainder):
+        if not self.released.wait(2):
+            raise RuntimeError('event loop blocked')
+        return MockItem('root'), ()
+
+
+#async def is a syntax error before Python 3.5
+exec("""
+async def coroutine_lookup(self, *remainder):
+    calls.append('coroutine')
+    return MockItem('root'), ()
+""")
+
+
+class MockCoroutineRootController(ObjectDispatcher):
+    missing = MockMissController()
+    _lookup = speculative(coroutine_lookup)
+
+
+class MockCustomDispatcher(object):
+    def _dispatch(self, state, remainder=None):
+        state.set_action(self.custom, remainder)
+        return later(state)
+
+    def custom(self, *args):
+        pass
+
+
+class MockRestController(RestDispatcher):
+    def get_one(self, item_id):
+        pass
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+    def with_args(self, a, b=None):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+    items = MockAsyncLookupController()
+    sync_items = MockSyncLookupController()
+    secured = MockSecuredController()
+    pure = MockPureSecuredController()
+    cached = MockCachedLookupController()
+    custom = MockCustomDispatcher()
+    rest = MockRestController()
+
+    def index(self):
+        pass
+
+
+class MockSpeculativeRootController(ObjectDispatcher):
+    guessed = MockSpeculativeController()
+
+    @speculative
+    def _lookup(self, *remainder):
+        return MockItem('root'), ()
+
+
+class TestResolveAsync(object):
+
+    def setup(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.root = MockRootController()
+
+    def teardown(self):
+        del calls[:]
+        MockSecuredController.allowed = True
+        MockRootController._defer_security_checks = False
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def resolve(self, path, params=None, method='GET'):
+        state = DispatchState(MockRequest(path, params, method), self.root)
+        return self.loop.run_until_complete(state.resolve_async())
+
+    def test_plain(self):
+        state = self.resolve('/sub/with_args/1')
+        assert state.action == self.root.sub.with_args, state.action
+        assert list(state.remainder) == ['1'], state.remainder
+
+    def test_index(self):
+        state = self.resolve('/')
+        assert state.action == self.root.index, state.action
+
+    def test_async_lookup(self):
+        state = self.resolve('/items/5/details/more')
+        assert state.action.__name__ == 'details', state.action
+        assert state.controller.item_id == '5', state.controller
+        assert list(state.remainder) == ['more'], state.remainder
+
+    def test_sync_lookup(self):
+        state = self.resolve('/sync_items/5')
+        assert state.action.__name__ == 'index', state.action
+        assert state.controller.item_id == '5', state.controller
+
+    def test_async_security(self):
+        state = self.resolve('/secured')
+        assert state.action == self.root.secured.index, state.action
+
+    @raises(HTTPForbidden)
+    def test_async_security_denied(self):
+        MockSecuredController.allowed = False
+        self.resolve('/secured')
+
+    def test_cached_lookup(self):
+        MockCachedLookupController._lookup.lookup_cache.invalidate()
+        for i in range(2):
+            state = self.resolve('/cached/5/details')
+            assert state.action.__name__ == 'details', state.action
+        assert calls == ['lookup'], calls
+
+    def test_speculative_lookup(self):
+        self.root = MockSpeculativeRootController()
+        executor = self.root._lookup_executor = MockSpyExecutor()
+        try:
+            state = self.resolve('/guessed/5/details')
+        finally:
+            executor.executor.shutdown()
+        assert state.controller.item_id == '5', state.controller
+        assert executor.submitted == [self.root], executor.submitted
+
+    def test_unused_lookups_cancelled(self):
+        self.root = MockSpeculativeRootController()
+        executor = self.root._lookup_executor = MockPendingExecutor()
+        state = self.resolve('/guessed/5/details')
+        assert state.controller.item_id == '5', state.controller
+        assert len(executor.futures) == 1, executor.futures
+        assert executor.futures[0].cancelled()
+
+    def test_pending_speculative_lookup(self):
+        self.root = root = MockBlockingRootController()
+        executor = root._lookup_executor = MockSpyExecutor()
+        progress = []
+
+        async def other():
+            progress.append('other')
+            root.released.set()
+
+        try:
+            state, _ = self.loop.run_until_complete(asyncio.gather(
+                DispatchState(MockRequest('/missing/x'), root).resolve_async(), other()))
+        finally:
+            root.released.set()
+            executor.executor.shutdown()
+        assert state.controller.item_id == 'root', state.controller
+        assert progress == ['other'], progress
+
+    def test_speculative_coroutine_lookup(self):
+        self.root = MockCoroutineRootController()
+        executor = self.root._lookup_executor = MockSpyExecutor()
+        try:
+            state = self.resolve('/missing/x')
+        finally:
+            executor.executor.shutdown()
+        assert state.controller.item_id == 'root', state.controller
+        assert calls == ['coroutine'], calls
+        assert executor.submitted == [], executor.submitted
+
+    def test_deferred_security(self):
+        MockRootController._defer_security_checks = True
+        state = self.resolve('/pure/5')
+        assert state.controller.item_id == '5', state.controller
+        assert calls == ['lookup', 'pure'], calls
+
+    def test_inline_security(self):
+        self.resolve('/pure/5')
+        assert calls == ['pure', 'lookup'], calls
+
+    def test_async_custom_dispatch(self):
+        state = self.resolve('/custom/a/b')
+        assert state.action == self.root.custom.custom, state.action
+        assert list(state.remainder) == ['a', 'b'], state.remainder
+
+    def test_rest(self):
+        state = self.resolve('/rest/1')
+        assert state.action == self.root.rest.get_one, state.action
+
+    @raises(HTTPNotFound)
+    def test_notfound(self):
+        self.resolve('/missing/path')
+
+    @raises(RuntimeError)
+    def test_already_resolved(self):
+        state = DispatchState(MockRequest('/'), self.root)
+        state.resolve()
+        self.loop.run_until_complete(state.resolve_async())
+
+    def test_tracer(self):
+        sink = CollectingSink()
+        state = DispatchState(MockRequest('/items/5/details'), self.root,
+                              tracer=DispatchTracer(sink))
+        self.loop.run_until_complete(state.resolve_async())
+        kinds = [hop.decision for hop in sink.hops]
+        assert 'lookup' in kinds and kinds[-2:] == ['exposed', 'match'], kinds
+
+    def test_caches(self):
+        self.root._route_cache = RouteCache()
+        self.root._notfound_cache = NotFoundCache()
+        try:
+            for i in range(2):
+                state = self.resolve('/sub/with_args/1')
+                assert state.action == self.root.sub.with_args, state.action
+                try:
+                    self.resolve('/sub/missing')
+                except HTTPNotFound:
+                    pass
+                else:
+                    assert False, 'HTTPNotFound not raised'
+                self.resolve('/secured')
+            assert self.root._route_cache.hits == 1, self.root._route_cache.stats()
+            assert self.root._notfound_cache.hits == 1, self.root._notfound_cache.stats()
+        finally:
+            self.root._route_cache = None
+            self.root._notfound_cache = None
+
+    def test_enter_controller_override(self):
+        entered = []
+        class MockEnteringController(MockRootController):
+            def _enter_controller(self, state, remainder):
+                entered.append(state.controller)
+                return super(MockEnteringController, self)._enter_controller(state, remainder)
+
+        self.root = MockEnteringController()
+        state = self.resolve('/sub')
+        assert state.action == self.root.sub.index, state.action
+        assert entered == [self.root, self.root.sub], entered
+
+    @raises(RuntimeError)
+    def test_sync_resolve_rejects_async_security(self):
+        state = DispatchState(MockRequest('/secured'), self.root)
+        state.resolve()
@@ -0,0 +1,148 @@
+from nose import SkipTest
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.batch import BatchResolver, resolve_many
+from crank.lookups import speculative
+from webob.exc import HTTPNotFound, HTTPMethodNotAllowed
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+    def with_args(self, a, b=None):
+        pass
+
+
+class MockRestController(RestDispatcher):
+    def get_one(self, item_id):
+        pass
+
+    def get_all(self):
+        pass
+
+    def post(self, **kw):
+        pass
+
+    def put(self, item_id, **kw):
+        pass
+
+
+class MockBrokenController(object):
+    def _lookup(self, *remainder):
+        raise ValueError('broken')
+
+
+class MockGuessedController(object):
+    @speculative
+    def _lookup(self, item_id, *remainder):
+        return MockSubController(), remainder
+
+
+class MockPendingExecutor(object):
+    """Executor whose futures never start running"""
+    def __init__(self):
+        from concurrent.futures import Future
+        self.future_class = Future
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = self.future_class()
+        self.futures.append(future)
+        return future
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+    items = MockRestController()
+    broken = MockBrokenController()
+
+    def index(self):
+        pass
+
+
+class MockSpeculativeRootController(ObjectDispatcher):
+    guessed = MockGuessedController()
+
+    @speculative
+    def _lookup(self, *remainder):
+        return MockSubController(), ()
+
+
+class TestBatchResolver(object):
+
+    def setup(self):
+        self.root = MockRootController()
+        self.resolver = BatchResolver(self.root)
+
+    def test_results_in_order(self):
+        requests = [('/sub/with_args/1', 'GET', None),
+                    ('/missing/path', 'GET', None),
+                    ('/', 'GET', {}),
+                    ('/sub/with_args', 'GET', {'a': 1})]
+        results = list(self.resolver.resolve(requests))
+        assert [r.path for r in results] == [r[0] for r in requests], results
+
+        assert results[0].state.action.__name__ == 'with_args', results[0]
+        assert list(results[0].state.remainder) == ['1'], results[0].state.remainder
+        assert results[1].state is None, results[1]
+        assert isinstance(results[1].error, HTTPNotFound), results[1]
+        assert results[2].state.action.__name__ == 'index', results[2]
+        assert results[3].state.action.__name__ == 'with_args', results[3]
+        assert results[3].error is None
+
+    def test_shared_work(self):
+        requests = [('/sub/with_args/1', 'GET', None)] * 3 + [('/missing', 'GET', None)] * 3
+        results = list(self.resolver.resolve(requests))
+        assert results[2].state.controller is self.root.sub, results[2].state.controller
+
+        stats = self.resolver.stats()
+        assert stats['routes']['hits'] == 2, stats
+        assert stats['notfound']['hits'] == 2, stats
+        assert self.root._route_cache is None
+        assert self.root._notfound_cache is None
+
+    def test_rest(self):
+        requests = [('/items/1', 'GET', None),
+                    ('/items', 'GET', None),
+                    ('/items', 'POST', {'name': 'x'}),
+                    ('/items/1', 'PUT', None),
+                    ('/items/1', 'GET', {'_method': 'PUT'})]
+        results = list(resolve_many(self.root, requests))
+        assert [r.state.action.__name__ for r in results[:4]] == ['get_one', 'get_all', 'post', 'put']
+        assert isinstance(results[4].error, HTTPMethodNotAllowed), results[4]
+        assert requests[4][2] == {'_method': 'PUT'}, requests[4]
+
+    def test_controller_errors(self):
+        requests = [('/broken/1', 'GET', None), ('/sub', 'GET', None)]
+        results = list(self.resolver.resolve(requests))
+        assert isinstance(results[0].error, ValueError), results[0]
+        assert results[0].state is None, results[0]
+        assert results[1].state.action.__name__ == 'index', results[1]
+
+    def test_unused_lookups_cancelled(self):
+        root = MockSpeculativeRootController()
+        try:
+            executor = root._lookup_executor = MockPendingExecutor()
+        except ImportError:
+            raise SkipTest('concurrent.futures is not available')
+        result = next(resolve_many(root, [('/guessed/1/with_args/2', 'GET', None)]))
+        assert result.state.action.__name__ == 'with_args', result
+        assert len(executor.futures) == 1, executor.futures
+        assert executor.futures[0].cancelled()
+
+    def test_lazy(self):
+        consumed = []
+        def requests():
+            for path in ('/', '/sub'):
+                consumed.append(path)
+                yield path, 'GET', None
+
+        results = self.resolver.resolve(requests())
+        next(results)
+        assert consumed == ['/'], consumed
+
+    def test_path_translator(self):
+        resolver = BatchResolver(self.root, path_translator=True)
+        result = next(resolver.resolve([('/sub/with.args/1', 'GET', None)]))
+        assert result.state.action.__name__ == 'with_args', result
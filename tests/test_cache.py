@@ -0,0 +1,145 @@
+from crank.cache import *
+
+
+class TestLRUCache(object):
+
+    def setup(self):
+        self.cache = LRUCache(maxsize=2)
+
+    def test_get_missing(self):
+        assert self.cache.get('a') is None
+        assert self.cache.get('a', 5) == 5
+        assert self.cache.misses == 2, self.cache.stats()
+
+    def test_set_and_get(self):
+        self.cache.set('a', 1)
+        assert self.cache.get('a') == 1
+        assert self.cache.hits == 1, self.cache.stats()
+        assert 'a' in self.cache
+        assert len(self.cache) == 1
+
+    def test_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        assert 'a' in self.cache
+        assert 'b' not in self.cache
+        assert self.cache.evictions == 1, self.cache.stats()
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.invalidate('a')
+        self.cache.invalidate('missing')
+        assert 'a' not in self.cache
+
+    def test_clear(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.clear()
+        stats = self.cache.stats()
+        assert stats['size'] == 0, stats
+        assert stats['hits'] == 1, stats
+        assert stats['maxsize'] == 2, stats
+
+
+class MockClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(object):
+
+    def setup(self):
+        self.clock = MockClock()
+        self.cache = TTLCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_expiration(self):
+        self.cache.set('a', 1)
+        self.clock.now = 9
+        assert self.cache.get('a') == 1
+        assert 'a' in self.cache
+        self.clock.now = 10
+        assert 'a' not in self.cache
+        assert self.cache.get('a') is None
+        stats = self.cache.stats()
+        assert stats['expirations'] == 1, stats
+        assert stats['hits'] == 1, stats
+        assert stats['size'] == 0, stats
+
+    def test_set_refreshes(self):
+        self.cache.set('a', 1)
+        self.clock.now = 9
+        self.cache.set('a', 2)
+        self.clock.now = 15
+        assert self.cache.get('a') == 2
+
+    def test_purge(self):
+        self.cache.set('a', 1)
+        self.clock.now = 5
+        self.cache.set('b', 2)
+        self.clock.now = 12
+        self.cache.purge()
+        assert len(self.cache) == 1
+        assert 'b' in self.cache
+
+    def test_maxsize(self):
+        for key in 'abc':
+            self.cache.set(key, 1)
+        assert len(self.cache) == 2
+        assert self.cache.stats()['evictions'] == 1, self.cache.stats()
+
+
+class TestFunctionCache(object):
+
+    def setup(self):
+        self.cache = FunctionCache()
+
+    def test_get_and_set(self):
+        def f():
+            pass
+        assert self.cache.get(f) is None
+        self.cache.set(f, 1)
+        assert self.cache.get(f) == 1
+        assert f in self.cache
+        stats = self.cache.stats()
+        assert stats['hits'] == 1, stats
+        assert stats['misses'] == 1, stats
+
+    def test_entries_released_with_function(self):
+        def f():
+            pass
+        self.cache.set(f, 1)
+        assert len(self.cache) == 1
+        del f
+        import gc; gc.collect()
+        assert len(self.cache) == 0, self.cache.stats()
+
+    def test_not_weakrefable(self):
+        key = len
+        self.cache.set(key, 1)
+        assert self.cache.get(key) == 1
+
+    def test_maxsize(self):
+        cache = FunctionCache(maxsize=2)
+        def f1(): pass
+        def f2(): pass
+        def f3(): pass
+        cache.set(f1, 1)
+        cache.set(f2, 2)
+        cache.get(f1)
+        cache.set(f3, 3)
+        #lookups don't refresh the entries, the oldest stored one goes
+        assert f1 not in cache
+        assert f2 in cache
+        assert cache.stats()['evictions'] == 1, cache.stats()
+
+    def test_clear(self):
+        def f():
+            pass
+        self.cache.set(f, 1)
+        self.cache.clear()
+        assert f not in self.cache
@@ -0,0 +1,149 @@
+import marshal
+import os
+import shutil
+import tempfile
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.dispatchstate import DispatchState
+from crank.dispatchtable import get_dispatch_table, peek_dispatch_table, clear_dispatch_tables
+from crank import compiledtables
+from crank.compiledtables import save_dispatch_tables, load_dispatch_tables
+from crank.cache import FunctionCache
+from crank.util import set_argspec_cache, get_argspec_cache
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None, method='GET'):
+        self.path_info = path_info
+        self.method = method
+        self.params = params or {}
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+    def with_args(self, a, b=5):
+        pass
+
+
+class MockRestController(RestDispatcher):
+    def get_one(self, item_id):
+        pass
+
+    def get_summary(self, item_id):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+    items = MockRestController()
+
+    def index(self):
+        pass
+
+
+class TestCompiledTables(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'tables.marshal')
+        self.root = MockRootController()
+        clear_dispatch_tables()
+        self.argspec_cache = set_argspec_cache(FunctionCache())
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+        clear_dispatch_tables()
+        set_argspec_cache(self.argspec_cache)
+
+    def test_save_and_load(self):
+        assert save_dispatch_tables(self.root, self.filename) == 3
+        expected = get_dispatch_table(self.root.items, self.root.items)
+
+        clear_dispatch_tables()
+        set_argspec_cache(FunctionCache())
+        report = load_dispatch_tables(self.filename)
+        assert report.loaded, report
+        assert report.tables == 3, report
+        assert report.argspecs == 5, report
+
+        table = peek_dispatch_table(self.root.items, self.root.items)
+        assert table is not expected
+        assert type(table) is type(expected), table
+        assert table.names == expected.names, table.names
+        assert table.prefixed == expected.prefixed, table.prefixed
+        assert table.sub_getter == expected.sub_getter, table.sub_getter
+        assert get_argspec_cache().get(MockSubController.with_args) == (['a', 'b'], None, None, (5, ))
+
+    def test_dispatch_with_loaded_tables(self):
+        save_dispatch_tables(self.root, self.filename)
+        clear_dispatch_tables()
+        load_dispatch_tables(self.filename)
+
+        ObjectDispatcher._use_compiled_dispatch = True
+        try:
+            state = DispatchState(MockRequest('/sub/with_args/1'), self.root).resolve()
+            assert state.action.__name__ == 'with_args', state.action
+            state = DispatchState(MockRequest('/items/1/summary'), self.root).resolve()
+            assert state.action.__name__ == 'get_summary', state.action
+        finally:
+            ObjectDispatcher._use_compiled_dispatch = False
+
+    def test_missing_file(self):
+        report = load_dispatch_tables(self.filename)
+        assert not report.loaded, report
+
+    def test_invalid_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'not marshal data')
+        assert not load_dispatch_tables(self.filename).loaded
+
+    def test_outdated_hash(self):
+        save_dispatch_tables(self.root, self.filename)
+        with open(self.filename, 'rb') as f:
+            data = marshal.loads(f.read())
+        data['hash'] = 'outdated'
+        with open(self.filename, 'wb') as f:
+            f.write(marshal.dumps(data))
+
+        clear_dispatch_tables()
+        report = load_dispatch_tables(self.filename)
+        assert not report.loaded, report
+        assert peek_dispatch_table(self.root, self.root) is None
+
+    def test_save_replaces_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'previous')
+        save_dispatch_tables(self.root, self.filename)
+        assert os.listdir(self.directory) == ['tables.marshal'], os.listdir(self.directory)
+        assert load_dispatch_tables(self.filename).loaded
+
+    def test_failed_save_keeps_file(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'previous')
+
+        def failing_replace(src, dst):
+            raise OSError('replace failed')
+        replace, compiledtables._replace = compiledtables._replace, failing_replace
+        try:
+            save_dispatch_tables(self.root, self.filename)
+        except OSError:
+            pass
+        else:
+            assert False, 'OSError not raised'
+        finally:
+            compiledtables._replace = replace
+
+        assert os.listdir(self.directory) == ['tables.marshal'], os.listdir(self.directory)
+        with open(self.filename, 'rb') as f:
+            assert f.read() == b'previous'
+
+    def test_warmup_writes_file(self):
+        self.root._warmup(tables_file=self.filename)
+        assert os.path.exists(self.filename)
+
+        clear_dispatch_tables()
+        report = self.root._warmup(tables_file=self.filename)
+        assert report.nodes == 3, report
@@ -0,0 +1,166 @@
+import threading
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.dispatchstate import DispatchState
+from crank.dispatchtable import clear_dispatch_tables
+from crank.routecache import RouteCache, NotFoundCache
+from crank.routeindex import RouteIndex
+from crank.cache import LRUCache, TTLCache, FunctionCache
+from webob.exc import HTTPNotFound
+
+THREADS = 8
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None, method='GET'):
+        self.path_info = path_info
+        self.method = method
+        self.params = params or {}
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+    def with_args(self, a, b=None):
+        pass
+
+
+class MockLookedUp(object):
+    def details(self):
+        pass
+
+
+class MockLookupController(ObjectDispatcher):
+    def _lookup(self, item_id, *remainder):
+        return MockLookedUp(), remainder
+
+
+class MockRestController(RestDispatcher):
+    def get_one(self, item_id):
+        pass
+
+    def post(self, **kw):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+    looked = MockLookupController()
+    items = MockRestController()
+
+    def index(self):
+        pass
+
+
+REQUESTS = [
+    ('/', 'GET', 'index'),
+    ('/sub/with_args/1', 'GET', 'with_args'),
+    ('/sub/with_args/1/2', 'GET', 'with_args'),
+    ('/sub', 'GET', 'index'),
+    ('/looked/5/details', 'GET', 'details'),
+    ('/items/3', 'GET', 'get_one'),
+    ('/items', 'POST', 'post'),
+    ('/missing/path', 'GET', None),
+    ('/sub/with_args/1/2/3', 'GET', None),
+]
+
+
+def run_threads(target, count=THREADS):
+    errors = []
+    def wrapper(n):
+        try:
+            target(n)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapper, args=(n, )) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class TestConcurrentDispatch(object):
+
+    def setup(self):
+        clear_dispatch_tables()
+        self.root = MockRootController()
+        self.root._route_cache = RouteCache(maxsize=4)
+        self.root._notfound_cache = NotFoundCache(maxsize=2)
+        self.root._route_index = RouteIndex(self.root)
+
+    def teardown(self):
+        ObjectDispatcher._use_compiled_dispatch = False
+
+    def resolve_all(self, n):
+        for i in range(200):
+            path, method, action = REQUESTS[(i + n) % len(REQUESTS)]
+            state = DispatchState(MockRequest(path, method=method), self.root)
+            try:
+                state = state.resolve()
+            except HTTPNotFound:
+                assert action is None, path
+            else:
+                assert state.action.__name__ == action, (path, state.action)
+
+    def test_shared_dispatcher(self):
+        errors = run_threads(self.resolve_all)
+        assert not errors, errors
+        assert self.root._route_cache.hits, self.root._route_cache.stats()
+
+    def test_shared_dispatcher_compiled(self):
+        ObjectDispatcher._use_compiled_dispatch = True
+        errors = run_threads(self.resolve_all)
+        assert not errors, errors
+
+    def test_rebuild_while_dispatching(self):
+        def target(n):
+            if n == 0:
+                for i in range(50):
+                    self.root._route_index.rebuild()
+            else:
+                self.resolve_all(n)
+        errors = run_threads(target)
+        assert not errors, errors
+
+
+class TestConcurrentCaches(object):
+
+    def hammer(self, cache):
+        def target(n):
+            for i in range(2000):
+                key = (i * (n + 1)) % 50
+                value = cache.get(key)
+                assert value is None or value == key * 2, (key, value)
+                cache.set(key, key * 2)
+                if i % 100 == 0:
+                    cache.invalidate(key)
+        return run_threads(target)
+
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=16)
+        errors = self.hammer(cache)
+        assert not errors, errors
+        assert len(cache) <= 16, len(cache)
+
+    def test_ttl_cache(self):
+        cache = TTLCache(maxsize=16, ttl=0.0001)
+        errors = self.hammer(cache)
+        assert not errors, errors
+        assert len(cache) <= 16, len(cache)
+
+    def test_function_cache(self):
+        cache = FunctionCache(maxsize=16)
+        functions = [lambda: None for i in range(50)]
+        def target(n):
+            for i in range(2000):
+                func = functions[(i * (n + 1)) % 50]
+                value = cache.get(func)
+                assert value is None or value is func, value
+                cache.set(func, func)
+        errors = run_threads(target)
+        assert not errors, errors
+        assert len(cache) <= 16, len(cache)
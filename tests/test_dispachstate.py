@@ -1,4 +1,6 @@
-from crank.dispatchstate import DispatchState
+from nose.tools import raises
+from crank.dispatchstate import DispatchState, CompactDispatchState, DispatchStatePool
+from crank.restdispatcher import RestDispatcher
 
 class MockRequest(object):
     path_info = 'something'
@@ -45,6 +47,13 @@ class TestDispatchState:
         state = DispatchState(self.request, self.dispatcher, path_info=['', 'a', 'b', '',''])
         assert state.path == ['a', 'b'], state.path
 
+    def test_path_is_a_list(self):
+        state = DispatchState(self.request, self.dispatcher, path_info=['', 'a', 'b.json', ''])
+        assert isinstance(state.path, list), state.path
+        assert state.path == ['a', 'b'], state.path
+        assert state.extension == 'json', state.extension
+        assert isinstance(state.translated_path, list), state.translated_path
+
     def test_path_info_blank(self):
         state = DispatchState(self.request, self.dispatcher, path_info=[])
         assert state.path == [], state.path
@@ -80,3 +89,107 @@ class TestDispatchState:
         state = DispatchState(r, dispatcher=None, path_info='s1/s2')
         assert state.path == ['s1', 's2']
 
+    def test_translate_path_piece_once(self):
+        calls = []
+        def translator(path_piece):
+            calls.append(path_piece)
+            return path_piece.upper()
+
+        state = DispatchState(self.request, self.dispatcher, path_info='a/b/a',
+                              path_translator=translator)
+        assert state.translate_path_piece('a') == 'A'
+        assert state.translate_path_piece('a') == 'A'
+        assert state.translated_path == ['A', 'B', 'A'], state.translated_path
+        assert calls == ['a', 'b'], calls
+
+    def test_translated_path(self):
+        state = DispatchState(self.request, self.dispatcher, path_info='a.b/c-d.json',
+                              path_translator=True)
+        assert state.path == ['a.b', 'c-d'], state.path
+        assert state.translated_path == ['a_b', 'c_d'], state.translated_path
+
+        state.set_path('e.f/g')
+        assert state.translated_path == ['e_f', 'g'], state.translated_path
+
+    def test_trailing_slashes(self):
+        state = DispatchState(self.request, self.dispatcher, path_info='a/b' + '/' * 100000)
+        assert state.path == ['a', 'b'], state.path
+
+        state.set_path('/' * 100000)
+        assert state.path == [], state.path
+
+    def test_translated_path_no_translator(self):
+        state = DispatchState(self.request, self.dispatcher, path_info='a.b/c')
+        assert state.translated_path == ['a.b', 'c'], state.translated_path
+
+
+class MockRestController(RestDispatcher):
+    def get_one(self, item_id):
+        pass
+
+    def post(self, **kw):
+        pass
+
+
+class TestCompactDispatchState:
+
+    def setup(self):
+        self.request = MockRequest()
+        self.dispatcher = MockController()
+
+    @raises(AttributeError)
+    def test_no_dynamic_attributes(self):
+        state = CompactDispatchState(self.request, self.dispatcher)
+        state.something = True
+
+    def test_routing_args_lazily_created(self):
+        state = CompactDispatchState(self.request, self.dispatcher)
+        assert state._routing_args is None
+        assert state.routing_args == {}
+        state.add_routing_args('current', ['c'], ['e'], None)
+        assert state.routing_args == {'e': 'c'}, state.routing_args
+
+    def test_rest_dispatch(self):
+        self.request.method = 'POST'
+        state = CompactDispatchState(self.request, MockRestController(), path_info='')
+        state = state.resolve()
+        assert state.http_method == 'post', state.http_method
+        assert state.action.__name__ == 'post', state.action
+
+
+class TestDispatchStatePool:
+
+    def setup(self):
+        self.request = MockRequest()
+        self.dispatcher = MockController()
+        self.pool = DispatchStatePool(maxsize=1)
+
+    def test_acquire(self):
+        state = self.pool.acquire(self.request, self.dispatcher, path_info='a/b')
+        assert isinstance(state, CompactDispatchState)
+        assert state.path == ['a', 'b'], state.path
+        assert state.params == {'c': 3, 'd': 4}, state.params
+
+    def test_release_and_reuse(self):
+        state = self.pool.acquire(self.request, self.dispatcher, path_info='a/b')
+        state.set_action(None, ['b'])
+        state.http_method = 'get'
+        controller_path = state._controller_path
+        self.pool.release(state)
+        assert state.request is None
+        assert not hasattr(state, 'http_method')
+
+        other = self.pool.acquire(self.request, self.dispatcher, {'z': 1}, path_info='x')
+        assert other is state
+        assert other._controller_path is controller_path
+        assert other.controller_path == (('/', self.dispatcher),), other.controller_path
+        assert other.action is None
+        assert other.params == {'z': 1}, other.params
+        assert other.path == ['x'], other.path
+
+    def test_maxsize(self):
+        first = self.pool.acquire(self.request, self.dispatcher)
+        second = self.pool.acquire(self.request, self.dispatcher)
+        self.pool.release(first)
+        self.pool.release(second)
+        assert self.pool._free == [first], self.pool._free
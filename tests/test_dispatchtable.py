@@ -0,0 +1,191 @@
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.dispatchtable import *
+from crank.dispatchtable import _dispatch_tables
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+
+class MockController(ObjectDispatcher):
+    title = 'a string'
+    nothing = None
+    sub = MockSubController()
+
+    def index(self):
+        pass
+
+    def with_args(self, a, b):
+        pass
+
+    def _lookup(self, *args):
+        pass
+
+
+class MockDynamicController(ObjectDispatcher):
+    def __getattr__(self, name):
+        raise AttributeError(name)
+
+
+class TestDispatchTable(object):
+
+    def setup(self):
+        clear_dispatch_tables()
+        self.controller = MockController()
+        self.table = get_dispatch_table(self.controller, self.controller)
+
+    def test_exposed(self):
+        assert 'index' in self.table.exposed, self.table
+        assert 'with_args' in self.table.exposed, self.table
+        assert self.table.names['with_args'] == EXPOSED
+
+    def test_controllers(self):
+        assert self.table.controllers == frozenset(['sub']), self.table
+        assert self.table.names['sub'] == CHILD
+        assert self.table.names['title'] == CHILD
+        assert 'nothing' not in self.table.names
+
+    def test_private_names_skipped(self):
+        assert '_lookup' not in self.table.names
+        assert '_dispatch' not in self.table.names
+
+    def test_flags(self):
+        assert self.table.lookup
+        assert not self.table.default
+        assert self.table.index
+        assert not self.table.dynamic
+
+    def test_sub_controller_flags(self):
+        table = get_dispatch_table(self.controller, MockController.sub)
+        assert table.index
+        assert not table.lookup
+
+    def test_dynamic(self):
+        controller = MockDynamicController()
+        table = get_dispatch_table(controller, controller)
+        assert table.dynamic
+
+    def test_cached_per_class(self):
+        table = get_dispatch_table(self.controller, MockController())
+        assert table is self.table
+
+    def test_clear(self):
+        clear_dispatch_tables()
+        assert not _dispatch_tables
+
+
+class TestWalkControllers(object):
+
+    def test_walk(self):
+        paths = dict(walk_controllers(MockController()))
+        assert () in paths, paths
+        assert ('sub',) in paths, paths
+        assert len(paths) == 2, paths
+
+    def test_walk_cycles(self):
+        root = MockSubController()
+        root.again = root
+        paths = list(walk_controllers(root))
+        assert len(paths) == 1, paths
+
+    def test_warm_argspec_cache(self):
+        from crank.util import get_argspec_cache
+        count = warm_argspec_cache(MockController())
+        assert count >= 4, count
+        assert get_argspec_cache().get(MockController().with_args.__func__) is not None
+
+
+class TestWarmup(object):
+
+    def setup(self):
+        clear_dispatch_tables()
+
+    def test_warmup(self):
+        root = MockController()
+        report = warmup_dispatch_tables(root)
+        assert report.nodes == 2, report
+        assert report.actions == 3, report
+        assert report.duration >= 0, report
+        assert (MockController, MockController) in _dispatch_tables
+        assert (MockController, MockSubController) in _dispatch_tables
+
+    def test_warmup_from_dispatcher(self):
+        report = MockController()._warmup()
+        assert report.nodes == 2, report
+
+    def test_warmup_skips_custom_dispatch(self):
+        report = warmup_dispatch_tables(MockOpaqueRootController())
+        assert report.nodes == 2, report
+        assert not [key for key in _dispatch_tables if key[1] is MockOpaqueController]
+
+
+class MockOpaqueController(object):
+    def _dispatch(self, state, remainder=None):
+        return state
+
+    def action(self):
+        pass
+
+
+class MockOpaqueRootController(MockController):
+    opaque = MockOpaqueController()
+
+
+class MockRestController(RestDispatcher):
+    sub = MockSubController()
+
+    def get_one(self, item_id):
+        pass
+
+    def get_edit(self, item_id):
+        pass
+
+    def post_archive(self, item_id):
+        pass
+
+    def PUT_archive(self, item_id):
+        pass
+
+    def refresh(self):
+        pass
+
+
+class TestRestDispatchTable(object):
+
+    def setup(self):
+        clear_dispatch_tables()
+        controller = MockRestController()
+        self.table = get_dispatch_table(controller, controller)
+
+    def test_table_class(self):
+        assert isinstance(self.table, RestDispatchTable), self.table
+
+    def test_rest_controllers(self):
+        assert self.table.rest_controllers == frozenset(['sub']), self.table.rest_controllers
+
+    def test_prefixed(self):
+        assert self.table.prefixed[('get', 'edit')] == 'get_edit'
+        assert self.table.prefixed[('get', 'one')] == 'get_one'
+        assert ('refresh', '') not in self.table.prefixed
+
+    def test_custom_get(self):
+        assert self.table.custom_get('edit') == 'get_edit'
+        assert self.table.custom_get('refresh') == 'refresh'
+        assert self.table.custom_get('missing') is None
+
+    def test_custom_method(self):
+        assert self.table.custom_method('PUT', 'archive') == 'PUT_archive'
+        assert self.table.custom_method('PATCH', 'archive') == 'post_archive'
+        assert self.table.custom_method('PATCH', 'refresh') == 'refresh'
+        assert self.table.custom_method('PATCH', 'missing') is None
+
+    def test_sub_getter(self):
+        assert self.table.sub_getter == (['item_id'], None), self.table.sub_getter
+
+    def test_no_sub_getter(self):
+        controller = RestDispatcher()
+        table = get_dispatch_table(controller, controller)
+        assert table.sub_getter is None
+        assert table.rest_controllers == frozenset(), table.rest_controllers
@@ -0,0 +1,291 @@
+import gc
+import threading
+from nose import SkipTest
+from nose.tools import raises
+from crank.objectdispatcher import ObjectDispatcher
+from crank.dispatchstate import DispatchState
+from crank.lookups import speculative, cached_lookup, lookup_cache_stats, LookupCache
+from webob.exc import HTTPNotFound
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None):
+        self.path_info = path_info
+        self.params = params or {}
+
+
+class MockFound(object):
+    def found(self):
+        pass
+
+
+class MockEmpty(object):
+    pass
+
+
+class MockSpyExecutor(object):
+    def __init__(self):
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+        except ImportError:
+            raise SkipTest('concurrent.futures is not available')
+        self.executor = ThreadPoolExecutor(2)
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(fn.__self__)
+        return self.executor.submit(fn, *args)
+
+
+class MockPendingExecutor(object):
+    """Executor whose futures never start running"""
+    def __init__(self):
+        try:
+            from concurrent.futures import Future
+        except ImportError:
+            raise SkipTest('concurrent.futures is not available')
+        self.future_class = Future
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = self.future_class()
+        self.futures.append(future)
+        return future
+
+
+class MockSubController(object):
+    def __init__(self, root_started=None):
+        self.root_started = root_started
+
+    @speculative
+    def _lookup(self, *remainder):
+        if self.root_started is not None:
+            self.concurrent = self.root_started.wait(5)
+        return MockEmpty(), remainder[1:]
+
+
+class MockPlainSubController(object):
+    def _lookup(self, *remainder):
+        return MockFound(), remainder[1:]
+
+
+class MockRootController(ObjectDispatcher):
+    def __init__(self, fail=False):
+        self.started = threading.Event()
+        self.fail = fail
+        self.sub = MockSubController(self.started)
+        self.plain = MockPlainSubController()
+
+    @speculative
+    def _lookup(self, *remainder):
+        self.started.set()
+        if self.fail:
+            raise ValueError('lookup failed')
+        return MockFound(), remainder[-1:]
+
+
+class MockPlainRootController(ObjectDispatcher):
+    sub = MockSubController()
+
+    def _lookup(self, *remainder):
+        return MockFound(), remainder[-1:]
+
+
+class TestSpeculativeLookups(object):
+
+    def setup(self):
+        self.executor = MockSpyExecutor()
+
+    def teardown(self):
+        self.executor.executor.shutdown()
+
+    def resolve(self, root, path):
+        root._lookup_executor = self.executor
+        return DispatchState(MockRequest(path), root).resolve()
+
+    def test_lookups_run_concurrently(self):
+        root = MockRootController()
+        state = self.resolve(root, '/sub/item/found')
+        assert state.action.__name__ == 'found', state.action
+        assert root.sub.concurrent, 'root lookup was not started ahead of time'
+        assert self.executor.submitted == [root], self.executor.submitted
+
+    def test_without_executor(self):
+        root = MockRootController()
+        root.sub.root_started = None
+        state = DispatchState(MockRequest('/sub/item/found'), root).resolve()
+        assert state.action.__name__ == 'found', state.action
+
+    def test_plain_lookups_are_not_started(self):
+        root = MockPlainRootController()
+        state = self.resolve(root, '/sub/item/found')
+        assert state.action.__name__ == 'found', state.action
+        assert self.executor.submitted == [], self.executor.submitted
+
+    @raises(ValueError)
+    def test_errors_raised_in_order(self):
+        root = MockRootController(fail=True)
+        self.resolve(root, '/sub/item/found')
+
+    def test_unused_errors_ignored(self):
+        root = MockRootController(fail=True)
+        state = self.resolve(root, '/plain/item/found')
+        assert state.action.__name__ == 'found', state.action
+        assert self.executor.submitted == [root], self.executor.submitted
+
+    def test_unused_lookups_cancelled(self):
+        root = MockRootController()
+        root._lookup_executor = executor = MockPendingExecutor()
+        state = DispatchState(MockRequest('/plain/item/found'), root)
+        state.resolve()
+        assert len(executor.futures) == 1, executor.futures
+        assert executor.futures[0].cancelled()
+        assert state._lookup_futures is None
+
+    @raises(HTTPNotFound)
+    def test_notfound(self):
+        root = MockPlainRootController()
+        root._lookup = lambda *remainder: (MockEmpty(), remainder)
+        self.resolve(root, '/sub/item/missing')
+
+
+class MockClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+clock = MockClock()
+
+
+class MockProduct(object):
+    def __init__(self, product_id):
+        self.product_id = product_id
+
+    def index(self):
+        pass
+
+    def reviews(self, page=None):
+        pass
+
+
+class MockProductsController(object):
+    calls = 0
+
+    @cached_lookup(maxsize=2, ttl=10, clock=clock)
+    def _lookup(self, product_id, *remainder):
+        MockProductsController.calls += 1
+        return MockProduct(product_id), remainder
+
+
+class MockCatalogController(ObjectDispatcher):
+    def __init__(self):
+        self.products = MockProductsController()
+        self.other = MockProductsController()
+
+
+class TestCachedLookup(object):
+
+    def setup(self):
+        clock.now = 0
+        MockProductsController.calls = 0
+        self.cache = MockProductsController._lookup.lookup_cache
+        self.cache.invalidate()
+        self.root = MockCatalogController()
+
+    def resolve(self, path):
+        return DispatchState(MockRequest(path), self.root).resolve()
+
+    def test_cached(self):
+        state = self.resolve('/products/1/reviews')
+        assert state.controller.product_id == '1', state.controller
+        state = self.resolve('/products/1/reviews/2')
+        assert state.action.__name__ == 'reviews', state.action
+        assert list(state.remainder) == ['2'], state.remainder
+        state = self.resolve('/products/1')
+        assert state.action.__name__ == 'index', state.action
+        assert MockProductsController.calls == 1, MockProductsController.calls
+
+    def test_keyed_per_controller(self):
+        first = self.resolve('/products/1').controller
+        second = self.resolve('/other/1').controller
+        assert first is not second
+        assert MockProductsController.calls == 2, MockProductsController.calls
+
+    def test_ttl(self):
+        self.resolve('/products/1')
+        clock.now = 11
+        self.resolve('/products/1')
+        assert MockProductsController.calls == 2, MockProductsController.calls
+
+    def test_maxsize(self):
+        for product_id in ('1', '2', '3', '1'):
+            self.resolve('/products/%s' % product_id)
+        assert MockProductsController.calls == 4, MockProductsController.calls
+
+    def test_invalidate(self):
+        self.resolve('/products/1')
+        self.resolve('/products/2')
+        self.cache.invalidate(segments=['1'])
+        self.resolve('/products/1')
+        self.resolve('/products/2')
+        assert MockProductsController.calls == 3, MockProductsController.calls
+
+        self.cache.invalidate(controller=self.root.products)
+        self.resolve('/products/2')
+        assert MockProductsController.calls == 4, MockProductsController.calls
+
+    def test_uncacheable_result(self):
+        class MockRewriting(object):
+            calls = 0
+
+            @cached_lookup()
+            def _lookup(self, *remainder):
+                MockRewriting.calls += 1
+                return MockProduct('x'), ('reviews', )
+
+        self.root.rewriting = MockRewriting()
+        for i in range(2):
+            state = self.resolve('/rewriting/a/b')
+            assert state.action.__name__ == 'reviews', state.action
+        assert MockRewriting.calls == 2, MockRewriting.calls
+
+    def test_nothing_consumed(self):
+        class MockPassThrough(object):
+            @cached_lookup()
+            def _lookup(self, *remainder):
+                return MockProduct(remainder[0]), remainder
+
+        self.root.passing = MockPassThrough()
+        state = self.resolve('/passing/reviews')
+        assert state.controller.product_id == 'reviews', state.controller
+        state = self.resolve('/passing/index')
+        assert state.controller.product_id == 'index', state.controller
+
+    def test_stats(self):
+        before = lookup_cache_stats()
+        self.resolve('/products/1')
+        self.resolve('/products/1')
+        stats = self.root._cache_stats()
+        assert stats['lookups']['hits'] == before['hits'] + 1, stats
+        assert stats['lookups']['misses'] == before['misses'] + 1, stats
+        assert 0 < stats['lookups']['hit_rate'] <= 1, stats
+        assert 'routes' not in stats, stats
+
+    def test_longest_prefix_first(self):
+        cache = LookupCache()
+        cache.set(self.root, ('a', 'b', 'c'), ('long', ('c', )))
+        cache.set(self.root, ('a', 'c'), ('short', ('c', )))
+        assert cache.get(self.root, ('a', 'b', 'c')) == ('long', ('c', ))
+        assert cache.get(self.root, ('a', 'c')) == ('short', ('c', ))
+
+    def test_caches_released(self):
+        before = lookup_cache_stats()['caches']
+        lookup = cached_lookup()(lambda self, *remainder: (self, remainder))
+        assert lookup_cache_stats()['caches'] == before + 1
+        del lookup
+        gc.collect()
+        assert lookup_cache_stats()['caches'] == before
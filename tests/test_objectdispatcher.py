@@ -307,3 +307,66 @@ class TestDispatcher:
         assert state.method.__name__ == 'with_args', state.method
         assert 'para.meter1' in state.remainder, state.remainder
         assert 'para.meter2.json' in state.remainder, state.remainder
+
+    def test_many_empty_segments(self):
+        req = MockRequest('/' * 5000 + 'sub/')
+        state = DispatchState(req, self.dispatcher)
+        state = state.resolve()
+        assert state.method.__name__ == 'index', state.method
+        assert state.controller is self.dispatcher.sub, state.controller
+
+    def test_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() + 100
+        leaf = root = MockDispatcherWithNoDefault()
+        for i in range(depth):
+            root = type('MockLevel%d' % i, (MockDispatcherWithNoDefault, ), {'child': root})()
+
+        req = MockRequest('/child' * depth)
+        state = DispatchState(req, root)
+        state = state.resolve()
+        assert state.controller is leaf, state.controller
+        assert len(state.controller_path) == depth + 1, len(state.controller_path)
+
+    def test_dispatch_controller_override(self):
+        visited = []
+        class MockTrackingDispatcher(MockDispatcher):
+            def _dispatch_controller(self, current_path, controller, state, remainder):
+                visited.append(current_path)
+                return super(MockTrackingDispatcher, self)._dispatch_controller(
+                    current_path, controller, state, remainder)
+
+        req = MockRequest('/sub/')
+        state = DispatchState(req, MockTrackingDispatcher())
+        state = state.resolve()
+        assert state.method.__name__ == 'index', state.method
+        assert visited == ['sub'], visited
+
+    def test_enter_controller_override(self):
+        entered = []
+        class MockEnteringDispatcher(MockDispatcher):
+            def _enter_controller(self, state, remainder):
+                entered.append(state.controller)
+                return super(MockEnteringDispatcher, self)._enter_controller(state, remainder)
+
+        dispatcher = MockEnteringDispatcher()
+        req = MockRequest('/no_args')
+        state = DispatchState(req, dispatcher)
+        state = state.resolve()
+        assert state.method.__name__ == 'no_args', state.method
+        assert entered == [dispatcher], entered
+
+
+class TestCompiledDispatcher(TestDispatcher):
+
+    def setup(self):
+        super(TestCompiledDispatcher, self).setup()
+        ObjectDispatcher._use_compiled_dispatch = True
+
+    def teardown(self):
+        ObjectDispatcher._use_compiled_dispatch = False
+
+    def test_private_attribute_is_not_compiled(self):
+        req = MockRequest('/_default/a')
+        state = DispatchState(req, self.dispatcher)
+        state = state.resolve()
+        assert state.method.__name__ == '_default', state.method
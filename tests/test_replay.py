@@ -0,0 +1,209 @@
+import gzip
+import json
+import os
+import sys
+import tempfile
+from crank.objectdispatcher import ObjectDispatcher
+from crank.replay import LogReplay, parse_log_line, format_report, open_log, main
+from crank.routecache import RouteCache
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class MockLookedUp(object):
+    def index(self):
+        pass
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+    def with_args(self, a, b=None):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+
+    def index(self):
+        pass
+
+    def broken(self):
+        pass
+
+    def _lookup(self, item_id, *remainder):
+        if item_id == 'boom':
+            raise ValueError(item_id)
+        if item_id != 'items':
+            return object(), remainder
+        return MockLookedUp(), remainder[1:]
+
+
+class MockClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 0.001
+        return self.now
+
+
+LOG = '''127.0.0.1 - - [10/Oct/2020:13:55:36 +0000] "GET /sub/with_args/1 HTTP/1.1" 200 12 "-" "curl"
+127.0.0.1 - - [10/Oct/2020:13:55:37 +0000] "GET /sub/with_args?a=1&b=2 HTTP/1.1" 200 12
+127.0.0.1 - - [10/Oct/2020:13:55:38 +0000] "POST /sub/with_args/1 HTTP/1.0" 200 12
+GET /sub/with_args/1
+/items/5
+/missing/path
+
+garbage line
+/boom
+'''
+
+
+class TestParseLogLine(object):
+
+    def test_combined(self):
+        line = '1.2.3.4 - bob [10/Oct/2020:13:55:36 +0000] "PUT /a/b?c=1 HTTP/1.1" 200 1 "-" "ua"'
+        assert parse_log_line(line) == ('PUT', '/a/b', 'c=1'), parse_log_line(line)
+
+    def test_plain(self):
+        assert parse_log_line('DELETE /a\n') == ('DELETE', '/a', ''), parse_log_line('DELETE /a')
+        assert parse_log_line('/a/b?x=') == ('GET', '/a/b', 'x='), parse_log_line('/a/b?x=')
+
+    def test_absolute_form(self):
+        line = '1.2.3.4 - - [10/Oct/2020:13:55:36 +0000] "GET http://example.com:8080/a/b?c=1 HTTP/1.1" 200 1'
+        assert parse_log_line(line) == ('GET', '/a/b', 'c=1'), parse_log_line(line)
+        assert parse_log_line('GET https://example.com') == ('GET', '/', ''), parse_log_line('GET https://example.com')
+
+    def test_no_request(self):
+        assert parse_log_line('') is None
+        assert parse_log_line('garbage line') is None
+
+
+class TestLogReplay(object):
+
+    def setup(self):
+        self.root = MockRootController()
+        self.replay = LogReplay(self.root, cache_sizes=(1, 10), clock=MockClock())
+
+    def test_report(self):
+        report = self.replay.replay(StringIO(LOG)).report()
+        assert report['requests'] == 7, report
+        assert report['skipped'] == 2, report
+        assert report['errors'] == {'404': 1, 'ValueError': 1}, report['errors']
+        assert abs(report['dispatch_ms'] - 7) < 1e-6, report
+
+        actions = report['actions']
+        assert actions[0]['action'] == 'tests.test_replay:MockSubController.with_args', actions
+        assert actions[0]['count'] == 4, actions
+        assert abs(actions[0]['mean_us'] - 1000) < 1e-3, actions
+        assert actions[1]['action'] == 'tests.test_replay:MockLookedUp.index', actions
+
+    def test_cache_projection(self):
+        report = self.replay.replay(StringIO(LOG)).report()
+        # the lookup route is not cacheable
+        assert report['cacheable'] == 4, report
+        small, large = report['route_cache']
+        assert small['hits'] == 0, small
+        assert large['hits'] == 1, large
+        assert large['hit_rate'] == 0.25, large
+
+    def test_root_caches_bypassed(self):
+        self.root._route_cache = RouteCache()
+        self.replay.replay(StringIO(LOG))
+        assert self.root._route_cache.stats()['size'] == 0, self.root._route_cache.stats()
+        assert not self.replay.report()['caches']
+
+        replay = LogReplay(self.root, clock=MockClock(), caches=True)
+        report = replay.replay(StringIO(LOG)).report()
+        assert self.root._route_cache.stats()['hits'] == 1, self.root._route_cache.stats()
+        assert report['caches']
+        assert 'through the root caches' in format_report(report)
+
+    def test_top(self):
+        report = self.replay.replay(StringIO(LOG)).report(top=1)
+        assert len(report['actions']) == 1, report['actions']
+        assert 'with_args' in format_report(report)
+
+
+class TestOpenLog(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        for name in os.listdir(self.directory):
+            os.unlink(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def replay(self, filename):
+        log = open_log(filename)
+        try:
+            return LogReplay(MockRootController()).replay(log).report()
+        finally:
+            log.close()
+
+    def test_undecodable_lines_skipped(self):
+        filename = os.path.join(self.directory, 'access.log')
+        with open(filename, 'wb') as f:
+            f.write(b'/sub/with_args/1\n/sub/\xff\xfe/1\n/sub/with_args/2\n')
+        report = self.replay(filename)
+        assert report['requests'] == 2, report
+        assert report['skipped'] == 1, report
+
+    def test_replacement_character_dispatched(self):
+        filename = os.path.join(self.directory, 'access.log')
+        with open(filename, 'wb') as f:
+            f.write(u'/sub/with_args/\ufffd\n/sub/\xff/1\n'.encode('utf-8'))
+        report = self.replay(filename)
+        assert report['requests'] == 2, report
+        assert report['skipped'] == 0, report
+
+    def test_undecodable_gzip_lines_skipped(self):
+        filename = os.path.join(self.directory, 'access.log.gz')
+        log = gzip.open(filename, 'wb')
+        log.write(b'/sub/\xff\xfe/1\n/sub/with_args/2\n')
+        log.close()
+        report = self.replay(filename)
+        assert report['requests'] == 1, report
+        assert report['skipped'] == 1, report
+
+
+class TestMain(object):
+
+    def run(self, filename, *args):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            main(['tests.test_replay:MockRootController', filename] + list(args))
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_gzip_json(self):
+        fd, filename = tempfile.mkstemp(suffix='.gz')
+        os.close(fd)
+        try:
+            log = gzip.open(filename, 'wb')
+            log.write(LOG.encode('utf-8'))
+            log.close()
+            report = json.loads(self.run(filename, '--json', '--cache-sizes', '10'))
+        finally:
+            os.unlink(filename)
+        assert report['requests'] == 7, report
+        assert [p['maxsize'] for p in report['route_cache']] == [10], report['route_cache']
+
+    def test_text(self):
+        fd, filename = tempfile.mkstemp()
+        os.write(fd, LOG.encode('utf-8'))
+        os.close(fd)
+        try:
+            output = self.run(filename, '--top', '0')
+        finally:
+            os.unlink(filename)
+        assert output.startswith('7 requests, 2 lines skipped'), output
+        assert 'MockLookedUp.index' in output, output
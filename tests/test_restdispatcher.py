@@ -500,4 +500,53 @@ class TestRestCheckSecurity:
         state = state.resolve()
         assert state.controller.__class__.__name__ == 'rest', state.controller
         assert state.method.__name__ == 'get', state.method
-        assert len(self.security_tracing) == 1, self.security_tracing
\ No newline at end of file
+        assert len(self.security_tracing) == 1, self.security_tracing
+
+class TestRestVarArgsPrivateSubController:
+    class RootController(ObjectDispatcher):
+        class rest(RestDispatcher):
+            class _private(RestDispatcher):
+                def get_all(self):
+                    pass
+            _private = _private()
+
+            def get_one(self, *args):
+                pass
+        rest = rest()
+
+    def setup(self):
+        self.dispatcher = self.RootController()
+
+    def test_private_sub_controller(self):
+        req = MockRequest('/rest/1/_private')
+        state = DispatchState(req, self.dispatcher)
+        state = state.resolve()
+        assert state.controller.__class__.__name__ == '_private', state.controller
+        assert state.method.__name__ == 'get_all', state.method
+
+    def test_get_one(self):
+        req = MockRequest('/rest/1/2')
+        state = DispatchState(req, self.dispatcher)
+        state = state.resolve()
+        assert state.method.__name__ == 'get_one', state.method
+        assert list(state.remainder) == ['1', '2'], state.remainder
+
+def _compiled_test_class(test_class):
+    def setup(self):
+        ObjectDispatcher._use_compiled_dispatch = True
+        test_class.setup(self)
+
+    def teardown(self):
+        ObjectDispatcher._use_compiled_dispatch = False
+
+    return type('TestCompiled' + test_class.__name__[4:], (test_class, ),
+                {'setup': setup, 'teardown': teardown})
+
+for _test_class in (TestDispatcher, TestSimpleDispatcher, TestEmbeddedRestDispatcher,
+                    TestMinimalRestDispatcher, TestDispatcherWithArgs, TestDispatcherWithVarArgs,
+                    TestCustomMethodDispatcher, TestSubCustomMethodDispatcher,
+                    TestSubNoGetDispatcher, TestEmptyDispatcher, TestRestWithSecurity,
+                    TestRestWithLookup, TestRestCheckSecurity, TestRestVarArgsPrivateSubController):
+    _compiled_class = _compiled_test_class(_test_class)
+    globals()[_compiled_class.__name__] = _compiled_class
+del _test_class, _compiled_class
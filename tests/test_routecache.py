@@ -0,0 +1,227 @@
+from nose.tools import raises
+from crank.objectdispatcher import ObjectDispatcher
+from crank.dispatchstate import DispatchState
+from crank.routecache import RouteCache, NotFoundCache
+from crank.security import pure_security_check
+from webob.exc import HTTPNotFound, HTTPForbidden
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None, method='GET'):
+        self.path_info = path_info
+        self.method = method
+        self.params = params
+        if params is None:
+            self.params = {}
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+    def with_args(self, a, b=None):
+        pass
+
+
+class MockLookupController(object):
+    def index(self):
+        pass
+
+
+class MockSecuredController(ObjectDispatcher):
+    def _check_security(self):
+        pass
+
+    def index(self):
+        pass
+
+
+class MockPureSecuredController(ObjectDispatcher):
+    checks = 0
+    allowed = True
+
+    @pure_security_check
+    def _check_security(self):
+        MockPureSecuredController.checks += 1
+        if not self.allowed:
+            raise HTTPForbidden()
+
+    def index(self):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+    secured = MockSecuredController()
+    pure = MockPureSecuredController()
+
+    def index(self):
+        pass
+
+    def _lookup(self, *args):
+        return MockLookupController(), args[1:]
+
+
+class TestRouteCache(object):
+
+    def setup(self):
+        self.root = MockRootController()
+        self.root._route_cache = RouteCache(maxsize=10)
+        MockPureSecuredController.checks = 0
+
+    def teardown(self):
+        MockPureSecuredController.allowed = True
+
+    def resolve(self, path, params=None):
+        return DispatchState(MockRequest(path, params), self.root).resolve()
+
+    def test_miss_then_hit(self):
+        state = self.resolve('/sub/with_args/1')
+        assert state.method.__name__ == 'with_args', state.method
+        state = self.resolve('/sub/with_args/2')
+        assert self.root._route_cache.misses == 2, self.root._route_cache.stats()
+
+        state = self.resolve('/sub/with_args/1')
+        assert self.root._route_cache.hits == 1, self.root._route_cache.stats()
+        assert state.method.__name__ == 'with_args', state.method
+        assert list(state.remainder) == ['1'], state.remainder
+        assert state.controller is self.root.sub, state.controller
+        assert [p[0] for p in state.controller_path] == ['/', 'sub'], state.controller_path
+
+    def test_params_are_part_of_key(self):
+        self.resolve('/sub/with_args/1')
+        state = self.resolve('/sub/with_args/1', params={'b': 2})
+        assert self.root._route_cache.hits == 0, self.root._route_cache.stats()
+        assert state.method.__name__ == 'with_args', state.method
+
+    def test_lookup_not_cached(self):
+        self.resolve('/something')
+        state = self.resolve('/something')
+        assert self.root._route_cache.hits == 0, self.root._route_cache.stats()
+        assert state.controller.__class__.__name__ == 'MockLookupController'
+
+    def test_security_not_cached(self):
+        self.resolve('/secured')
+        self.resolve('/secured')
+        assert self.root._route_cache.hits == 0, self.root._route_cache.stats()
+        assert self.root._route_cache.stats()['size'] == 0
+
+    def test_pure_security_replayed(self):
+        self.resolve('/pure')
+        state = self.resolve('/pure')
+        assert self.root._route_cache.hits == 1, self.root._route_cache.stats()
+        assert state.method == self.root.pure.index, state.method
+        assert MockPureSecuredController.checks == 2, MockPureSecuredController.checks
+
+    @raises(HTTPForbidden)
+    def test_pure_security_denied_on_replay(self):
+        self.resolve('/pure')
+        MockPureSecuredController.allowed = False
+        self.resolve('/pure')
+
+    def test_invalidate(self):
+        self.resolve('/sub')
+        self.root._route_cache.invalidate(MockRootController())
+        assert self.root._route_cache.stats()['size'] == 1
+        self.root._route_cache.invalidate(self.root)
+        assert self.root._route_cache.stats()['size'] == 0
+
+    def test_clear(self):
+        self.resolve('/sub')
+        self.root._route_cache.invalidate()
+        assert self.root._route_cache.stats()['size'] == 0
+
+    @raises(HTTPNotFound)
+    def test_not_found(self):
+        self.resolve('/sub/missing/path/that/is/long')
+
+
+class MockNoLookupRootController(ObjectDispatcher):
+    sub = MockSubController()
+    secured = MockSecuredController()
+    pure = MockPureSecuredController()
+    looked = MockRootController()
+
+    def index(self):
+        pass
+
+
+class TestNotFoundCache(object):
+
+    def setup(self):
+        self.root = MockNoLookupRootController()
+        self.root._notfound_cache = NotFoundCache(maxsize=10, ttl=60)
+
+    def resolve(self, path, params=None):
+        return DispatchState(MockRequest(path, params), self.root).resolve()
+
+    def assert_not_found(self, path, params=None):
+        try:
+            self.resolve(path, params)
+        except HTTPNotFound:
+            pass
+        else:
+            assert False, 'HTTPNotFound not raised for %s' % path
+
+    def test_not_found_cached(self):
+        cache = self.root._notfound_cache
+        self.assert_not_found('/sub/missing/path')
+        assert cache.misses == 1, cache.stats()
+        self.assert_not_found('/sub/missing/path')
+        assert cache.hits == 1, cache.stats()
+        assert cache.stats()['size'] == 1, cache.stats()
+
+    def test_found_not_cached(self):
+        cache = self.root._notfound_cache
+        self.resolve('/sub/with_args/1')
+        state = self.resolve('/sub/with_args/1')
+        assert state.method.__name__ == 'with_args', state.method
+        assert cache.stats()['size'] == 0, cache.stats()
+
+    def test_params_are_part_of_key(self):
+        self.assert_not_found('/sub/with_args')
+        state = self.resolve('/sub/with_args', params={'a': 1})
+        assert state.method.__name__ == 'with_args', state.method
+
+    def test_lookup_not_cached(self):
+        self.assert_not_found('/looked/sub/missing/path')
+        assert self.root._notfound_cache.stats()['size'] == 0
+
+    def test_security_not_cached(self):
+        self.assert_not_found('/secured/missing/path')
+        assert self.root._notfound_cache.stats()['size'] == 0
+
+    def test_pure_security_replayed(self):
+        MockPureSecuredController.checks = 0
+        self.assert_not_found('/pure/missing/path')
+        self.assert_not_found('/pure/missing/path')
+        assert self.root._notfound_cache.hits == 1, self.root._notfound_cache.stats()
+        assert MockPureSecuredController.checks == 2, MockPureSecuredController.checks
+
+    @raises(HTTPForbidden)
+    def test_pure_security_denied_on_replay(self):
+        self.assert_not_found('/pure/missing/path')
+        MockPureSecuredController.allowed = False
+        try:
+            self.resolve('/pure/missing/path')
+        finally:
+            MockPureSecuredController.allowed = True
+
+    def test_expiration(self):
+        cache = self.root._notfound_cache
+        cache._routes.clock = lambda: 0
+        self.assert_not_found('/sub/missing/path')
+        cache._routes.clock = lambda: 60
+        self.assert_not_found('/sub/missing/path')
+        assert cache.hits == 0, cache.stats()
+        assert cache.stats()['expirations'] == 1, cache.stats()
+
+    def test_with_route_cache(self):
+        self.root._route_cache = RouteCache()
+        self.assert_not_found('/sub/missing/path')
+        self.assert_not_found('/sub/missing/path')
+        assert self.root._notfound_cache.hits == 1, self.root._notfound_cache.stats()
+        state = self.resolve('/sub')
+        state = self.resolve('/sub')
+        assert self.root._route_cache.hits == 1, self.root._route_cache.stats()
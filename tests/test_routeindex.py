@@ -0,0 +1,263 @@
+from nose.tools import raises
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.dispatchstate import DispatchState
+from crank.dispatchtable import clear_dispatch_tables
+from crank.routecache import RouteCache
+from crank.routeindex import RouteIndex
+from webob.exc import HTTPNotFound
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None, method='GET'):
+        self.path_info = path_info
+        self.method = method
+        self.params = params
+        if params is None:
+            self.params = {}
+
+
+class MockLeafController(object):
+    def index(self, *args):
+        pass
+
+    def with_args(self, a, b=None):
+        pass
+
+
+class MockLookupController(ObjectDispatcher):
+    def index(self):
+        pass
+
+    def _lookup(self, *args):
+        return MockLeafController(), args[1:]
+
+
+class MockDefaultController(ObjectDispatcher):
+    def _default(self, *args):
+        pass
+
+
+class MockCustomDispatchController(ObjectDispatcher):
+    def wacky(self, *args):
+        pass
+
+    def _dispatch(self, state, remainder=None):
+        state.set_action(self.wacky, remainder)
+        return state
+
+
+class SecurityError(Exception):
+    pass
+
+
+class MockSecuredController(ObjectDispatcher):
+    allowed = True
+
+    def _check_security(self):
+        if not self.allowed:
+            raise SecurityError()
+
+    def index(self):
+        pass
+
+    leaf = MockLeafController()
+
+
+class MockMiddleController(ObjectDispatcher):
+    leaf = MockLeafController()
+    looked = MockLookupController()
+
+    def index(self):
+        pass
+
+    def _private(self):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    middle = MockMiddleController()
+    default = MockDefaultController()
+    custom = MockCustomDispatchController()
+    secured = MockSecuredController()
+    data = [1, 2, 3]
+
+    def index(self):
+        pass
+
+    def with_args(self, a):
+        pass
+
+
+class MockRestController(RestDispatcher):
+    def get_one(self, item_id):
+        pass
+
+    def put(self, item_id, **kw):
+        pass
+
+    def other(self, *args):
+        pass
+
+
+class MockOpaqueController(object):
+    def _dispatch(self, state, remainder=None):
+        state.set_action(self.opaque, remainder)
+        return state
+
+    def opaque(self, *args):
+        pass
+
+
+class MockRestRootController(ObjectDispatcher):
+    middle = MockMiddleController()
+    default = MockDefaultController()
+    custom = MockCustomDispatchController()
+    items = MockRestController()
+    opaque = MockOpaqueController()
+
+
+class TestRouteIndex(object):
+
+    def setup(self):
+        self.root = MockRootController()
+        self.root._route_index = RouteIndex(self.root)
+
+    def resolve(self, path, params=None, root=None):
+        return DispatchState(MockRequest(path, params), root or self.root).resolve()
+
+    def test_nodes(self):
+        index = self.root._route_index
+        assert index.root.plain
+        assert sorted(index.root.children) == ['custom', 'default', 'middle', 'secured'], index.root
+        assert index.root.children['middle'].children['leaf'].plain
+        assert not index.root.children['default'].plain
+        assert not index.root.children['custom'].plain
+        assert not index.root.children['middle'].children['looked'].plain
+        assert index.root.children['secured'].check_security
+        assert not index.root.check_security
+        assert index.nodes == 8, index.nodes
+
+    def test_static_route(self):
+        state = self.resolve('/middle/leaf/with_args/1')
+        assert state.method.__name__ == 'with_args', state.method
+        assert list(state.remainder) == ['1'], state.remainder
+        assert [p[0] for p in state.controller_path] == ['/', 'middle', 'leaf'], state.controller_path
+
+    def test_empty_segments(self):
+        state = self.resolve('/middle//leaf/')
+        assert state.method.__name__ == 'index', state.method
+        assert state.controller is self.root.middle.leaf, state.controller
+
+    def test_handoff_to_lookup(self):
+        state = self.resolve('/middle/looked/something/with_args/1')
+        assert state.method.__name__ == 'with_args', state.method
+        assert list(state.remainder) == ['1'], state.remainder
+
+    def test_handoff_to_default(self):
+        state = self.resolve('/default/a/b')
+        assert state.method.__name__ == '_default', state.method
+        assert list(state.remainder) == ['a', 'b'], state.remainder
+
+    def test_handoff_to_custom_dispatch(self):
+        state = self.resolve('/custom/a')
+        assert state.method.__name__ == 'wacky', state.method
+
+    def test_private_is_not_indexed(self):
+        state = self.resolve('/middle/_private')
+        assert state.method.__name__ == '_private', state.method
+
+    def test_index_fallback(self):
+        state = self.resolve('/middle/leaf/missing')
+        assert state.method.__name__ == 'index', state.method
+        assert list(state.remainder) == ['missing'], state.remainder
+
+    @raises(HTTPNotFound)
+    def test_not_found(self):
+        self.resolve('/middle/missing')
+
+    @raises(HTTPNotFound)
+    def test_data_attribute(self):
+        self.resolve('/data/a')
+
+    def test_security(self):
+        secured = self.root.secured
+        secured.allowed = False
+        try:
+            self.resolve('/secured/leaf')
+        except SecurityError:
+            pass
+        else:
+            assert False, 'security check not performed'
+        finally:
+            secured.allowed = True
+
+        state = self.resolve('/secured/leaf')
+        assert state.method.__name__ == 'index', state.method
+
+    def test_with_route_cache(self):
+        self.root._route_cache = RouteCache()
+        self.resolve('/middle/leaf/with_args/1')
+        state = self.resolve('/middle/leaf/with_args/1')
+        assert self.root._route_cache.hits == 1, self.root._route_cache.stats()
+        assert state.method.__name__ == 'with_args', state.method
+
+    def test_same_as_recursive_dispatch(self):
+        plain = MockRootController()
+        for path, params in [('/', None), ('/with_args/1', None), ('/with_args', {'a': 1}),
+                             ('/middle', None), ('/middle/leaf/with_args/1/2', None),
+                             ('/middle/leaf/with_args', {'a': 1}), ('/middle/looked/x', None),
+                             ('/middle/looked', None), ('/default/x', None),
+                             ('/secured/index', None), ('/custom/x/y', None),
+                             ('/middle/missing', None), ('/nothing/here', None)]:
+            results = []
+            for root in (self.root, plain):
+                try:
+                    state = self.resolve(path, params, root)
+                except HTTPNotFound:
+                    results.append(None)
+                else:
+                    results.append((state.method.__name__, list(state.remainder),
+                                    [p[0] for p in state.controller_path]))
+            assert results[0] == results[1], (path, results)
+
+    def test_empty_segments_same_as_recursive_dispatch(self):
+        indexed = MockRestRootController()
+        indexed._route_index = RouteIndex(indexed)
+        plain = MockRestRootController()
+        for path, method in [('/middle//leaf/', 'GET'), ('//middle/leaf', 'GET'),
+                             ('/middle//_private', 'GET'), ('/default//x', 'GET'),
+                             ('/custom//a', 'GET'), ('/items//1', 'GET'),
+                             ('/items//other/2/kw', 'PUT'), ('/items/1//', 'PUT'),
+                             ('/opaque//a', 'GET')]:
+            results = []
+            for root in (indexed, plain):
+                try:
+                    state = DispatchState(MockRequest(path, method=method), root).resolve()
+                except HTTPNotFound:
+                    results.append(None)
+                else:
+                    results.append((state.method.__name__, list(state.remainder),
+                                    [p[0] for p in state.controller_path]))
+            assert results[0] == results[1], (path, results)
+
+    def test_custom_dispatch_is_opaque(self):
+        root = MockRestRootController()
+        index = root._route_index = RouteIndex(root)
+        node = index.root.children['opaque']
+        assert not node.plain and node.table is None and not node.children, node
+        state = DispatchState(MockRequest('/opaque/a/b'), root).resolve()
+        assert state.method.__name__ == 'opaque', state.method
+        assert list(state.remainder) == ['a', 'b'], state.remainder
+
+    def test_rebuild(self):
+        index = self.root._route_index
+        MockMiddleController.extra = MockLeafController()
+        try:
+            clear_dispatch_tables()
+            index.rebuild()
+            assert 'extra' in index.root.children['middle'].children, index.root.children['middle']
+        finally:
+            del MockMiddleController.extra
+            clear_dispatch_tables()
@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+from nose.tools import raises
+from crank.objectdispatcher import ObjectDispatcher
+from crank.restdispatcher import RestDispatcher
+from crank.routes import collect_routes, routes_as_json, load_root, main
+
+
+class MockLookedUp(object):
+    def index(self):
+        pass
+
+
+class MockSubController(object):
+    def index(self):
+        pass
+
+    def with_args(self, a, b=None):
+        pass
+
+    def _lookup(self, *args):
+        return MockLookedUp(), args[1:]
+
+
+class MockCustomDispatchController(ObjectDispatcher):
+    def _dispatch(self, state, remainder=None):
+        pass
+
+
+class MockCommentsController(RestDispatcher):
+    def get_all(self):
+        pass
+
+
+class MockRestController(RestDispatcher):
+    comments = MockCommentsController()
+
+    def get_one(self, item_id):
+        pass
+
+    def get_all(self):
+        pass
+
+    def post(self, **kw):
+        pass
+
+    def edit(self, item_id):
+        pass
+
+    def get_summary(self, item_id):
+        pass
+
+    def post_archive(self, item_id):
+        pass
+
+    def other(self):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+    items = MockRestController()
+    custom = MockCustomDispatchController()
+
+    def index(self):
+        pass
+
+    def _default(self, *args):
+        pass
+
+
+def _routes():
+    return dict(((r.pattern, r.verb), r) for r in collect_routes(MockRootController()))
+
+
+class TestCollectRoutes(object):
+
+    def setup(self):
+        self.routes = _routes()
+
+    def test_object_routes(self):
+        route = self.routes[('/', '*')]
+        assert route.kind == 'index', route
+        assert route.action == 'tests.test_routes:MockRootController.index', route
+
+        route = self.routes[('/sub/with_args/{a}[/{b}]', '*')]
+        assert route.kind == 'exposed', route
+        assert route.path == '/sub/with_args', route
+        assert route.argspec == {'args': ['a', 'b'], 'defaults': 1,
+                                 'varargs': None, 'varkw': None}, route.argspec
+
+    def test_boundaries(self):
+        assert self.routes[('/*', '*')].kind == 'default'
+        assert self.routes[('/sub/*', '*')].kind == 'lookup'
+        route = self.routes[('/custom/*', '*')]
+        assert route.kind == 'dispatch', route
+        assert route.action.endswith('MockCustomDispatchController._dispatch'), route
+
+    def test_rest_routes(self):
+        assert self.routes[('/items', 'GET')].action.endswith('.get_all')
+        assert self.routes[('/items', 'POST')].action.endswith('.post')
+        assert self.routes[('/items/{item_id}', 'GET')].action.endswith('.get_one')
+        assert self.routes[('/items/{item_id}/edit', 'GET')].action.endswith('.edit')
+        assert self.routes[('/items/{item_id}/summary', 'GET')].action.endswith('.get_summary')
+        assert self.routes[('/items/{item_id}?_method=archive', 'POST')].action.endswith('.post_archive')
+        assert self.routes[('/items/other', '*')].kind == 'exposed'
+        assert ('/items/{item_id}', 'PUT') not in self.routes
+
+    def test_rest_nested(self):
+        route = self.routes[('/items/{item_id}/comments', 'GET')]
+        assert route.action.endswith('MockCommentsController.get_all'), route
+
+    def test_as_json(self):
+        table = routes_as_json(MockRootController())
+        assert table['schema'] == 1, table
+        assert table['root'] == 'tests.test_routes:MockRootController', table['root']
+        json.dumps(table)
+
+
+class TestCommandLine(object):
+
+    def test_load_root(self):
+        root = load_root('tests.test_routes:MockRootController')
+        assert isinstance(root, MockRootController), root
+
+    @raises(ValueError)
+    def test_load_root_bad_format(self):
+        load_root('tests.test_routes')
+
+    def test_main(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            main(['tests.test_routes:MockRootController', '--output', filename])
+            with open(filename) as f:
+                table = json.load(f)
+        finally:
+            os.remove(filename)
+        assert table['root'] == 'tests.test_routes:MockRootController', table['root']
+        patterns = [route['pattern'] for route in table['routes']]
+        assert '/sub/with_args/{a}[/{b}]' in patterns, patterns
@@ -0,0 +1,190 @@
+from nose.tools import raises
+from crank.objectdispatcher import ObjectDispatcher
+from crank.dispatchstate import DispatchState
+from crank.dispatchtable import get_dispatch_table, clear_dispatch_tables
+from crank.routeindex import RouteIndex
+from crank.security import pure_security_check, security_check_kind, PURE_CHECK, CHECK
+from webob.exc import HTTPNotFound, HTTPForbidden, HTTPUnauthorized, HTTPBadRequest
+
+calls = []
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None):
+        self.path_info = path_info
+        self.params = params or {}
+
+
+class MockPlainController(object):
+    def index(self):
+        calls.append('index')
+
+
+class MockPureController(object):
+    allowed = True
+
+    @pure_security_check
+    def _check_security(self):
+        calls.append('pure')
+        if not self.allowed:
+            raise HTTPForbidden()
+
+    def index(self):
+        pass
+
+
+class MockCheckedController(object):
+    def _check_security(self):
+        calls.append('checked')
+
+    def _lookup(self, *remainder):
+        calls.append('lookup')
+        return MockPlainController(), remainder[1:]
+
+
+class MockCustomCheckDispatcher(ObjectDispatcher):
+    def _perform_security_check(self, controller):
+        calls.append('custom')
+
+
+class MockBadLookupController(object):
+    def _lookup(self, *remainder):
+        calls.append('lookup')
+        raise HTTPBadRequest()
+
+
+class MockProtectedRootController(ObjectDispatcher):
+    _defer_security_checks = True
+
+    def __init__(self):
+        self.bad = MockBadLookupController()
+
+    @pure_security_check
+    def _check_security(self):
+        calls.append('pure')
+        raise HTTPUnauthorized()
+
+
+class MockRootController(ObjectDispatcher):
+    def __init__(self):
+        self.plain = MockPlainController()
+        self.pure = MockPureController()
+        self.checked = MockCheckedController()
+        self.pure.checked = MockCheckedController()
+
+    def index(self):
+        pass
+
+
+class TestSecurityCheckKind(object):
+
+    def setup(self):
+        clear_dispatch_tables()
+        self.root = MockRootController()
+
+    def teardown(self):
+        clear_dispatch_tables()
+
+    def test_kinds(self):
+        assert security_check_kind(self.root, self.root.plain) is None
+        assert security_check_kind(self.root, self.root.pure) == PURE_CHECK
+        assert security_check_kind(self.root, self.root.checked) == CHECK
+        assert security_check_kind(MockCustomCheckDispatcher(), self.root.plain) == CHECK
+
+    def test_dispatch_table(self):
+        assert get_dispatch_table(self.root, self.root.plain).security is None
+        assert get_dispatch_table(self.root, self.root.pure).security == PURE_CHECK
+
+
+class TestSecurityPlan(object):
+
+    def setup(self):
+        del calls[:]
+        clear_dispatch_tables()
+        self.root = MockRootController()
+
+    def teardown(self):
+        MockPureController.allowed = True
+        ObjectDispatcher._use_compiled_dispatch = False
+        clear_dispatch_tables()
+
+    def resolve(self, path):
+        return DispatchState(MockRequest(path), self.root).resolve()
+
+    def test_compiled_skips_missing_hooks(self):
+        checked = []
+        self.root._perform_security_check = checked.append
+        self.resolve('/plain')
+        assert checked == [self.root, self.root.plain], checked
+
+        del checked[:]
+        ObjectDispatcher._use_compiled_dispatch = True
+        self.resolve('/plain')
+        assert checked == [], checked
+
+    def test_compiled_instance_hook(self):
+        def check_security():
+            calls.append('instance')
+        self.root.guarded = MockPlainController()
+        self.root.guarded._check_security = check_security
+        ObjectDispatcher._use_compiled_dispatch = True
+        self.resolve('/plain')
+        assert calls == [], calls
+        self.resolve('/guarded')
+        assert calls == ['instance'], calls
+
+    def test_compiled_custom_check(self):
+        root = MockCustomCheckDispatcher()
+        root.plain = MockPlainController()
+        ObjectDispatcher._use_compiled_dispatch = True
+        DispatchState(MockRequest('/plain'), root).resolve()
+        assert calls == ['custom', 'custom'], calls
+
+    def test_inline(self):
+        self.resolve('/pure/checked/1')
+        assert calls == ['pure', 'checked', 'lookup'], calls
+
+    def test_deferred(self):
+        self.root._defer_security_checks = True
+        self.resolve('/pure/checked/1')
+        assert calls == ['checked', 'lookup', 'pure'], calls
+
+    def test_deferred_compiled(self):
+        self.root._defer_security_checks = True
+        ObjectDispatcher._use_compiled_dispatch = True
+        self.resolve('/pure/checked/1')
+        assert calls == ['checked', 'lookup', 'pure'], calls
+
+    @raises(HTTPForbidden)
+    def test_deferred_denied(self):
+        self.root._defer_security_checks = True
+        MockPureController.allowed = False
+        self.resolve('/pure')
+
+    @raises(HTTPForbidden)
+    def test_deferred_denied_before_notfound(self):
+        self.root._defer_security_checks = True
+        MockPureController.allowed = False
+        self.resolve('/pure/missing')
+
+    @raises(HTTPNotFound)
+    def test_deferred_notfound(self):
+        self.root._defer_security_checks = True
+        try:
+            self.resolve('/pure/missing')
+        finally:
+            assert calls == ['pure'], calls
+
+    def test_deferred_route_index(self):
+        self.root._defer_security_checks = True
+        self.root._route_index = RouteIndex(self.root)
+        self.resolve('/pure/checked/1')
+        assert calls == ['checked', 'lookup', 'pure'], calls
+
+    @raises(HTTPUnauthorized)
+    def test_deferred_denied_before_errors(self):
+        try:
+            DispatchState(MockRequest('/bad/1'), MockProtectedRootController()).resolve()
+        finally:
+            assert calls == ['lookup', 'pure'], calls
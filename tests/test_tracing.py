@@ -0,0 +1,131 @@
+import json
+from io import StringIO
+from nose.tools import raises
+from crank.objectdispatcher import ObjectDispatcher
+from crank.dispatchstate import DispatchState
+from crank.tracing import *
+from webob.exc import HTTPNotFound
+
+
+class MockRequest(object):
+
+    def __init__(self, path_info, params=None):
+        self.path_info = path_info
+        self.params = params or {}
+
+
+class MockEntity(object):
+    def index(self):
+        pass
+
+
+class MockSubController(ObjectDispatcher):
+    def _check_security(self):
+        pass
+
+    def with_args(self, a):
+        pass
+
+    def _lookup(self, *args):
+        return MockEntity(), args[1:]
+
+
+class MockLeafController(ObjectDispatcher):
+    def index(self):
+        pass
+
+
+class MockRootController(ObjectDispatcher):
+    sub = MockSubController()
+
+    def index(self):
+        pass
+
+    def _default(self, *args):
+        pass
+
+
+def fake_clock():
+    fake_clock.now += 1
+    return fake_clock.now
+fake_clock.now = 0
+
+
+class TestDispatchTracing(object):
+
+    def setup(self):
+        self.sink = CollectingSink()
+        self.tracer = DispatchTracer(self.sink, clock=fake_clock)
+        self.root = MockRootController()
+
+    def resolve(self, path):
+        state = DispatchState(MockRequest(path), self.root, tracer=self.tracer)
+        assert state.tracer is self.tracer
+        return state.resolve()
+
+    def decisions(self):
+        return [hop.decision for hop in self.sink.hops]
+
+    def test_exposed(self):
+        self.resolve('/sub/with_args/1')
+        assert self.decisions() == ['security', 'controller', 'security', 'exposed',
+                                    'match'], self.decisions()
+        assert self.sink.hops[1].path_piece == 'sub', self.sink.hops
+        assert self.sink.hops[1].controller is self.root
+        assert all(hop.duration > 0 for hop in self.sink.hops), self.sink.hops
+
+    def test_index(self):
+        self.resolve('/')
+        assert self.decisions() == ['security', 'index', 'match'], self.decisions()
+
+    def test_lookup(self):
+        self.resolve('/sub/1')
+        assert self.decisions() == ['security', 'controller', 'security', 'lookup',
+                                    'security', 'index', 'match'], self.decisions()
+        assert self.sink.hops[3].path_piece == '1', self.sink.hops
+
+    def test_default(self):
+        self.resolve('/missing')
+        assert self.decisions() == ['security', 'default'], self.decisions()
+
+    @raises(HTTPNotFound)
+    def test_notfound(self):
+        try:
+            DispatchState(MockRequest('/missing'), MockLeafController(), tracer=self.tracer).resolve()
+        finally:
+            assert self.decisions()[-1] == 'notfound', self.decisions()
+
+    def test_compiled(self):
+        ObjectDispatcher._use_compiled_dispatch = True
+        try:
+            self.resolve('/sub/with_args/1')
+        finally:
+            ObjectDispatcher._use_compiled_dispatch = False
+        #the root has no security hook, compiled dispatch skips it
+        assert self.decisions() == ['controller', 'security', 'exposed', 'match'], self.decisions()
+
+    def test_hops_do_not_overlap(self):
+        spans = []
+
+        def sink(hop):
+            spans.append((fake_clock.now - hop.duration, fake_clock.now))
+        self.tracer.sink = sink
+
+        DispatchState(MockRequest('/sub/1/missing'), self.root, tracer=self.tracer).resolve()
+        assert len(spans) > 4, spans
+        for previous, span in zip(spans, spans[1:]):
+            assert previous[1] <= span[0], spans
+
+    def test_clear(self):
+        self.resolve('/')
+        self.sink.clear()
+        assert self.sink.hops == []
+
+
+def test_json_lines_sink():
+    output = StringIO()
+    sink = JSONLinesSink(output)
+    sink(DispatchHop(MockRootController(), u'sub', 'controller', 0.5))
+    record = json.loads(output.getvalue())
+    assert record == {'controller': 'MockRootController', 'path_piece': 'sub',
+                      'decision': 'controller', 'duration': 0.5}, record
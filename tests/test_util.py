@@ -41,6 +41,36 @@ def test_get_argspec_cached():
     deco_argspec = get_argspec(deco_mock_f)
     assert argspec == deco_argspec, deco_argspec
 
+def test_set_argspec_cache():
+    from crank.cache import FunctionCache
+    cache = FunctionCache(maxsize=10)
+    previous = set_argspec_cache(cache)
+    try:
+        assert get_argspec_cache() is cache
+        get_argspec(mock_f2)
+        get_argspec(mock_f2)
+        assert cache.stats()['hits'] == 1, cache.stats()
+        assert cache.stats()['size'] == 1, cache.stats()
+    finally:
+        set_argspec_cache(previous)
+
+def test_set_argspec_cache_resets_matchers():
+    from crank.cache import FunctionCache
+    from crank.util import _cached_matchers, _cached_binders
+    get_signature_matcher(mock_f2)
+    get_argument_binder(mock_f2)
+    previous = set_argspec_cache(FunctionCache())
+    try:
+        assert _cached_matchers.stats()['size'] == 0, _cached_matchers.stats()
+        assert _cached_binders.stats()['size'] == 0, _cached_binders.stats()
+    finally:
+        set_argspec_cache(previous)
+
+def test_function_caches_bounded():
+    from crank.util import _cached_matchers, _cached_binders
+    for cache in (get_argspec_cache(), _cached_matchers, _cached_binders):
+        assert cache.maxsize is not None, cache
+
 def test_get_params_with_argspec():
     params = get_params_with_argspec(mock_f, {'a':1, 'c':2}, [3])
     assert params == {'a': 3, 'c': 2}, params
@@ -138,6 +168,33 @@ class TestFlattenArguments(object):
             assert False, 'should have triggered missed argument'
 
 
+class TestArgumentBinder(object):
+    def test_binder_cached(self):
+        assert get_argument_binder(mock_f) is get_argument_binder(mock_f)
+        assert get_argument_binder(mock_c().mock_f) is get_argument_binder(mock_c().mock_f)
+
+    def test_bind(self):
+        args, kwargs = get_argument_binder(mock_f).bind({'a': 1, 'z': 2}, [3, 4])
+        assert args == (1, 4, None, 50), args
+        assert kwargs == {'z': 2}, kwargs
+
+    def test_bind_drops_unexpected_keywords(self):
+        args, kwargs = get_argument_binder(mock_f2).bind({'b': 1, 'z': 2}, ['a'])
+        assert args == ('a', 1), args
+        assert kwargs == {}, kwargs
+
+    def test_bind_does_not_modify_params(self):
+        params = {'a': 1, 'b': 2, 'z': 3}
+        get_argument_binder(mock_f).bind(params, [])
+        assert params == {'a': 1, 'b': 2, 'z': 3}, params
+
+    def test_bind_many(self):
+        results = get_argument_binder(mock_f2).bind_many([({'a': 1, 'b': 2}, []),
+                                                          ({}, ['a', 'b', 'c']),
+                                                          ({'b': 2}, ['x'])])
+        assert results == [((1, 2), {}), (('a', 'b'), {}), (('x', 2), {})], results
+
+
 def test_remove_argspec_params_from_params():
     params, remainder = remove_argspec_params_from_params(mock_f, {'a':1, 'b':2}, [3])
     assert params == {}, params
@@ -233,6 +290,26 @@ def test_method_matches_args_with_default_values():
     r = method_matches_args(mock_f3, params, remainder)
     assert r
 
+def test_signature_matcher_cached():
+    matcher = get_signature_matcher(mock_f3)
+    assert matcher is get_signature_matcher(mock_f3)
+
+def test_signature_matcher_bound_method():
+    matcher = get_signature_matcher(mock_c().mock_f)
+    assert matcher.matches({'a': 1, 'b': 2}, 0)
+    assert matcher.matches({'b': 2}, 1)
+    assert not matcher.matches({'a': 1, 'b': 2}, 1)
+
+def test_signature_matcher_lax_params():
+    matcher = get_signature_matcher(mock_f2)
+    assert not matcher.matches({'a':1, 'b':2, 'x':3}, 0)
+    assert matcher.matches({'a':1, 'b':2, 'x':3}, 0, True)
+
+def test_signature_matcher_too_many_args():
+    matcher = get_signature_matcher(mock_f3)
+    assert matcher.matches({}, 4)
+    assert not matcher.matches({}, 5)
+
 def assert_path(instance, expected, kind=list):
     assert kind(instance.path) == expected, (kind(instance.path), expected)
 
@@ -330,3 +407,17 @@ def test_path_translation():
 
     translated = default_path_translator(u('f.ö.ö'))
     assert translated == u('f_ö_ö'), translated
+
+def test_path_translation_memo_is_bounded():
+    from crank import util
+    maxsize = util._translated_pieces_maxsize
+    util._translated_pieces_maxsize = 2
+    try:
+        util._translated_pieces.clear()
+        for piece in ('a.1', 'a.2', 'a.3'):
+            assert default_path_translator(piece) == piece.replace('.', '_')
+        assert len(util._translated_pieces) == 1, util._translated_pieces
+        assert default_path_translator('a.3') == 'a_3'
+    finally:
+        util._translated_pieces_maxsize = maxsize
+